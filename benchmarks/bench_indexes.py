@@ -0,0 +1,156 @@
+# Compares query plans and timings for the hot inventory queries with and
+# without the migration indexes, on a synthetic database. Paged tables are
+# measured with the statements KeysetQuery.fetch_page builds for
+# shipments_query() and device_summary_query(), on the first page and on a
+# page halfway through. Counter tables stay in place in both runs.
+#
+#   python benchmarks/bench_indexes.py --devices 1000000 [--json results.json]
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from inventory import InventoryManager  # noqa: E402
+from migrations import MIGRATIONS, migrate  # noqa: E402
+
+DEVICE_TYPES = ["VH", "VP", "VR40"]
+
+QUERIES = {
+    "in_stock_count": ('''
+        SELECT COUNT(*) FROM Devices WHERE type = ? AND status = 'In Stock'
+    ''', ("VP",)),
+    "stock_counts": ('''
+        SELECT COALESCE(SUM(count), 0) FROM Stock_Counts WHERE device_type = ? AND status = 'In Stock'
+    ''', ("VP",)),
+    "allocate_units_fifo": ('''
+        SELECT rowid FROM Devices
+        WHERE type = ? AND status = 'In Stock'
+        ORDER BY production_date, calibration_date, rowid
+        LIMIT 100
+    ''', ("VP",)),
+    "device_summary": ('''
+        SELECT type, location, production_date, calibration_date, COUNT(*)
+        FROM Devices
+        WHERE status = 'In Stock'
+        GROUP BY type, location, production_date, calibration_date
+        ORDER BY type, location
+    ''', ()),
+}
+
+# Name -> (InventoryManager query method, sort column, descending), as the app pages them
+PAGED_QUERIES = {
+    "shipment_history": (InventoryManager.shipments_query, "shipment_date", True),
+    "device_summary": (InventoryManager.device_summary_query, "type", False),
+}
+
+
+def populate(path, devices, shipments, seed):
+    # Returns name -> (KeysetQuery, sort column, descending) for PAGED_QUERIES
+    rng = random.Random(seed)
+    manager = InventoryManager(path)
+    paged = {
+        name: (query_method(manager), sort_column, descending)
+        for name, (query_method, sort_column, descending) in PAGED_QUERIES.items()
+    }
+    manager.close()
+
+    conn = sqlite3.connect(path)
+    locations = [f"Warehouse {i}" for i in range(20)]
+    batch = []
+    for i in range(devices):
+        built = (date(2023, 1, 1) + timedelta(days=rng.randrange(730))).isoformat()
+        # Most historical devices have shipped; only recent builds are still in stock
+        status = "In Stock" if rng.random() < 0.05 else "Shipped"
+        batch.append((f"DEV{i:08d}", rng.choice(DEVICE_TYPES), built, built, rng.choice(locations), status))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO Devices VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch = []
+    conn.executemany("INSERT INTO Devices VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.executemany(
+        "INSERT INTO Shipments (device_type, shipment_date, destination, quantity) VALUES (?, ?, ?, ?)",
+        [
+            (rng.choice(DEVICE_TYPES), f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}", "Site", rng.randrange(1, 50))
+            for _ in range(shipments)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return paged
+
+
+def page_statements(conn, paged, limit=200):
+    # (sql, params) for the first page and the page starting halfway through each paged query
+    statements = {}
+    for name, (query, sort_column, descending) in paged.items():
+        statements[f"{name}_first_page"] = query.page_sql(sort_column, descending, None, limit)
+        total = conn.execute(f"SELECT COUNT(*) FROM ({query.source_sql})", query.params).fetchone()[0]
+        rows = query.fetch_page(conn, sort_column, descending, None, max(total // 2, 1))
+        after = query.page_key(rows[-1], sort_column) if rows else None
+        statements[f"{name}_middle_page"] = query.page_sql(sort_column, descending, after, limit)
+    return statements
+
+
+def drop_migration_indexes(conn):
+    for name, in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND name != 'BOM_Ledger_recorded_at'"
+    ).fetchall():
+        conn.execute(f'DROP INDEX "{name}"')
+    conn.execute("PRAGMA user_version = 0")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def measure(conn, repeat, statements):
+    results = {}
+    for name, (sql, params) in statements.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        results[name] = {"plan": plan, "median_ms": timings[len(timings) // 2] * 1000}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the migration indexes")
+    parser.add_argument("--devices", type=int, default=1_000_000)
+    parser.add_argument("--shipments", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        paged = populate(path, args.devices, args.shipments, args.seed)
+        conn = sqlite3.connect(path)
+        statements = dict(QUERIES, **page_statements(conn, paged))
+
+        drop_migration_indexes(conn)
+        before = measure(conn, args.repeat, statements)
+        migrate(conn, MIGRATIONS)
+        after = measure(conn, args.repeat, statements)
+        conn.close()
+
+    results = {"devices": args.devices, "shipments": args.shipments, "before": before, "after": after}
+    for name in statements:
+        print(f"{name}: {before[name]['median_ms']:.2f} ms -> {after[name]['median_ms']:.2f} ms")
+        print(f"    before: {'; '.join(before[name]['plan'])}")
+        print(f"    after:  {'; '.join(after[name]['plan'])}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
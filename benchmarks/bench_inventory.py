@@ -0,0 +1,152 @@
+# Per-operation latency and throughput of InventoryManager on a synthetic
+# production-scale database (see synthetic.py).
+#
+#   python benchmarks/bench_inventory.py --devices 1000000 --json results.json
+#   python benchmarks/bench_inventory.py --db /tmp/bench.db --reuse   (keep and reuse the generated database)
+#
+# Reads are measured with the result cache cleared before every call, so
+# they show the cost of the query itself; --cached measures warm hits instead.
+# The JSON output includes the git commit, so runs can be compared across commits.
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from inventory import InventoryManager  # noqa: E402
+from synthetic import ROOT, generate  # noqa: E402
+
+
+def operations(manager, rng, cached):
+    # name -> callable running the operation once
+    conn = manager.conn
+    types = [row[0] for row in conn.execute('''
+        SELECT device_type FROM Stock_Counts WHERE status = 'In Stock' GROUP BY device_type ORDER BY SUM(count) DESC
+    ''')]
+    items = [row[0] for row in conn.execute("SELECT item_name FROM BOM ORDER BY item_name")]
+    shipments = manager.shipments_query()
+    summary = manager.device_summary_query()
+
+    def read(fn):
+        def run():
+            if not cached:
+                manager.cache.clear()
+            return fn()
+        return run
+
+    return {
+        "add_devices": lambda: manager.add_devices(
+            types[int(rng.integers(len(types)))], "2025-01-02", "2025-01-03", "Benchmark", 5
+        ),
+        "log_shipment": lambda: manager.log_shipment(types[int(rng.integers(min(len(types), 10)))], 2, "Benchmark"),
+        "purchase_bom_items": lambda: manager.purchase_bom_items(
+            "2025-01-02", "bench", items[int(rng.integers(len(items)))], 100, 2.5, "CAD", 0.3, None
+        ),
+        "get_device_stats": read(manager.get_device_stats),
+        "get_device_summary": read(manager.get_device_summary),
+        "calculate_buildable_units": read(manager.calculate_buildable_units),
+        "get_bom_inventory_summary": read(manager.get_bom_inventory_summary),
+        "shipments_first_page": read(lambda: manager.fetch_page(shipments, "shipment_date", True)),
+        "device_summary_first_page": read(lambda: manager.fetch_page(summary, "type")),
+    }
+
+
+def measure(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    ms = timings * 1000
+    return {
+        "runs": repeat,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+        "ops_per_second": round(repeat / float(timings.sum()), 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark InventoryManager on synthetic data")
+    parser.add_argument("--devices", type=int, default=1_000_000)
+    parser.add_argument("--device-types", type=int, default=200)
+    parser.add_argument("--items", type=int, default=2000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--only", nargs="*", help="operations to run (default: all)")
+    parser.add_argument("--cached", action="store_true", help="keep the result cache warm between reads")
+    parser.add_argument("--db", help="database path (default: a temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="reuse --db if it exists instead of regenerating")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.db or os.path.join(tmp, "bench.db")
+        generated = None
+        if not (args.reuse and os.path.exists(path)):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            start = time.perf_counter()
+            generated = generate(
+                path, args.devices, args.device_types, args.items, args.years, seed=args.seed
+            )
+            generated["seconds"] = round(time.perf_counter() - start, 1)
+            print(f"Generated {path} in {generated['seconds']}s", file=sys.stderr)
+
+        manager = InventoryManager(path)
+        try:
+            ops = operations(manager, np.random.default_rng(args.seed), args.cached)
+            results = {}
+            for name, fn in ops.items():
+                if args.only and name not in args.only:
+                    continue
+                results[name] = measure(fn, args.repeat, args.warmup)
+                print(
+                    f"{name:28} p50 {results[name]['p50_ms']:9.3f} ms  p95 {results[name]['p95_ms']:9.3f} ms  "
+                    f"{results[name]['ops_per_second']:10.1f} ops/s"
+                )
+        finally:
+            manager.close()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cached": args.cached,
+        "dataset": generated or {"reused": path},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
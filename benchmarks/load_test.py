@@ -0,0 +1,172 @@
+# Load test for service.py: many concurrent clients logging shipments and
+# purchases over keep-alive connections, reporting throughput and latency.
+#
+#   python benchmarks/load_test.py --clients 50 --requests 5000 [--json results.json]
+#   python benchmarks/load_test.py --url http://127.0.0.1:8765   (an already running service)
+#
+# Without --url a service is started on a temporary database seeded with
+# enough in-stock devices for every shipment.
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from inventory import InventoryManager  # noqa: E402
+
+DEVICE_TYPES = ["VH", "VP", "VR40"]
+
+
+def seed(path, devices):
+    manager = InventoryManager(path)
+    manager.add_devices_bulk(
+        ({"type": DEVICE_TYPES[i % len(DEVICE_TYPES)], "location": "Warehouse"} for i in range(devices)),
+        batch_size=10000,
+    )
+    manager.close()
+
+
+async def request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def client(host, port, count, rng, latencies, failures, read_share):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(count):
+            roll = rng.random()
+            if roll < read_share:
+                method, path, payload = "GET", "/devices/stats", None
+            elif roll < read_share + (1 - read_share) / 2:
+                method, path, payload = "POST", "/shipments", {
+                    "type": rng.choice(DEVICE_TYPES), "quantity": 1, "destination": f"Site {rng.randrange(100)}",
+                }
+            else:
+                method, path, payload = "POST", "/purchases", {
+                    "item_name": rng.choice(["PCB", "Light Pipe", "Back Case"]), "quantity": rng.randrange(1, 50),
+                    "price": round(rng.uniform(1, 20), 2), "currency": "CAD", "buyer_name": "load test",
+                }
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, method, path, payload)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append(status)
+    finally:
+        writer.close()
+
+
+async def run(host, port, clients, requests, seed_value, read_share):
+    rng = random.Random(seed_value)
+    latencies, failures = [], []
+    per_client = [requests // clients + (i < requests % clients) for i in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, n, random.Random(rng.random()), latencies, failures, read_share) for n in per_client
+    ))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, health = await request(reader, writer, "GET", "/health")
+    writer.close()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "failed": len(failures),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(0.50), 2),
+        "p95_ms": round(percentile(0.95), 2),
+        "p99_ms": round(percentile(0.99), 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "writes_per_commit": round(health["writes"] / max(health["commits"], 1), 1),
+    }
+
+
+def wait_for_port(host, port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"service did not start on {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the inventory HTTP service")
+    parser.add_argument("--url", help="test a running service instead of starting one")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--read-share", type=float, default=0.2, help="fraction of requests that are reads")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = None
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port
+        else:
+            host, port = "127.0.0.1", args.port
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+            except OSError:
+                pass
+            else:
+                sys.exit(f"port {port} is already in use; pass --port or --url")
+            path = os.path.join(tmp, "load.db")
+            seed(path, args.requests)
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(ROOT, "service.py"), "--db", path, "--port", str(port)],
+                stderr=subprocess.DEVNULL,
+            )
+            wait_for_port(host, port)
+        try:
+            results = asyncio.run(run(host, port, args.clients, args.requests, args.seed, args.read_share))
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+    for name, value in results.items():
+        print(f"{name}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
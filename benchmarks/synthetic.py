@@ -0,0 +1,182 @@
+# Deterministic synthetic inventory databases for benchmarking.
+#
+# Shapes are taken from the real exports when they're present:
+#   device.csv       - build weekdays, batch sizes and locations (the note
+#                      column, without its batch date)
+#   driver_trans.csv - weekday and hour-of-day mix of activity, used for
+#                      shipment and purchase times
+# and fall back to uniform distributions otherwise. The same arguments always
+# produce the same database.
+import csv
+import os
+import re
+import sqlite3
+import sys
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from inventory import InventoryManager  # noqa: E402
+
+
+class Shapes:
+    # Empirical distributions read from the exports
+    def __init__(self, data_dir=ROOT):
+        self.build_weekdays = np.ones(7)
+        self.activity_weekdays = np.ones(7)
+        self.activity_hours = np.ones(24)
+        self.batch_sizes = np.array([50])
+        self.locations = ["Warehouse"]
+
+        device_csv = os.path.join(data_dir, "device.csv")
+        if os.path.exists(device_csv):
+            with open(device_csv, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            created = [datetime.fromisoformat(r["datetime_created"]) for r in rows if r.get("datetime_created")]
+            for when in created:
+                self.build_weekdays[when.weekday()] += 1
+            batches = Counter(r["note"] for r in rows if r.get("note"))
+            if batches:
+                self.batch_sizes = np.array(sorted(batches.values()))
+                names = {re.sub(r"\s*\d{8}.*$", "", note).strip() or note for note in batches}
+                self.locations = sorted(names)
+
+        trans_csv = os.path.join(data_dir, "driver_trans.csv")
+        if os.path.exists(trans_csv):
+            with open(trans_csv, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row.get("start_datetime"):
+                        when = datetime.fromisoformat(row["start_datetime"])
+                        self.activity_weekdays[when.weekday()] += 1
+                        self.activity_hours[when.hour] += 1
+
+    @staticmethod
+    def probabilities(weights):
+        return weights / weights.sum()
+
+
+def day_weights(start, days, weekday_weights):
+    weekdays = (np.arange(days) + start.weekday()) % 7
+    weights = weekday_weights[weekdays]
+    return weights / weights.sum()
+
+
+def timestamps(rng, start, days, count, shapes):
+    # `count` "YYYY-MM-DD HH:MM:SS" strings following the activity mix, sorted
+    day = rng.choice(days, size=count, p=day_weights(start, days, shapes.activity_weekdays))
+    hour = rng.choice(24, size=count, p=Shapes.probabilities(shapes.activity_hours))
+    seconds = np.sort(day * 86400 + hour * 3600 + rng.integers(0, 3600, size=count))
+    origin = datetime.combine(start, datetime.min.time())
+    return [(origin + timedelta(seconds=int(s))).strftime("%Y-%m-%d %H:%M:%S") for s in seconds]
+
+
+def generate(path, devices=1_000_000, device_types=200, items=2000, years=3, shipments=None,
+             purchases=None, seed=1, data_dir=ROOT, end=date(2025, 1, 1)):
+    # Build a database at `path` with the real schema and synthetic contents.
+    # Returns a dict describing what was generated.
+    rng = np.random.default_rng(seed)
+    shapes = Shapes(data_dir)
+    start = end - timedelta(days=365 * years)
+    days = (end - start).days
+    shipments = shipments if shipments is not None else devices // 20
+    purchases = purchases if purchases is not None else items * 12 * years
+
+    InventoryManager(path).close()  # Schema, triggers and migrations
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    # Item catalogue and requirements: every type needs 10-40 items, a few
+    # of them shared by most types (cases, PCBs, coils)
+    type_names = [f"T{t:04d}" for t in range(device_types)]
+    item_names = [f"ITEM-{i:05d}" for i in range(items)]
+    common = item_names[:min(20, items)]
+    requirements = []
+    for name in type_names:
+        count = int(rng.integers(10, 41))
+        chosen = set(rng.choice(common, size=min(5, len(common)), replace=False))
+        chosen.update(rng.choice(item_names, size=min(count, items), replace=False))
+        requirements.extend((name, item, int(rng.integers(1, 5))) for item in sorted(chosen))
+
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO BOM (item_name) VALUES (?)", [(i,) for i in item_names])
+        conn.executemany(
+            "INSERT OR REPLACE INTO BOM_Requirements (device_type, item_name, required_per_unit) VALUES (?, ?, ?)",
+            requirements,
+        )
+        # Opening stock, through the ledger so BOM totals stay consistent
+        conn.executemany('''
+            INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+            VALUES (?, ?, ?, 'opening', 'synthetic opening balance')
+        ''', [(f"{start} 00:00:00", item, int(q)) for item, q in zip(item_names, rng.integers(5000, 50000, items))])
+
+    # Purchases over the period, each with its ledger entry
+    when = timestamps(rng, start, days, purchases, shapes)
+    bought = rng.choice(item_names, size=purchases)
+    quantity = rng.integers(10, 1000, size=purchases)
+    price = np.round(rng.lognormal(1.5, 1.0, size=purchases), 2)
+    currency = rng.choice(["CAD", "USD"], size=purchases, p=[0.7, 0.3])
+    tax = rng.choice([0.0, 0.13], size=purchases, p=[0.3, 0.7])
+    with conn:
+        for i in range(purchases):
+            cursor = conn.execute('''
+                INSERT INTO BOM_Purchases (purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url)
+                VALUES (?, 'synthetic', ?, ?, ?, ?, ?, NULL)
+            ''', (when[i][:10], bought[i], int(quantity[i]), float(price[i]), str(currency[i]), float(tax[i])))
+            conn.execute('''
+                INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+                VALUES (?, ?, ?, 'purchase', ?)
+            ''', (when[i], bought[i], int(quantity[i]), f"purchase:{cursor.lastrowid}"))
+
+    # Devices arrive in build batches sized like the real ones; older units
+    # are more likely to have shipped
+    batch_p = Shapes.probabilities(np.ones(len(shapes.batch_sizes)))
+    build_p = day_weights(start, days, shapes.build_weekdays)
+    type_p = Shapes.probabilities(rng.pareto(1.2, size=device_types) + 0.01)
+    made = 0
+    batch_number = 0
+    while made < devices:
+        size = min(int(rng.choice(shapes.batch_sizes, p=batch_p)) * 20, devices - made)
+        day = int(rng.choice(days, p=build_p))
+        built = start + timedelta(days=day)
+        calibrated = built + timedelta(days=int(rng.integers(0, 15)))
+        device_type = type_names[int(rng.choice(device_types, p=type_p))]
+        location = shapes.locations[batch_number % len(shapes.locations)]
+        age = (end - built).days
+        shipped = rng.random(size) < 1 - np.exp(-age / 120)
+        conn.executemany(
+            "INSERT INTO Devices (uid, type, production_date, calibration_date, location, status) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (f"{device_type}_{made + i:012X}", device_type, built.isoformat(), calibrated.isoformat(),
+                 f"Site {(made + i) % 500}" if s else location, "Shipped" if s else "In Stock")
+                for i, s in enumerate(shipped.tolist())
+            ],
+        )
+        made += size
+        batch_number += 1
+        if batch_number % 100 == 0:
+            conn.commit()
+    conn.commit()
+
+    when = timestamps(rng, start, days, shipments, shapes)
+    shipped_type = rng.choice(type_names, size=shipments, p=type_p)
+    shipped_quantity = rng.geometric(0.1, size=shipments)
+    with conn:
+        conn.executemany(
+            "INSERT INTO Shipments (device_type, shipment_date, destination, quantity) VALUES (?, ?, ?, ?)",
+            [
+                (shipped_type[i], when[i][:10], f"Site {int(d)}", int(shipped_quantity[i]))
+                for i, d in enumerate(rng.integers(0, 500, size=shipments))
+            ],
+        )
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+    return {
+        "devices": devices, "device_types": device_types, "items": items, "years": years,
+        "shipments": shipments, "purchases": purchases, "requirements": len(requirements), "seed": seed,
+    }
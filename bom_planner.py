@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class BuildPlanner:
+    # Loads BOM_Requirements and BOM once into arrays:
+    #   requirements[d, i] = units of item i needed per device of type d
+    #   inventory[i]       = units of item i in stock
+    # and answers buildability questions for every device type from those.
+    def __init__(self, device_types, items, requirements, inventory):
+        self.device_types = device_types
+        self.items = items
+        self.requirements = requirements
+        self.inventory = inventory
+
+    @classmethod
+    def load(cls, conn):
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT br.device_type, br.item_name, br.required_per_unit, COALESCE(b.total_quantity, 0)
+            FROM BOM_Requirements br
+            LEFT JOIN BOM b ON br.item_name = b.item_name
+            ORDER BY br.device_type, br.item_name
+        ''')
+        rows = cursor.fetchall()
+
+        device_types = sorted({row[0] for row in rows})
+        items = sorted({row[1] for row in rows})
+        type_index = {device_type: d for d, device_type in enumerate(device_types)}
+        item_index = {item: i for i, item in enumerate(items)}
+
+        requirements = np.zeros((len(device_types), len(items)), dtype=np.int64)
+        inventory = np.zeros(len(items), dtype=np.int64)
+        if rows:
+            d = np.fromiter((type_index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+            i = np.fromiter((item_index[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+            requirements[d, i] = np.fromiter((row[2] or 0 for row in rows), dtype=np.int64, count=len(rows))
+            inventory[i] = np.fromiter((row[3] for row in rows), dtype=np.int64, count=len(rows))
+        np.maximum(inventory, 0, out=inventory)
+
+        return cls(device_types, items, requirements, inventory)
+
+    def max_buildable(self):
+        # Units of each device type buildable on its own from current stock.
+        # Items a device doesn't use don't limit it; a type with no
+        # requirements at all can't be built.
+        if not self.device_types:
+            return {}
+        used = self.requirements > 0
+        per_item = np.where(used, self.inventory // np.where(used, self.requirements, 1), np.iinfo(np.int64).max)
+        buildable = per_item.min(axis=1)
+        buildable[~used.any(axis=1)] = 0
+        return dict(zip(self.device_types, buildable.tolist()))
+
+    def limiting_items(self, device_type):
+        # Items that cap max_buildable for the device type
+        d = self.device_types.index(device_type)
+        used = self.requirements[d] > 0
+        if not used.any():
+            return []
+        per_item = self.inventory[used] // self.requirements[d, used]
+        names = np.array(self.items, dtype=object)[used]
+        return names[per_item == per_item.min()].tolist()
+
+    def plan_mix(self, weights=None, minimums=None, maximums=None):
+        # Joint build plan when device types share parts (e.g. Light Pipe and PCB
+        # between VH and VP): maximise sum(weights[d] * units[d]) subject to
+        # requirements.T @ units <= inventory, solved as an integer program.
+        # Weights default to 1 per device, i.e. the most devices in total.
+        # scipy is only needed for this plan.
+        try:
+            from scipy.optimize import Bounds, LinearConstraint, milp
+        except ImportError:
+            raise ImportError("Build mix planning needs scipy 1.9 or later (pip install scipy)") from None
+
+        if not self.device_types:
+            return {}
+        weights = weights or {}
+        minimums = minimums or {}
+        maximums = maximums or {}
+        max_alone = self.max_buildable()
+
+        value = np.array([weights.get(t, 1) for t in self.device_types], dtype=float)
+        lower = np.array([minimums.get(t, 0) for t in self.device_types], dtype=float)
+        upper = np.array([min(maximums.get(t, max_alone[t]), max_alone[t]) for t in self.device_types], dtype=float)
+        if (lower > upper).any():
+            raise ValueError("Minimum build quantities exceed available stock.")
+
+        result = milp(
+            c=-value,
+            constraints=LinearConstraint(self.requirements.T, ub=self.inventory),
+            integrality=np.ones(len(self.device_types)),
+            bounds=Bounds(lower, upper),
+        )
+        if not result.success:
+            raise ValueError(f"No feasible build plan: {result.message}")
+        return dict(zip(self.device_types, np.round(result.x).astype(np.int64).tolist()))
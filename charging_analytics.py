@@ -0,0 +1,348 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from connection_pool import ConnectionPool
+
+# Transactions read from driver_trans per pass when refreshing the rollups
+READ_CHUNK = 50000
+
+# Grouping levels for queries: column in the rollup tables
+LEVELS = {"driver": "driver_id", "chargepoint": "chargepoint_id", "installation": "installation_id"}
+# Rollup table and bucket format for each grain
+GRAINS = {"hour": "Session_Rollup_Hourly", "day": "Session_Rollup_Daily"}
+
+
+def session_metrics(sessions):
+    # Per-session duration and energy for a frame of driver_trans rows.
+    # meter_start/meter_stop are the OCPP meter readings in Wh; a missing
+    # reading or a meter that went backwards leaves the energy unknown (NaN)
+    # rather than counting it as zero.
+    start = pd.to_datetime(sessions["start_datetime"], errors="coerce")
+    stop = pd.to_datetime(sessions["stop_datetime"], errors="coerce")
+    duration = (stop - start).dt.total_seconds()
+    energy = sessions["meter_stop"].astype("float64") - sessions["meter_start"].astype("float64")
+    return pd.DataFrame({
+        "hour": start.dt.floor("h"),
+        "driver_id": sessions["driver_id"],
+        "chargepoint_id": sessions["chargepoint_id"],
+        "installation_id": sessions["installation_id"],
+        "duration_seconds": duration.where(duration >= 0),
+        "energy_wh": energy.where(energy >= 0),
+    })
+
+
+def session_contributions(metrics):
+    # What each session adds to its hourly bucket. Unknown ids become -1 and
+    # unknown metrics 0 (not counted as metered); a session with no start
+    # time has no bucket and adds nothing.
+    energy = metrics["energy_wh"]
+    ids = {
+        column: metrics[column].astype("float64").fillna(-1).astype("int64")
+        for column in ("driver_id", "chargepoint_id", "installation_id")
+    }
+    return pd.DataFrame({
+        "bucket": metrics["hour"].dt.strftime("%Y-%m-%d %H:00:00"),
+        **ids,
+        "sessions": 1,
+        "metered_sessions": energy.notna().astype("int64"),
+        "energy_wh": energy.fillna(0.0),
+        "duration_seconds": metrics["duration_seconds"].fillna(0.0),
+    })
+
+
+def hourly_rollup(contributions):
+    # Sum session contributions per (hour, driver, chargepoint). Sessions are
+    # attributed to the hour they started in; rows with sessions = -1 take a
+    # session's earlier contribution back out.
+    keys = ["bucket", "driver_id", "chargepoint_id", "installation_id"]
+    return contributions.groupby(keys, sort=False)[
+        ["sessions", "metered_sessions", "energy_wh", "duration_seconds"]
+    ].sum().reset_index()
+
+
+class ChargingAnalytics:
+    # Energy delivered and session time per driver, chargepoint and
+    # installation, answered from rollup tables in the fleet database.
+    #
+    # Session_Rollup_Hourly holds one row per (hour, driver, chargepoint) and
+    # Session_Rollup_Daily the same per day. refresh() rolls up only the
+    # driver_trans rows added since the last refresh (tracked by id in
+    # Rollup_State) and the rows fleet_loader has rewritten since they were
+    # rolled up: Rollup_Sessions keeps each session's _row_hash and what it
+    # added to its bucket, so a changed session's old contribution is taken
+    # out and the new one added. The metrics are computed with pandas and
+    # the daily buckets touched are re-derived from the hourly ones.
+    # Transactions deleted from driver_trans, or chargepoints moved to
+    # another installation, need rebuild().
+    def __init__(self, db_name="fleet.db"):
+        self.pool = ConnectionPool(db_name, size=2)
+        self.create_tables()
+
+    @property
+    def conn(self):
+        return self.pool.get()
+
+    def close(self):
+        self.pool.close_all()
+
+    def create_tables(self):
+        conn = self.conn
+        for table in GRAINS.values():
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    bucket TEXT NOT NULL,
+                    driver_id INTEGER NOT NULL,
+                    chargepoint_id INTEGER NOT NULL,
+                    installation_id INTEGER NOT NULL,
+                    sessions INTEGER NOT NULL,
+                    metered_sessions INTEGER NOT NULL,
+                    energy_wh REAL NOT NULL,
+                    duration_seconds REAL NOT NULL,
+                    PRIMARY KEY (bucket, driver_id, chargepoint_id)
+                ) WITHOUT ROWID
+            ''')
+            for level in ("driver_id", "chargepoint_id", "installation_id"):
+                conn.execute(f'''
+                    CREATE INDEX IF NOT EXISTS {table}_{level} ON {table} ({level}, bucket)
+                ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS Rollup_State (
+                name TEXT PRIMARY KEY,
+                last_id INTEGER NOT NULL
+            )
+        ''')
+        # What each rolled-up driver_trans row added, keyed by its id
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS Rollup_Sessions (
+                id INTEGER PRIMARY KEY,
+                row_hash INTEGER,
+                bucket TEXT,
+                driver_id INTEGER NOT NULL,
+                chargepoint_id INTEGER NOT NULL,
+                installation_id INTEGER NOT NULL,
+                metered_sessions INTEGER NOT NULL,
+                energy_wh REAL NOT NULL,
+                duration_seconds REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def last_rolled_up_id(self):
+        row = self.conn.execute("SELECT last_id FROM Rollup_State WHERE name = 'driver_trans'").fetchone()
+        return row[0] if row else 0
+
+    def refresh(self):
+        # Roll up new transactions and re-roll the ones rewritten since they
+        # were rolled up. Returns the number of sessions rolled up.
+        conn = self.conn
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'driver_trans'"
+        ).fetchone():
+            return 0
+        if self.last_rolled_up_id() and not conn.execute("SELECT 1 FROM Rollup_Sessions LIMIT 1").fetchone():
+            # Rolled up before sessions were tracked, so changes can't be taken back out
+            return self.rebuild()
+        has_chargepoints = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chargepoint'"
+        ).fetchone()
+        installation = "cp.installation_id" if has_chargepoints else "NULL"
+        join = "LEFT JOIN chargepoint cp ON cp.id = t.chargepoint_id" if has_chargepoints else ""
+        hashed = any(row[1] == "_row_hash" for row in conn.execute("PRAGMA table_info(driver_trans)"))
+        select = f'''
+            SELECT t.id, {"t._row_hash" if hashed else "NULL"} AS row_hash, t.driver_id, t.chargepoint_id,
+                {installation} AS installation_id, t.start_datetime, t.stop_datetime, t.meter_start, t.meter_stop
+        '''
+
+        added = 0
+        while True:
+            last_id = self.last_rolled_up_id()
+            chunk = pd.read_sql_query(f'''
+                {select}
+                FROM driver_trans t
+                {join}
+                WHERE t.id > ?
+                ORDER BY t.id
+                LIMIT ?
+            ''', conn, params=(last_id, READ_CHUNK))
+            if chunk.empty:
+                break
+            self._apply(chunk, last_id=int(chunk["id"].iloc[-1]))
+            added += len(chunk)
+
+        while hashed:
+            # Rows re-imported with new values; each pass records their new hashes
+            chunk = pd.read_sql_query(f'''
+                {select}, r.bucket AS previous_bucket, r.driver_id AS previous_driver_id,
+                    r.chargepoint_id AS previous_chargepoint_id, r.installation_id AS previous_installation_id,
+                    r.metered_sessions AS previous_metered_sessions, r.energy_wh AS previous_energy_wh,
+                    r.duration_seconds AS previous_duration_seconds
+                FROM driver_trans t
+                JOIN Rollup_Sessions r ON r.id = t.id
+                {join}
+                WHERE t._row_hash IS NOT r.row_hash
+                ORDER BY t.id
+                LIMIT ?
+            ''', conn, params=(READ_CHUNK,))
+            if chunk.empty:
+                break
+            previous = chunk.filter(like="previous_").rename(columns=lambda column: column[len("previous_"):])
+            previous["sessions"] = -1
+            for column in ("metered_sessions", "energy_wh", "duration_seconds"):
+                previous[column] = -previous[column]
+            self._apply(chunk, previous=previous[previous["bucket"].notna()])
+            added += len(chunk)
+        return added
+
+    def rebuild(self):
+        # Drop every rollup and recompute from all of driver_trans
+        with self.conn:
+            for table in GRAINS.values():
+                self.conn.execute(f"DELETE FROM {table}")
+            self.conn.execute("DELETE FROM Rollup_Sessions")
+            self.conn.execute("DELETE FROM Rollup_State WHERE name = 'driver_trans'")
+        return self.refresh()
+
+    def _apply(self, chunk, previous=None, last_id=None):
+        # Add one chunk's sessions to the hourly buckets (taking `previous`
+        # contributions back out), record what each session added and
+        # advance the high-water mark, all in one transaction, so a failed
+        # refresh never double counts
+        contributions = session_contributions(session_metrics(chunk))
+        signed = contributions if previous is None else pd.concat([previous[contributions.columns], contributions])
+        hourly = hourly_rollup(signed)
+        rows = list(zip(
+            hourly["bucket"], hourly["driver_id"].tolist(), hourly["chargepoint_id"].tolist(),
+            hourly["installation_id"].tolist(), hourly["sessions"].tolist(),
+            hourly["metered_sessions"].tolist(), hourly["energy_wh"].tolist(),
+            hourly["duration_seconds"].tolist(),
+        ))
+        sessions = list(zip(
+            chunk["id"].tolist(), chunk["row_hash"].astype(object).where(chunk["row_hash"].notna(), None).tolist(),
+            contributions["bucket"].astype(object).where(contributions["bucket"].notna(), None).tolist(),
+            contributions["driver_id"].tolist(), contributions["chargepoint_id"].tolist(),
+            contributions["installation_id"].tolist(), contributions["metered_sessions"].tolist(),
+            contributions["energy_wh"].tolist(), contributions["duration_seconds"].tolist(),
+        ))
+        days = sorted(set(bucket[:10] for bucket in hourly["bucket"]))
+        with self.conn as conn:
+            conn.executemany('''
+                INSERT INTO Session_Rollup_Hourly (bucket, driver_id, chargepoint_id, installation_id,
+                    sessions, metered_sessions, energy_wh, duration_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (bucket, driver_id, chargepoint_id) DO UPDATE SET
+                    installation_id = excluded.installation_id,
+                    sessions = sessions + excluded.sessions,
+                    metered_sessions = metered_sessions + excluded.metered_sessions,
+                    energy_wh = energy_wh + excluded.energy_wh,
+                    duration_seconds = duration_seconds + excluded.duration_seconds
+            ''', rows)
+            conn.executemany('''
+                INSERT OR REPLACE INTO Rollup_Sessions (id, row_hash, bucket, driver_id, chargepoint_id,
+                    installation_id, metered_sessions, energy_wh, duration_seconds)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', sessions)
+            for day in days:
+                # Buckets whose only sessions moved elsewhere
+                conn.execute(
+                    "DELETE FROM Session_Rollup_Hourly WHERE bucket >= ? AND bucket < ? AND sessions <= 0",
+                    (day, day + "~"),
+                )
+                conn.execute("DELETE FROM Session_Rollup_Daily WHERE bucket = ?", (day,))
+                conn.execute('''
+                    INSERT INTO Session_Rollup_Daily
+                    SELECT substr(bucket, 1, 10), driver_id, chargepoint_id, MAX(installation_id),
+                        SUM(sessions), SUM(metered_sessions), SUM(energy_wh), SUM(duration_seconds)
+                    FROM Session_Rollup_Hourly
+                    WHERE bucket >= ? AND bucket < ?
+                    GROUP BY driver_id, chargepoint_id
+                ''', (day, day + "~"))
+            if last_id is not None:
+                conn.execute('''
+                    INSERT INTO Rollup_State (name, last_id) VALUES ('driver_trans', ?)
+                    ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+                ''', (last_id,))
+
+    def usage(self, level="installation", grain="day", start=None, end=None, ids=None):
+        # Sessions, energy (kWh) and charging hours per `level` and time bucket,
+        # for buckets in [start, end). -1 is the id for unknown drivers,
+        # chargepoints or installations.
+        column = LEVELS[level]
+        table = GRAINS[grain]
+        where = []
+        params = []
+        if start is not None:
+            where.append("bucket >= ?")
+            params.append(str(start))
+        if end is not None:
+            where.append("bucket < ?")
+            params.append(str(end))
+        if ids is not None:
+            ids = list(ids)
+            where.append(f"{column} IN ({', '.join('?' * len(ids))})")
+            params.extend(ids)
+        return pd.read_sql_query(f'''
+            SELECT bucket, {column} AS {level}_id, SUM(sessions) AS sessions,
+                SUM(energy_wh) / 1000.0 AS energy_kwh, SUM(duration_seconds) / 3600.0 AS hours
+            FROM {table}
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY bucket, {column}
+            ORDER BY bucket, {column}
+        ''', self.conn, params=params)
+
+    def totals(self, level="installation", start=None, end=None):
+        # Sessions, energy and charging hours per `level` over the whole
+        # [start, end) range, with the average energy of metered sessions
+        column = LEVELS[level]
+        where = []
+        params = []
+        if start is not None:
+            where.append("bucket >= ?")
+            params.append(str(start))
+        if end is not None:
+            where.append("bucket < ?")
+            params.append(str(end))
+        totals = pd.read_sql_query(f'''
+            SELECT {column} AS {level}_id, SUM(sessions) AS sessions,
+                SUM(metered_sessions) AS metered_sessions,
+                SUM(energy_wh) / 1000.0 AS energy_kwh, SUM(duration_seconds) / 3600.0 AS hours
+            FROM Session_Rollup_Daily
+            {"WHERE " + " AND ".join(where) if where else ""}
+            GROUP BY {column}
+            ORDER BY energy_kwh DESC
+        ''', self.conn, params=params)
+        metered = totals["metered_sessions"].to_numpy(dtype="float64")
+        totals["avg_session_kwh"] = np.divide(
+            totals["energy_kwh"].to_numpy(), metered, out=np.full(len(totals), np.nan), where=metered > 0
+        )
+        return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up charging sessions and print usage totals")
+    parser.add_argument("--db", default="fleet.db")
+    parser.add_argument("--level", choices=sorted(LEVELS), default="installation")
+    parser.add_argument("--start", help="first day, e.g. 2024-01-01")
+    parser.add_argument("--end", help="day after the last, e.g. 2025-01-01")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every rollup from scratch")
+    args = parser.parse_args()
+
+    analytics = ChargingAnalytics(args.db)
+    try:
+        start = time.perf_counter()
+        added = analytics.rebuild() if args.rebuild else analytics.refresh()
+        print(f"Rolled up {added} sessions in {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        totals = analytics.totals(args.level, args.start, args.end)
+        print(totals.to_string(index=False))
+        print(f"Answered from rollups in {(time.perf_counter() - start) * 1000:.1f} ms")
+    finally:
+        analytics.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime
+
+from exporter import EXPORT_QUERIES, Exporter
+from inventory import InventoryManager
+
+# Fields each operation reads from a batch record, and how to convert them
+OPERATIONS = {
+    "add-devices": {
+        "type": str, "quantity": int, "production_date": str, "calibration_date": str, "location": str,
+    },
+    "ship": {"type": str, "quantity": int, "destination": str},
+    "purchase": {
+        "item_name": str, "quantity": int, "price": float, "currency": str, "tax": float,
+        "buyer_name": str, "purchase_date": str, "purchase_url": str,
+    },
+}
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def run_operation(manager, op, record):
+    # Apply one operation from a dict of fields. Returns (ok, message).
+    fields = {}
+    for name, convert in OPERATIONS[op].items():
+        value = record.get(name)
+        if value in (None, ""):
+            fields[name] = None
+        else:
+            try:
+                fields[name] = convert(value)
+            except (TypeError, ValueError):
+                return False, f"invalid {name}: {value!r}"
+    if fields.get("quantity") is None or fields["quantity"] <= 0:
+        return False, "quantity must be a positive number"
+
+    if op == "add-devices":
+        if not fields["type"]:
+            return False, "missing type"
+        count, message = manager.add_devices(
+            fields["type"], fields["production_date"] or today(), fields["calibration_date"] or today(),
+            fields["location"], fields["quantity"],
+        )
+        return count > 0, message
+    if op == "ship":
+        if not fields["type"] or not fields["destination"]:
+            return False, "missing type or destination"
+        return manager.log_shipment(fields["type"], fields["quantity"], fields["destination"])
+
+    if not fields["item_name"]:
+        return False, "missing item_name"
+    try:
+        manager.purchase_bom_items(
+            fields["purchase_date"] or today(), fields["buyer_name"], fields["item_name"], fields["quantity"],
+            fields["price"], fields["currency"] or "CAD", fields["tax"], fields["purchase_url"],
+        )
+    except sqlite3.IntegrityError as e:
+        return False, f"purchase rejected: {e}"
+    return True, "Purchase recorded."
+
+
+class BadRecord:
+    # Stands in for a line that couldn't be parsed, so it fails on its own
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def read_records(path, file_format=None):
+    # Yields (line number, record) from a JSONL or CSV file; "-" reads stdin.
+    # Unparseable lines are yielded as BadRecord.
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    f = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+    try:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            try:
+                for record in reader:
+                    yield reader.line_num, record
+            except csv.Error as e:
+                # The reader can't resynchronise after this, so stop here
+                yield reader.line_num, BadRecord(f"invalid CSV: {e}")
+        else:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError as e:
+                        yield line_number, BadRecord(f"invalid JSON: {e}")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+class BatchFailed(Exception):
+    pass
+
+
+def record_op(record, default_op):
+    # The record's operation, or None for records that aren't objects
+    if not isinstance(record, dict):
+        return None
+    op = record.get("op") or default_op
+    return op if isinstance(op, str) else None
+
+
+def run_batch(manager, records, default_op=None, batch_size=500, atomic=False):
+    # Apply records in transactions of `batch_size` rows. Each row runs in its
+    # own savepoint, so by default a bad row is skipped and the rest of its
+    # batch still commits; with `atomic`, any failure rolls back its batch.
+    # Returns one (line number, op, ok, message) tuple per record.
+    results = []
+    batch = []
+
+    def flush():
+        start = len(results)
+        try:
+            with manager.batch():
+                for line_number, record in batch:
+                    op = record_op(record, default_op)
+                    if isinstance(record, BadRecord):
+                        results.append((line_number, None, False, record.reason))
+                    elif not isinstance(record, dict):
+                        results.append((line_number, None, False, "record must be a JSON object"))
+                    elif op not in OPERATIONS:
+                        results.append((line_number, op, False, f"unknown operation {record.get('op')!r}"))
+                    else:
+                        results.append((line_number, op, *run_operation(manager, op, record)))
+                    if atomic and not results[-1][2]:
+                        raise BatchFailed
+        except BatchFailed:
+            failed = results[-1]
+            del results[start:]
+            results.extend(
+                (line_number, record_op(record, default_op), False,
+                 failed[3] if line_number == failed[0] else f"rolled back with line {failed[0]}")
+                for line_number, record in batch
+            )
+        batch.clear()
+
+    for line_number, record in records:
+        batch.append((line_number, record))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return results
+
+
+def print_rows(headers, rows, output_format):
+    if output_format == "json":
+        print(json.dumps([dict(zip(headers, row)) for row in rows], indent=2))
+    elif output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(headers)
+        writer.writerows(rows)
+    else:
+        rows = [[("" if value is None else str(value)) for value in row] for row in rows]
+        widths = [max([len(h)] + [len(row[i]) for row in rows]) for i, h in enumerate(headers)]
+        print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+        for row in rows:
+            print("  ".join(value.ljust(w) for value, w in zip(row, widths)))
+
+
+def summary(manager, what):
+    # (headers, rows) for one of the summaries shown in the app
+    if what == "devices":
+        return (
+            ["type", "location", "production_date", "calibration_date", "count"],
+            [row[:5] for row in manager.get_device_summary()],
+        )
+    if what == "stats":
+        return ["total_devices", "device_types", "locations"], [manager.get_device_stats()]
+    if what == "bom":
+        return ["item_name", "total_quantity"], manager.get_bom_inventory_summary()
+    if what == "buildable":
+        return ["device_type", "buildable"], sorted(manager.calculate_buildable_units().items())
+    if what == "limiting":
+        buildable = manager.calculate_buildable_units()
+        return (
+            ["device_type", "buildable", "limiting_items"],
+            [(device_type, buildable[device_type], ", ".join(items))
+             for device_type, items in sorted(manager.get_limiting_items().items())],
+        )
+    if what == "plan":
+        buildable = manager.calculate_buildable_units()
+        return (
+            ["device_type", "buildable_alone", "planned"],
+            [(device_type, buildable[device_type], units) for device_type, units in sorted(manager.plan_build_mix().items())],
+        )
+    if what == "costs":
+        costs = sorted(manager.get_device_costs().items())
+        return (
+            ["device_type", "unit_cost", "uncosted_items"],
+            [(device_type, round(cost, 2), uncosted) for device_type, (cost, uncosted) in costs],
+        )
+    if what == "item-costs":
+        return (
+            ["item_name", "unit_cost", "on_hand", "stock_value"],
+            [(item, round(cost, 4), on_hand, round(value, 2)) for item, cost, on_hand, value in manager.get_item_costs()],
+        )
+    query = manager.shipments_query()
+    rows = []
+    while True:
+        after = query.page_key(rows[-1], "shipment_date") if rows else None
+        page = manager.fetch_page(query, "shipment_date", True, after)
+        rows.extend(page)
+        if len(page) < 200:
+            return list(query.columns), rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inventory management from the command line")
+    parser.add_argument("--db", default=os.environ.get("INVENTORY_DB", "inventory.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add-devices", help="build devices, consuming BOM stock")
+    add.add_argument("type")
+    add.add_argument("quantity", type=int)
+    add.add_argument("--production-date", default=None, help="default: today")
+    add.add_argument("--calibration-date", default=None, help="default: today")
+    add.add_argument("--location")
+
+    ship = commands.add_parser("ship", help="log a shipment of in-stock devices")
+    ship.add_argument("type")
+    ship.add_argument("quantity", type=int)
+    ship.add_argument("destination")
+
+    purchase = commands.add_parser("purchase", help="record a BOM purchase")
+    purchase.add_argument("item_name")
+    purchase.add_argument("quantity", type=int)
+    purchase.add_argument("price", type=float)
+    purchase.add_argument("--currency", choices=["CAD", "USD"], default="CAD")
+    purchase.add_argument("--tax", type=float)
+    purchase.add_argument("--buyer", dest="buyer_name")
+    purchase.add_argument("--date", dest="purchase_date", help="default: today")
+    purchase.add_argument("--url", dest="purchase_url")
+
+    rate = commands.add_parser("rate", help="set a currency's rate to CAD for costing purchases")
+    rate.add_argument("currency", choices=["CAD", "USD"])
+    rate.add_argument("rate", type=float)
+
+    show = commands.add_parser("summary", help="print a summary")
+    show.add_argument("what", choices=[
+        "devices", "stats", "bom", "buildable", "limiting", "plan", "costs", "item-costs", "shipments",
+    ])
+    show.add_argument("--format", choices=["table", "json", "csv"], default="table")
+
+    batch = commands.add_parser("batch", help="apply a JSONL or CSV file of operations")
+    batch.add_argument("file", help='input file, "-" for stdin')
+    batch.add_argument("--op", choices=sorted(OPERATIONS), help="operation for records without an op field")
+    batch.add_argument("--format", choices=["jsonl", "csv"], help="default: from the file extension")
+    batch.add_argument("--batch-size", type=int, default=500, help="records per transaction")
+    batch.add_argument("--atomic", action="store_true", help="roll back a whole batch if any record fails")
+    batch.add_argument("--quiet", action="store_true", help="only report failed records")
+
+    export = commands.add_parser("export", help="stream a table or summary to CSV, JSONL or Parquet")
+    export.add_argument("what", choices=sorted(EXPORT_QUERIES))
+    export.add_argument("path")
+    export.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="default: from the file extension")
+    export.add_argument("--batch-size", type=int, default=10000, help="rows fetched and written at a time")
+
+    args = parser.parse_args(argv)
+    manager = InventoryManager(args.db)
+    try:
+        if args.command == "summary":
+            try:
+                print_rows(*summary(manager, args.what), args.format)
+            except (ValueError, ImportError) as e:
+                print(e, file=sys.stderr)
+                return 1
+            return 0
+
+        if args.command == "rate":
+            ok, message = manager.set_currency_rate(args.currency, args.rate)
+            print(message, file=sys.stdout if ok else sys.stderr)
+            return 0 if ok else 1
+
+        if args.command == "export":
+            try:
+                rows = Exporter(manager, args.batch_size).export(args.what, args.path, args.format)
+            except (ValueError, ImportError) as e:
+                print(e, file=sys.stderr)
+                return 1
+            print(f"Exported {rows} rows to {args.path}", file=sys.stderr)
+            return 0
+
+        if args.command == "batch":
+            results = run_batch(
+                manager, read_records(args.file, args.format), args.op, args.batch_size, args.atomic
+            )
+            failed = 0
+            for line_number, op, ok, message in results:
+                failed += not ok
+                if not ok or not args.quiet:
+                    print(json.dumps({"line": line_number, "op": op, "ok": ok, "message": message}))
+            print(f"{len(results) - failed} succeeded, {failed} failed", file=sys.stderr)
+            return 1 if failed else 0
+
+        ok, message = run_operation(manager, args.command, vars(args))
+        print(message, file=sys.stdout if ok else sys.stderr)
+        return 0 if ok else 1
+    finally:
+        manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
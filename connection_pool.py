@@ -0,0 +1,92 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    # Hands out one SQLite connection per thread, reusing released
+    # connections from a small idle pool. Every connection runs in WAL mode
+    # (readers don't block the writer), enforces foreign keys, and uses
+    # synchronous=NORMAL and a busy timeout so concurrent writers - other
+    # threads or other processes on the same file - wait for the lock instead
+    # of failing with "database is locked".
+    def __init__(self, db_name, size=4, busy_timeout=5.0, cached_statements=256):
+        self.db_name = db_name
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.on_connect = []  # callables run with each new connection
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        for hook in self.on_connect:
+            hook(conn)
+        with self.lock:
+            self.connections.add(conn)
+        return conn
+
+    def open_connections(self):
+        with self.lock:
+            return list(self.connections)
+
+    def get(self):
+        # The calling thread's connection, checked out on first use
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            try:
+                conn = self.idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self.local.conn = conn
+        return conn
+
+    def release(self):
+        # Give the calling thread's connection back to the pool
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            return
+        self.local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self.idle.put_nowait(conn)
+        except queue.Full:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        # Borrow a connection for a block of work on a short-lived thread
+        owned = getattr(self.local, "conn", None) is None
+        conn = self.get()
+        try:
+            yield conn
+        finally:
+            if owned:
+                self.release()
+
+    def _close(self, conn):
+        with self.lock:
+            self.connections.discard(conn)
+        conn.close()
+
+    def close_all(self):
+        with self.lock:
+            connections = list(self.connections)
+            self.connections.clear()
+        for conn in connections:
+            conn.close()
+        self.local = threading.local()
+        self.idle = queue.LifoQueue(maxsize=self.idle.maxsize)
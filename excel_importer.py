@@ -0,0 +1,224 @@
+import argparse
+import glob
+import hashlib
+import itertools
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, datetime
+
+from openpyxl import load_workbook
+
+# Rows sampled (after the header) to infer column types
+SAMPLE_ROWS = 1000
+# Rows scanned at the top of a sheet when looking for the header row
+HEADER_SCAN_ROWS = 10
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def table_name(path, sheet):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return re.sub(r"\W+", "_", f"{stem}_{sheet}").strip("_")
+
+
+def column_names(header):
+    # Blank headers get a positional name; repeated names get a suffix
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = str(value).strip() if value not in (None, "") else f"column_{i + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+# Column types in the order infer_type tries them, with the cell value types
+# each one holds and how those cells are bound
+COLUMN_TYPES = [
+    ("INTEGER", (bool, int), int),
+    ("REAL", (bool, int, float), float),
+    ("TIMESTAMP", (datetime,), None),
+    ("DATE", (date, datetime), None),
+]
+
+
+def infer_type(values):
+    # SQL type for a column from its sampled values (None = empty cell)
+    kinds = {type(value) for value in values if value is not None and value != ""}
+    if not kinds:
+        return "TEXT"
+    for sql_type, accepted, _ in COLUMN_TYPES:
+        if kinds <= set(accepted):
+            return sql_type
+    return "TEXT"
+
+
+def to_sql_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def value_converter(sql_type):
+    # Converts cells for a column of `sql_type`. Only the first rows were
+    # sampled, so a later cell may not be of the column's type; it's stored
+    # as text (and an empty string as NULL, as inference treats it).
+    for name, accepted, convert in COLUMN_TYPES:
+        if name == sql_type and convert is not None:
+            def converter(value):
+                if type(value) in accepted:
+                    return convert(value)
+                if value == "":
+                    return None
+                return to_sql_value(value)
+            return converter
+    return to_sql_value
+
+
+class ExcelImporter:
+    # Imports every sheet of one or more workbooks into SQLite tables named
+    # <workbook>_<sheet>. Sheets are streamed with openpyxl's read-only row
+    # iterator, column types are inferred from the first rows, and rows are
+    # written in chunks of `chunk_size`, one transaction each.
+    #
+    # The SHA-256 of each imported file is kept in Excel_Imports; a file whose
+    # content hasn't changed since its last import is skipped.
+    def __init__(self, db_name="my_database.db", chunk_size=5000):
+        self.conn = sqlite3.connect(db_name)
+        self.chunk_size = chunk_size
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS Excel_Imports (
+                path TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                imported_at TIMESTAMP,
+                tables TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def import_file(self, path, force=False):
+        # Returns the tables written, or None if the file was unchanged
+        digest = file_hash(path)
+        key = os.path.abspath(path)
+        row = self.conn.execute("SELECT sha256, tables FROM Excel_Imports WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == digest and not force:
+            return None
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        tables = {}
+        try:
+            for sheet in workbook.worksheets:
+                table = table_name(path, sheet.title)
+                tables[table] = self.import_sheet(sheet, table)
+        finally:
+            workbook.close()
+
+        with self.conn:
+            # Sheets removed or renamed since the last import leave no table behind,
+            # unless another imported workbook has a table of the same name
+            previous = set(row[1].split(",")) if row and row[1] else set()
+            for stale in previous - set(tables):
+                shared = self.conn.execute('''
+                    SELECT 1 FROM Excel_Imports WHERE path != ? AND instr(',' || tables || ',', ?) > 0
+                ''', (key, f",{stale},")).fetchone()
+                if shared is None:
+                    self.conn.execute(f'DROP TABLE IF EXISTS "{stale}"')
+            self.conn.execute('''
+                INSERT OR REPLACE INTO Excel_Imports (path, sha256, imported_at, tables)
+                VALUES (?, ?, ?, ?)
+            ''', (key, digest, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), ",".join(tables)))
+        return tables
+
+    def import_sheet(self, sheet, table):
+        # Returns the number of rows written
+        rows = sheet.iter_rows(values_only=True)
+
+        # The header is the first row that fills more than half the width of
+        # the fullest of the first few rows; some sheets have a title row above it
+        top = [row for _, row in zip(range(HEADER_SCAN_ROWS), rows)]
+        if not top:
+            return 0
+        filled = [sum(value not in (None, "") for value in row) for row in top]
+        header_index = next(i for i, count in enumerate(filled) if count * 2 > max(filled))
+        columns = column_names(top[header_index])
+        width = len(columns)
+
+        # Sample the next rows to infer types; they're written with the rest
+        pending = top[header_index + 1:]
+        pending.extend(row for _, row in zip(range(SAMPLE_ROWS - len(pending)), rows))
+        types = [infer_type([row[i] if i < len(row) else None for row in pending]) for i in range(width)]
+
+        quoted = [f'"{column}"' for column in columns]
+        with self.conn:
+            self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            self.conn.execute(
+                f'CREATE TABLE "{table}" ({", ".join(f"{c} {t}" for c, t in zip(quoted, types))})'
+            )
+        insert = f'INSERT INTO "{table}" ({", ".join(quoted)}) VALUES ({", ".join("?" * width)})'
+
+        converters = [value_converter(sql_type) for sql_type in types]
+        written = 0
+        chunk = []
+        for row in itertools.chain(pending, rows):
+            values = [convert(value) for convert, value in zip(converters, row)]
+            if all(value is None for value in values):
+                continue  # Trailing blank rows
+            values.extend([None] * (width - len(values)))
+            chunk.append(values)
+            if len(chunk) >= self.chunk_size:
+                written += self._write_chunk(insert, chunk)
+                chunk = []
+        if chunk:
+            written += self._write_chunk(insert, chunk)
+        return written
+
+    def _write_chunk(self, insert, chunk):
+        with self.conn:
+            self.conn.executemany(insert, chunk)
+        return len(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import Excel workbooks into SQLite")
+    parser.add_argument("files", nargs="*", help="workbooks to import (default: data/*.xlsx)")
+    parser.add_argument("--db", default="my_database.db")
+    parser.add_argument("--force", action="store_true", help="re-import files even if unchanged")
+    args = parser.parse_args()
+
+    importer = ExcelImporter(args.db)
+    try:
+        for path in args.files or sorted(glob.glob(os.path.join("data", "*.xlsx"))):
+            start = time.perf_counter()
+            tables = importer.import_file(path, force=args.force)
+            if tables is None:
+                print(f"{path}: unchanged, skipped")
+                continue
+            for table, count in tables.items():
+                print(f"{path}: {count} rows -> {table}")
+            print(f"{path}: imported in {time.perf_counter() - start:.2f}s")
+    finally:
+        importer.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,271 @@
+import csv
+import json
+import os
+import sqlite3
+
+# Rows fetched from SQLite and written per batch
+EXPORT_BATCH_SIZE = 10000
+
+# Export name -> query. Summaries are the same groupings the app shows.
+EXPORT_QUERIES = {
+    "devices": '''
+        SELECT uid, type, production_date, calibration_date, location, status FROM Devices
+    ''',
+    "shipments": '''
+        SELECT shipment_id, device_type, shipment_date, destination, quantity FROM Shipments
+    ''',
+    "bom": '''
+        SELECT item_name, total_quantity FROM BOM
+    ''',
+    "bom_purchases": '''
+        SELECT purchase_id, purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url
+        FROM BOM_Purchases
+    ''',
+    "device_summary": '''
+        SELECT type, location, COUNT(*) AS count, production_date, calibration_date
+        FROM Devices
+        WHERE status = 'In Stock'
+        GROUP BY type, location, production_date, calibration_date
+    ''',
+    "bom_summary": '''
+        SELECT br.device_type, br.item_name, br.required_per_unit,
+               COALESCE(b.total_quantity, 0) AS available_quantity,
+               COALESCE(b.total_quantity, 0) / br.required_per_unit AS buildable_units
+        FROM BOM_Requirements br
+        LEFT JOIN BOM b ON b.item_name = br.item_name
+        WHERE br.required_per_unit > 0
+    ''',
+    "item_costs": '''
+        SELECT c.item_name, c.unit_cost, COALESCE(b.total_quantity, 0) AS on_hand, c.updated_at
+        FROM Item_Costs c
+        LEFT JOIN BOM b ON b.item_name = c.item_name
+    ''',
+    "build_costs": '''
+        SELECT build_id, built_at, device_type, quantity, unit_cost, quantity * unit_cost AS total_cost, uncosted_items
+        FROM Build_Costs
+    ''',
+}
+
+# File extension -> format
+EXPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class CsvWriter:
+    def __init__(self, f, columns):
+        self.writer = csv.writer(f)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        pass
+
+
+class JsonlWriter:
+    def __init__(self, f, columns):
+        self.f = f
+        self.columns = columns
+
+    def write(self, rows):
+        columns = self.columns
+        self.f.write("".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows))
+
+    def close(self):
+        pass
+
+
+class EncodedJsonlWriter:
+    # Rows already encoded by SQLite's json_object(), one string per row
+    def __init__(self, f, columns):
+        self.f = f
+
+    def write(self, rows):
+        self.f.write("".join(row[0] + "\n" for row in rows))
+
+    def close(self):
+        pass
+
+
+def arrow_type(pa, declared):
+    # Arrow type for a SQLite declared column type, by SQLite's affinity
+    # rules; None when the type says nothing (expressions, NUMERIC)
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return pa.int64()
+    if any(name in declared for name in ("CHAR", "CLOB", "TEXT", "DATE", "TIME")):
+        return pa.string()
+    if "BLOB" in declared:
+        return pa.binary()
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return pa.float64()
+    return None
+
+
+class ParquetWriter:
+    # One row group per batch. Column types come from the query's declared
+    # types; a column without one (an expression) takes the type of its first
+    # non-NULL value, and batches are held back until every such column has
+    # had one. Columns that are NULL throughout are written as strings.
+    # pyarrow is only needed for this format.
+    def __init__(self, path, columns, declared_types=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow (pip install pyarrow)") from None
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.columns = columns
+        self.types = [arrow_type(pa, declared) for declared in (declared_types or [None] * len(columns))]
+        self.pending = []
+        self.writer = None
+
+    def write(self, rows):
+        if self.writer is not None:
+            self._write_table(rows)
+            return
+        self.pending.append(rows)
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        for i, column_values in enumerate(values):
+            if self.types[i] is None:
+                array_type = self.pa.array(column_values).type
+                if not self.pa.types.is_null(array_type):
+                    self.types[i] = array_type
+        if all(array_type is not None for array_type in self.types):
+            self._open()
+
+    def _open(self):
+        pa = self.pa
+        self.schema = pa.schema([
+            pa.field(column, pa.string() if array_type is None else array_type)
+            for column, array_type in zip(self.columns, self.types)
+        ])
+        self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        pending, self.pending = self.pending, []
+        for rows in pending:
+            self._write_table(rows)
+
+    def _write_table(self, rows):
+        pa = self.pa
+        values = list(zip(*rows)) if rows else [()] * len(self.columns)
+        arrays = []
+        for column_values, field in zip(values, self.schema):
+            try:
+                arrays.append(pa.array(column_values, type=field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                raise ValueError(f"Column {field.name} doesn't fit its Parquet type {field.type}: {e}") from None
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self.writer is None:
+            self._open()
+        self.writer.close()
+
+
+class Exporter:
+    # Streams a table or summary query to CSV, JSONL or Parquet.
+    #
+    # Rows are fetched with fetchmany and written a batch at a time, so
+    # memory use stays flat whatever the table size. The export reads on the
+    # calling thread's pooled connection in one read transaction (a
+    # consistent snapshot; WAL mode lets writers carry on meanwhile), and is
+    # written to "<path>.part" and renamed when complete, so a failed or
+    # cancelled export never leaves a truncated file behind.
+    def __init__(self, manager, batch_size=EXPORT_BATCH_SIZE):
+        self.manager = manager
+        self.batch_size = batch_size
+
+    @staticmethod
+    def has_json(conn):
+        # JSON functions are built into SQLite 3.38+ and most older builds
+        try:
+            conn.execute("SELECT json_object()")
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    @staticmethod
+    def format_for(path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in EXPORT_FORMATS:
+            raise ValueError(f"Can't tell the export format from {path!r}; use one of {', '.join(EXPORT_FORMATS)}")
+        return EXPORT_FORMATS[extension]
+
+    @staticmethod
+    def declared_types(conn, sql):
+        # Declared types of the query's result columns ('' for expressions),
+        # read from a temporary view without running the query
+        conn.execute(f"CREATE TEMP VIEW Export_Columns AS {sql}")
+        try:
+            return [row[2] for row in conn.execute("PRAGMA temp.table_info(Export_Columns)")]
+        finally:
+            conn.execute("DROP VIEW temp.Export_Columns")
+
+    def export(self, name, path, format=None, progress=None, cancel=None):
+        # Write export `name` to `path` and return the number of rows.
+        # progress(rows_written) is called after every batch, on this thread;
+        # setting the `cancel` event stops the export with ExportCancelled.
+        if name not in EXPORT_QUERIES:
+            raise ValueError(f"Unknown export: {name}")
+        format = format or self.format_for(path)
+        if format not in ("csv", "jsonl", "parquet"):
+            raise ValueError(f"Unknown export format: {format}")
+        sql = EXPORT_QUERIES[name]
+        partial = path + ".part"
+
+        conn = self.manager.conn
+        # Inside a caller's transaction (e.g. manager.batch()) that
+        # transaction is already the snapshot
+        owned = not conn.in_transaction
+        if owned:
+            conn.execute("BEGIN")
+        try:
+            columns = [description[0] for description in conn.execute(f"SELECT * FROM ({sql}) LIMIT 0").description]
+            writer_class = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}[format]
+            if format == "jsonl" and self.has_json(conn):
+                # Encoding in SQLite is about 3x faster than json.dumps per row
+                pairs = ", ".join(f"'{column}', \"{column}\"" for column in columns)
+                sql = f"SELECT json_object({pairs}) FROM ({sql})"
+                writer_class = EncodedJsonlWriter
+
+            f = None
+            if format == "parquet":
+                writer = writer_class(partial, columns, self.declared_types(conn, sql))
+            else:
+                f = open(partial, "w", newline="", encoding="utf-8")
+                writer = writer_class(f, columns)
+
+            cursor = conn.cursor()
+            cursor.arraysize = self.batch_size
+            cursor.execute(sql)
+            written = 0
+            try:
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        raise ExportCancelled(f"Export cancelled after {written} rows")
+                    rows = cursor.fetchmany()
+                    if not rows:
+                        break
+                    writer.write(rows)
+                    written += len(rows)
+                    if progress is not None:
+                        progress(written)
+            finally:
+                writer.close()
+                if f is not None:
+                    f.close()
+            os.replace(partial, path)
+            return written
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            if owned:
+                conn.commit()
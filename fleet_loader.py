@@ -0,0 +1,270 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+from connection_pool import ConnectionPool
+
+# Column types for the fleet exports. Columns not listed are loaded as TEXT.
+#   int, real  - numbers ("" is NULL)
+#   flag       - nullable 0/1 flags
+#   datetime   - normalised to "YYYY-MM-DD HH:MM:SS"
+# Rows with a value that doesn't parse as its type are rejected and reported.
+SCHEMAS = {
+    "chargepoint": {
+        "key": "id",
+        "types": {
+            "id": "int", "installation_id": "int", "circuit_id": "int", "licence_id": "int",
+            "firmware_freeze": "flag", "datetime_bootnotification": "datetime", "num_connectors": "int",
+            "max_amps": "real", "shared": "flag", "last_contact": "datetime", "disabled": "flag",
+            "auto_update": "flag", "datetime_created": "datetime",
+        },
+        "indexes": [("circuit_id",), ("installation_id",), ("device_uid",)],
+    },
+    "chargepoint_driver": {
+        "key": "id",
+        "types": {
+            "id": "int", "driver_id": "int", "chargepoint_id": "int", "km_range_limit": "real",
+            "km_per_kwh": "real", "notify_start": "flag", "notify_complete": "flag", "notify_auth": "flag",
+            "auto_remotestart_hours": "int",
+        },
+        "indexes": [("driver_id",), ("chargepoint_id",)],
+    },
+    "circuit": {
+        "key": "id",
+        "types": {"id": "int", "subpanel_id": "int", "breaker_number": "int", "max_amps": "real"},
+        "indexes": [("subpanel_id",)],
+    },
+    "controller": {
+        "key": "id",
+        "types": {
+            "id": "int", "installation_id": "int", "master_controller_id": "int",
+            "sensed_max_amps": "real", "derate_factor": "real", "coil_rating": "real", "nominal_voltage": "real",
+            "controller_dirty": "flag", "driver_dirty": "flag", "region_id": "int", "tou_plan_id": "int",
+        },
+        "indexes": [("installation_id",)],
+    },
+    "device": {
+        "key": "uid",
+        "types": {
+            "controller_id": "int", "build_tunnel": "flag", "pcb_version": "int", "pcb_dipswitch_value": "int",
+            "jacks_state": "int", "sensors_fault": "int", "phases_detected": "int", "frequency_detected": "real",
+            "firmware_version": "int", "datetime_reboot": "datetime", "datetime_online": "datetime",
+            "datetime_tunnel": "datetime", "datetime_vglms_start": "datetime", "datetime_button_user": "datetime",
+            "datetime_button_user_long": "datetime", "datetime_reset": "datetime",
+            "datetime_reset_long": "datetime", "datetime_created": "datetime", "tunnel_ping_time": "int",
+            "calibration_version": "int",
+        },
+        "indexes": [("controller_id",)],
+    },
+    "driver": {
+        "key": "id",
+        "types": {
+            "id": "int", "installation_id": "int", "auth_shared": "flag", "notify_suspend": "flag",
+            "autopay_invoice": "flag", "email_invoices": "flag", "amps_limit": "real",
+            "allow_mid_peak_charging": "flag", "otp_datetime": "datetime", "notify_blocked": "flag",
+            "datetime_created": "datetime",
+        },
+        "indexes": [("installation_id",)],
+    },
+    "driver_trans": {
+        "key": "id",
+        "types": {
+            "id": "int", "timestamp": "datetime", "trans_period_id": "int", "driver_id": "int",
+            "chargepoint_id": "int", "start_datetime": "datetime", "ocpp_trans_id": "int",
+            "stop_datetime": "datetime", "meter_start": "int", "meter_stop": "int", "seconds_alloc": "int",
+            "priority_charge": "flag", "priority_charge_paid": "flag", "shared": "flag",
+            "suspev_datetime": "datetime", "range_limit_datetime": "datetime", "plugout_datetime": "datetime",
+            "overstay_chargeable_minutes": "int", "connector": "int", "invoice_id": "int",
+        },
+        "indexes": [("chargepoint_id", "start_datetime"), ("driver_id", "start_datetime")],
+    },
+    "subpanel": {
+        "key": "id",
+        "types": {
+            "id": "int", "controller_id": "int", "sensing_controller_id": "int", "max_amps": "real",
+            "derate_nonev_amps": "real", "derate_when_sensed": "flag",
+        },
+        "indexes": [("controller_id",)],
+    },
+}
+
+CANONICAL_DATETIME = re.compile(r"\d{4}-[01]\d-[0-3]\d [0-2]\d:[0-5]\d:[0-5]\d")
+
+SQL_TYPES = {"int": "INTEGER", "flag": "INTEGER", "real": "REAL", "text": "TEXT", "datetime": "TEXT"}
+
+
+def to_int(value):
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        # Some exports write integers as "3.0"; anything with a fraction is bad
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError(f"not an integer: {value!r}") from None
+        return int(number)
+
+
+def to_real(value):
+    return float(value) if value != "" else None
+
+
+def to_flag(value):
+    if value == "":
+        return None
+    flag = int(value)
+    if flag not in (0, 1):
+        raise ValueError(f"not a 0/1 flag: {value!r}")
+    return flag
+
+
+def to_datetime(value):
+    if value == "":
+        return None
+    # Exports are almost always already in canonical form; only parse the rest
+    if CANONICAL_DATETIME.fullmatch(value):
+        return value
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def to_text(value):
+    return value if value != "" else None
+
+
+CONVERTERS = {"int": to_int, "real": to_real, "flag": to_flag, "datetime": to_datetime, "text": to_text}
+
+
+class FleetLoader:
+    # Streams the fleet CSV exports into SQLite. Files are read with the csv
+    # module a chunk at a time, so memory stays flat whatever the file size,
+    # and each chunk is written in one transaction with executemany.
+    #
+    # Re-imports are incremental: each row stores a hash of its raw CSV
+    # values, and the upsert only rewrites rows whose hash changed.
+    def __init__(self, db_name="fleet.db", chunk_size=10000):
+        self.pool = ConnectionPool(db_name, size=1)
+        self.chunk_size = chunk_size
+
+    @property
+    def conn(self):
+        return self.pool.get()
+
+    def close(self):
+        self.pool.close_all()
+
+    def create_table(self, table, header):
+        schema = SCHEMAS[table]
+        types = schema["types"]
+        columns = ", ".join(
+            f'"{column}" {SQL_TYPES[types.get(column, "text")]}' + (" PRIMARY KEY" if column == schema["key"] else "")
+            for column in header
+        )
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({columns}, _row_hash INTEGER)')
+        for index_columns in schema.get("indexes", []):
+            name = f"{table}_{'_'.join(index_columns)}"
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(index_columns)})'
+            )
+        self.conn.commit()
+
+    def load(self, path, table=None):
+        # Load one export; the table defaults to the file name (driver_trans.csv -> driver_trans).
+        # Returns counts of rows read, written (new or changed), unchanged and
+        # rejected, plus the first few rejection reasons.
+        table = table or os.path.splitext(os.path.basename(path))[0]
+        if table not in SCHEMAS:
+            raise ValueError(f"No schema for {table}")
+        key = SCHEMAS[table]["key"]
+        stats = {"table": table, "read": 0, "written": 0, "unchanged": 0, "rejected": 0, "errors": []}
+        start = time.perf_counter()
+
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            if key not in header:
+                raise ValueError(f"{path} has no {key} column")
+            self.create_table(table, header)
+
+            types = SCHEMAS[table]["types"]
+            converters = [CONVERTERS[types.get(column, "text")] for column in header]
+            key_index = header.index(key)
+            quoted = [f'"{column}"' for column in header]
+            sql = f'''
+                INSERT INTO "{table}" ({", ".join(quoted)}, _row_hash)
+                VALUES ({", ".join("?" * (len(header) + 1))})
+                ON CONFLICT ("{key}") DO UPDATE SET
+                    {", ".join(f"{column} = excluded.{column}" for column in quoted)},
+                    _row_hash = excluded._row_hash
+                WHERE "{table}"._row_hash IS NOT excluded._row_hash
+            '''
+
+            chunk = []
+            for raw in reader:
+                stats["read"] += 1
+                try:
+                    chunk.append(self._convert(raw, converters, len(header), key_index))
+                except ValueError as e:
+                    stats["rejected"] += 1
+                    if len(stats["errors"]) < 10:
+                        stats["errors"].append(f"line {reader.line_num}: {e}")
+                    continue
+                if len(chunk) >= self.chunk_size:
+                    stats["written"] += self._write_chunk(sql, chunk)
+                    chunk = []
+            if chunk:
+                stats["written"] += self._write_chunk(sql, chunk)
+
+        stats["unchanged"] = stats["read"] - stats["written"] - stats["rejected"]
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    @staticmethod
+    def _convert(raw, converters, width, key_index):
+        if len(raw) != width:
+            raise ValueError("wrong number of fields")
+        # A NULL key never conflicts, so the row would be inserted again on every import
+        if raw[key_index] == "":
+            raise ValueError("missing key")
+        row_hash = int.from_bytes(
+            hashlib.blake2b("\x1f".join(raw).encode(), digest_size=8).digest(), "big", signed=True
+        )
+        return [convert(value) for convert, value in zip(converters, raw)] + [row_hash]
+
+    def _write_chunk(self, sql, chunk):
+        conn = self.conn
+        before = conn.total_changes
+        with conn:
+            conn.executemany(sql, chunk)
+        return conn.total_changes - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load fleet CSV exports into SQLite")
+    parser.add_argument("files", nargs="*", help="CSV exports (default: every known export in the current directory)")
+    parser.add_argument("--db", default="fleet.db")
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    files = args.files or [f"{table}.csv" for table in SCHEMAS if os.path.exists(f"{table}.csv")]
+    loader = FleetLoader(args.db, args.chunk_size)
+    try:
+        for path in files:
+            stats = loader.load(path)
+            print(
+                f"{stats['table']}: {stats['read']} read, {stats['written']} written, "
+                f"{stats['unchanged']} unchanged, {stats['rejected']} rejected in {stats['seconds']}s"
+            )
+            for error in stats["errors"]:
+                print(f"    {error}")
+    finally:
+        loader.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
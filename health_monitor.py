@@ -0,0 +1,261 @@
+import argparse
+import heapq
+import re
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+# Device columns that record the device doing something; the latest one is
+# taken as its last contact
+DEVICE_CONTACT_COLUMNS = (
+    "datetime_online", "datetime_reboot", "datetime_tunnel", "datetime_vglms_start",
+    "datetime_button_user", "datetime_button_user_long", "datetime_reset", "datetime_reset_long",
+)
+
+# How often each kind is expected to be heard from
+CONTACT_INTERVALS = {"device": timedelta(days=1), "chargepoint": timedelta(hours=1)}
+
+
+def parse_time(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def parse_ping_time(value):
+    # tunnel_ping_time is the Unix time of the last tunnel ping; 0 if never
+    if value in (None, "", 0, "0"):
+        return None
+    return datetime.fromtimestamp(int(float(value)))
+
+
+def version_key(version):
+    # "V00.50.02" -> (0, 50, 2), 11226 -> (11226,); unknown versions sort first
+    if version in (None, "", 0, "0"):
+        return None
+    return tuple(int(part) for part in re.findall(r"\d+", str(version))) or None
+
+
+class HealthMonitor:
+    # Tracks when each device and chargepoint is next expected to make
+    # contact, and which are stale, faulted or behind on firmware.
+    #
+    # Healthy units sit in a heap ordered by next expected contact, so check()
+    # only pops the k units that have fallen due (O(k log n)) instead of
+    # scanning the fleet. Updates push a fresh heap entry and leave the old
+    # one behind; entries that no longer match the unit's current deadline
+    # are skipped when popped. Units past their deadline move to `stale`
+    # until they make contact again.
+    #
+    # Units are keyed ("device", uid) or ("chargepoint", id).
+    def __init__(self, intervals=None, grace=timedelta(0)):
+        self.intervals = dict(CONTACT_INTERVALS, **(intervals or {}))
+        self.grace = grace
+        self.heap = []
+        self.deadlines = {}
+        self.last_contact = {}
+        self.stale = {}
+        self.faults = {}
+        # firmware[group][version key] = units on that version; a group is
+        # the device kind, or the model for chargepoints from many vendors
+        self.firmware = {}
+        self.firmware_of = {}
+        # Newest version seen in each group, and the number of units in each
+        # group on an older one, kept up to date as units change version
+        self.latest = {}
+        self.behind = {}
+
+    @classmethod
+    def load(cls, conn, **kwargs):
+        # Build from the device and chargepoint tables loaded by fleet_loader
+        monitor = cls(**kwargs)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute("SELECT * FROM device"):
+                monitor.update_device(row)
+            for row in conn.execute("SELECT * FROM chargepoint"):
+                monitor.update_chargepoint(row)
+        finally:
+            conn.row_factory = None
+        return monitor
+
+    def __len__(self):
+        return len(self.deadlines) + len(self.stale)
+
+    # Updates
+
+    def update_device(self, row):
+        # `row` is a mapping of device columns, e.g. a csv.DictReader row
+        contacts = [parse_time(row[column]) for column in DEVICE_CONTACT_COLUMNS if column in row.keys()]
+        if "tunnel_ping_time" in row.keys():
+            contacts.append(parse_ping_time(row["tunnel_ping_time"]))
+        key = ("device", row["uid"])
+        self._contact(key, max((c for c in contacts if c is not None), default=None))
+        fault = row["sensors_fault"] if "sensors_fault" in row.keys() else None
+        self._set_fault(key, fault)
+        self._set_firmware(key, "device", row["firmware_version"])
+
+    def update_chargepoint(self, row):
+        key = ("chargepoint", int(row["id"]))
+        if str(row["disabled"] or "0") not in ("0", "0.0"):
+            self.remove(key)  # Disabled chargepoints aren't expected to call in
+            return
+        self._contact(key, parse_time(row["last_contact"]))
+        self._set_firmware(key, f"chargepoint {row['model'] or ''}", row["firmware_version"])
+
+    def contact(self, key, when):
+        # Record contact from a unit, e.g. a heartbeat, without a full row
+        self._contact(key, parse_time(when))
+
+    def remove(self, key):
+        # Heap entries for the unit are dropped lazily when popped
+        self.deadlines.pop(key, None)
+        self.last_contact.pop(key, None)
+        self.stale.pop(key, None)
+        self.faults.pop(key, None)
+        self._set_firmware(key, None, None)
+
+    def _contact(self, key, when):
+        previous = self.last_contact.get(key)
+        if when is None or (previous is not None and when <= previous):
+            if key not in self.last_contact:
+                # Never heard from: stale from the start
+                self.last_contact[key] = None
+                self.stale[key] = None
+            return
+        self.last_contact[key] = when
+        self.stale.pop(key, None)
+        deadline = when + self.intervals[key[0]] + self.grace
+        self.deadlines[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+        if len(self.heap) > 2 * len(self.deadlines) + 1024:
+            self.compact()  # Mostly superseded entries; amortised O(1) per update
+
+    def _set_fault(self, key, fault):
+        if fault not in (None, "", 0, "0"):
+            self.faults[key] = int(fault)
+        else:
+            self.faults.pop(key, None)
+
+    def _set_firmware(self, key, group, version):
+        old = self.firmware_of.pop(key, None)
+        if old:
+            old_group, old_version = old
+            versions = self.firmware[old_group]
+            versions[old_version].discard(key)
+            if old_version != self.latest[old_group]:
+                self._add_behind(old_group, -1)
+            if not versions[old_version]:
+                del versions[old_version]
+            if not versions:
+                del self.firmware[old_group]
+                del self.latest[old_group]
+            elif old_version not in versions and old_version == self.latest[old_group]:
+                # The last unit on the newest version left; the next newest is current
+                latest = self.latest[old_group] = max(versions)
+                self._add_behind(old_group, -len(versions[latest]))
+        version = version_key(version)
+        if group is not None and version is not None:
+            versions = self.firmware.setdefault(group, {})
+            versions.setdefault(version, set()).add(key)
+            self.firmware_of[key] = (group, version)
+            latest = self.latest.get(group)
+            if latest is None:
+                self.latest[group] = version
+            elif version > latest:
+                # Everyone on the previous newest version is now behind
+                self.latest[group] = version
+                self._add_behind(group, len(versions[latest]))
+            elif version < latest:
+                self._add_behind(group, 1)
+
+    def _add_behind(self, group, count):
+        count += self.behind.get(group, 0)
+        if count:
+            self.behind[group] = count
+        else:
+            self.behind.pop(group, None)
+
+    # Checks
+
+    def check(self, now=None):
+        # Move units whose deadline has passed to `stale`. Returns the newly
+        # stale units as (key, last contact), oldest first.
+        now = now or datetime.now()
+        newly_stale = []
+        while self.heap and self.heap[0][0] < now:
+            deadline, key = heapq.heappop(self.heap)
+            if self.deadlines.get(key) != deadline:
+                continue  # Superseded by a later contact, or removed
+            del self.deadlines[key]
+            self.stale[key] = self.last_contact[key]
+            newly_stale.append((key, self.last_contact[key]))
+        return newly_stale
+
+    def next_due(self, count=10):
+        # The `count` healthy units expected to fall due soonest
+        due = []
+        for deadline, key in heapq.nsmallest(count + len(self.heap) - len(self.deadlines), self.heap):
+            if self.deadlines.get(key) == deadline:
+                due.append((key, deadline))
+                if len(due) == count:
+                    break
+        return due
+
+    def stale_units(self):
+        # (key, last contact) of every stale unit, never-seen units first
+        return sorted(self.stale.items(), key=lambda item: (item[1] is not None, item[1] or datetime.min))
+
+    def faulted(self):
+        return sorted(self.faults.items())
+
+    def outdated(self):
+        # (key, version) of units behind the newest firmware seen in their
+        # group. Only groups with units behind are looked at.
+        outdated = []
+        for group in self.behind:
+            latest = self.latest[group]
+            for version, keys in self.firmware[group].items():
+                if version != latest:
+                    outdated.extend((key, ".".join(map(str, version))) for key in keys)
+        return sorted(outdated)
+
+    def outdated_count(self):
+        return sum(self.behind.values())
+
+    def compact(self):
+        # Rebuild the heap without superseded entries
+        self.heap = [(deadline, key) for key, deadline in self.deadlines.items()]
+        heapq.heapify(self.heap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report stale, faulted and outdated fleet units")
+    parser.add_argument("--db", default="fleet.db")
+    parser.add_argument("--now", help="check as of this time (default: now)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        monitor = HealthMonitor.load(conn)
+    finally:
+        conn.close()
+
+    monitor.check(parse_time(args.now) if args.now else None)
+    stale = monitor.stale_units()
+    print(
+        f"{len(monitor)} units, {len(stale)} stale, {len(monitor.faults)} faulted, "
+        f"{monitor.outdated_count()} outdated"
+    )
+    for (kind, unit), last in stale:
+        print(f"  stale    {kind} {unit}: last contact {last or 'never'}")
+    for (kind, unit), fault in monitor.faulted():
+        print(f"  faulted  {kind} {unit}: sensors_fault {fault}")
+    for (kind, unit), version in monitor.outdated():
+        print(f"  outdated {kind} {unit}: firmware {version}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
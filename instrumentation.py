@@ -0,0 +1,267 @@
+import bisect
+import functools
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# The progress handler runs every this many SQLite VM instructions
+PROGRESS_STEPS = 1000
+
+# Longest statement text kept as a key; longer ones are truncated
+MAX_SQL_LENGTH = 300
+
+
+# String, blob and numeric literals; the trace callback gets statements with
+# their parameters already substituted
+LITERAL = re.compile(r"'(?:[^']|'')*'|\bX'[0-9A-Fa-f]*'|(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+
+
+def normalize_sql(sql):
+    # Replace literals with ? and collapse whitespace, so one statement run
+    # with different parameters, or from differently indented call sites,
+    # is counted once
+    sql = re.sub(r"\s+", " ", LITERAL.sub("?", sql)).strip()
+    return sql if len(sql) <= MAX_SQL_LENGTH else sql[:MAX_SQL_LENGTH] + "..."
+
+
+class LatencyStats:
+    # Count, total, max and a fixed-bucket histogram of durations, plus the
+    # statements, rows and VM steps seen while they ran. For a statement,
+    # `statements` is how often it ran and `count` how often it was timed.
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.statements = 0
+        self.rows = 0
+        self.steps = 0
+
+    def add(self, seconds, statements=0, rows=0, steps=0):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.statements += statements
+        self.rows += rows
+        self.steps += steps
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile (max for the open bucket)
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max, 3),
+            "statements": self.statements,
+            "rows": self.rows,
+            "vm_steps": self.steps,
+            "buckets": dict(zip([f"<={b}" for b in LATENCY_BUCKETS_MS] + ["more"], self.buckets)),
+        }
+
+
+class Span:
+    # One timed method call or UI action on the current thread
+    __slots__ = ("name", "kind", "start", "statements", "rows", "steps", "parent")
+
+    def __init__(self, name, kind, parent):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.rows = 0
+        self.steps = 0
+
+
+class Instrumentation:
+    # Opt-in timing of InventoryManager and the UI actions that call it.
+    #
+    # While enabled, every pooled connection gets a trace callback (one call
+    # per statement executed), a progress handler (VM instructions, a rough
+    # CPU cost) and a row factory that counts rows fetched. A statement's
+    # time runs from when it starts until the next statement on the same
+    # thread starts or the enclosing span ends, so it includes the Python
+    # work done on its rows; statements run outside any span are counted but
+    # not timed. Spans are @instrumented manager methods ("method") and
+    # executor tasks ("action"); a span's counters include its nested spans.
+    #
+    # Disabled, the hooks are removed from the connections and an
+    # instrumented call costs one attribute check.
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.pools = []
+        self.started = None
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}  # (kind, name) -> LatencyStats
+            self.statements = {}  # normalized sql -> LatencyStats
+            self.started = time.time()
+
+    # Connections
+
+    def watch(self, pool):
+        # Hook the pool's connections now (if enabled) and whenever it opens one
+        self.pools.append(pool)
+        pool.on_connect.append(self._on_connect)
+        if self.enabled:
+            for conn in pool.open_connections():
+                self._attach(conn)
+
+    def _on_connect(self, conn):
+        if self.enabled:
+            self._attach(conn)
+
+    def _attach(self, conn):
+        conn.set_trace_callback(self._on_statement)
+        conn.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+        conn.row_factory = self._count_row
+
+    @staticmethod
+    def _detach(conn):
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+        conn.row_factory = None
+
+    def enable(self):
+        self.enabled = True
+        for pool in self.pools:
+            for conn in pool.open_connections():
+                self._attach(conn)
+
+    def disable(self):
+        self.enabled = False
+        for pool in self.pools:
+            for conn in pool.open_connections():
+                self._detach(conn)
+
+    # Hooks, called on the thread running the statement
+
+    def _on_statement(self, sql):
+        now = time.perf_counter()
+        self._close_statement(now)
+        span = getattr(self.local, "span", None)
+        if span is not None:
+            span.statements += 1
+        # [sql, start, rows, steps]; start is None outside a span
+        self.local.statement = [normalize_sql(sql), now if span is not None else None, 0, 0]
+
+    def _on_progress(self):
+        statement = getattr(self.local, "statement", None)
+        if statement is not None:
+            statement[3] += PROGRESS_STEPS
+        span = getattr(self.local, "span", None)
+        if span is not None:
+            span.steps += PROGRESS_STEPS
+        return 0
+
+    def _count_row(self, cursor, row):
+        statement = getattr(self.local, "statement", None)
+        if statement is not None:
+            statement[2] += 1
+        span = getattr(self.local, "span", None)
+        if span is not None:
+            span.rows += 1
+        return row
+
+    def _close_statement(self, now):
+        statement = getattr(self.local, "statement", None)
+        if statement is None:
+            return
+        self.local.statement = None
+        sql, start, rows, steps = statement
+        with self.lock:
+            stats = self.statements.get(sql)
+            if stats is None:
+                stats = self.statements[sql] = LatencyStats()
+            if start is None:
+                stats.statements += 1
+                stats.rows += rows
+                stats.steps += steps
+            else:
+                stats.add(now - start, 1, rows, steps)
+
+    # Spans
+
+    @contextmanager
+    def span(self, name, kind="method"):
+        if not self.enabled:
+            yield
+            return
+        parent = getattr(self.local, "span", None)
+        span = self.local.span = Span(name, kind, parent)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            self._close_statement(now)
+            self.local.span = parent
+            if parent is not None:
+                parent.statements += span.statements
+                parent.rows += span.rows
+                parent.steps += span.steps
+            self.record(name, now - span.start, kind, span.statements, span.rows, span.steps)
+
+    def record(self, name, seconds, kind="action", statements=0, rows=0, steps=0):
+        # Add a duration measured elsewhere, e.g. time to first window
+        with self.lock:
+            stats = self.spans.get((kind, name))
+            if stats is None:
+                stats = self.spans[(kind, name)] = LatencyStats()
+            stats.add(seconds, statements, rows, steps)
+
+    # Reports
+
+    def snapshot(self):
+        with self.lock:
+            spans = sorted(self.spans.items(), key=lambda item: -item[1].total)
+            statements = sorted(self.statements.items(), key=lambda item: -item[1].total)
+            return {
+                "enabled": self.enabled,
+                "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+                "methods": {name: stats.to_dict() for (kind, name), stats in spans if kind == "method"},
+                "actions": {name: stats.to_dict() for (kind, name), stats in spans if kind == "action"},
+                "statements": [dict(stats.to_dict(), sql=sql) for sql, stats in statements],
+            }
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+def instrumented(method):
+    # Time calls to a method of an object with an `instrumentation` attribute
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.instrumentation
+        if not instrumentation.enabled:
+            return method(self, *args, **kwargs)
+        with instrumentation.span(name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,843 @@
+import csv
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from connection_pool import ConnectionPool
+from instrumentation import Instrumentation, instrumented
+from keyset_query import KeysetQuery
+from migrations import migrate
+from query_cache import QueryCache
+
+CROCKFORD_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+# Take a BOM stock snapshot every this many ledger entries
+BOM_SNAPSHOT_INTERVAL = 10000
+
+# Cached query results kept before the least recently used are evicted
+CACHE_MAX_ENTRIES = 256
+
+
+class UlidGenerator:
+    # Monotonic ULIDs: 48 bits of millisecond timestamp followed by 80 random bits.
+    # Within the same millisecond the random part is incremented instead of redrawn,
+    # so ids from one process are strictly increasing and ids from different
+    # processes only collide if 80 random bits do.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_ms = 0
+        self.last_random = 0
+
+    def new(self):
+        with self.lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self.last_ms:
+                self.last_ms = now_ms
+                self.last_random = int.from_bytes(os.urandom(10), "big")
+            else:
+                self.last_random += 1
+                if self.last_random >= 1 << 80:
+                    # Random part overflowed, borrow the next millisecond
+                    self.last_ms += 1
+                    self.last_random = int.from_bytes(os.urandom(10), "big")
+            value = (self.last_ms << 80) | self.last_random
+
+        chars = []
+        for _ in range(26):
+            chars.append(CROCKFORD_ALPHABET[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+
+ulid_generator = UlidGenerator()
+
+
+class _Rollback(Exception):
+    # Raised inside InventoryManager._transaction to roll it back; the
+    # operation then returns `result` (e.g. its (0, message) failure)
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+def new_device_uid(device_type):
+    return f"{device_type}_{ulid_generator.new()}"
+
+
+class InventoryManager:
+    def __init__(self, db_name="inventory.db", pool_size=4, instrumentation=None):
+        # Each thread gets its own connection from the pool, so the manager can
+        # be used from worker threads as well as the Tk main loop
+        self.pool = ConnectionPool(db_name, size=pool_size)
+
+        # Statement and method timings, off until instrumentation.enable()
+        self.instrumentation = instrumentation or Instrumentation()
+        self.instrumentation.watch(self.pool)
+
+        # Read results cached until one of the tables they read from changes.
+        # Every write transaction bumps the written tables' rows in
+        # Table_Versions, so commits from other processes using
+        # InventoryManager invalidate the same entries as local ones.
+        self.cache = QueryCache(CACHE_MAX_ENTRIES)
+        self.pending_changes = threading.local()
+
+        self.create_tables()
+        migrate(self.conn)
+
+    @property
+    def conn(self):
+        return self.pool.get()
+
+    def close(self):
+        self.pool.close_all()
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+
+        # Devices table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Devices (
+                uid TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                production_date DATE,
+                calibration_date DATE,
+                location TEXT,
+                status TEXT DEFAULT 'In Stock'
+            )
+        ''')
+
+        # Shipments table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS Shipments (
+                shipment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                device_type TEXT,
+                shipment_date DATE,
+                destination TEXT,
+                quantity INTEGER
+            )
+        ''')
+
+        # Create BOM table to track unique items
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM (
+                item_name TEXT PRIMARY KEY,
+                total_quantity INTEGER DEFAULT 0
+            )
+        ''')
+
+        # Create a Device_BOM_Mapping table to track device-specific requirements
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM_Requirements (
+            device_type TEXT,
+            item_name TEXT,
+            required_per_unit INTEGER,
+            PRIMARY KEY (device_type, item_name),
+            FOREIGN KEY (item_name) REFERENCES BOM(item_name)
+        );
+        ''')
+
+        # Insert new BOM items
+        bom_items = [
+            "Small Black Box",
+            "Square Foam",
+            "Power Supply Box",
+            "Power Supply w/ NA Blade",
+            "CT200 Coil Box",
+            "CT200 Coil",
+            "WiFi Extender w/ manual",
+            "BeagleBone",
+            "PCB",
+            "VH Front Case",
+            "Back Case",
+            "Side Cases (Top & Bottom)",
+            "Light Pipe",
+            "PCB Screws",
+            "Case Screws",
+            "USB Jumper",
+            "Zip-Ties",
+            "Velcro (Pairs)",
+            "QC Sticker",
+            "Ethernet Cable",
+            "Plastic Bag sm.",
+            "Rogowski Coil",
+            "Power Adapter",
+            "JB-55 Case Pro"
+        ]
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO BOM (item_name) VALUES (?)", 
+            [(item,) for item in bom_items]
+        )
+
+        # Define BOM requirements for each device type
+        bom_requirements = [
+            ("VH", "Small Black Box", 1),
+            ("VH", "Square Foam", 1),
+            ("VH", "Power Supply Box", 1),
+            ("VH", "Power Supply w/ NA Blade", 1),
+            ("VH", "CT200 Coil Box", 1),
+            ("VH", "CT200 Coil", 2),
+            ("VH", "WiFi Extender w/ manual", 1),
+            ("VH", "BeagleBone", 1),
+            ("VH", "PCB", 1),
+            ("VH", "VH Front Case", 1),
+            ("VH", "Back Case", 1),
+            ("VH", "Side Cases (Top & Bottom)", 1),
+            ("VH", "Light Pipe", 9),
+            ("VH", "PCB Screws", 4),
+            ("VH", "Case Screws", 4),
+            ("VH", "USB Jumper", 1),
+            ("VH", "Zip-Ties", 2),
+            ("VH", "Velcro (Pairs)", 4),
+            ("VH", "QC Sticker", 1),
+            ("VH", "Ethernet Cable", 1),
+            ("VH", "Plastic Bag sm.", 1),
+
+
+            ("VP", "Rogowski Coil", 3),
+            ("VP", "Power Adapter", 1),
+            ("VP", "Light Pipe", 9),
+            ("VP", "PCB", 1),
+            ("VP", "JB-55 Case Pro", 1)
+        ]
+
+        cursor.executemany('''
+            INSERT OR IGNORE INTO BOM_Requirements (device_type, item_name, required_per_unit)
+            VALUES (?, ?, ?)
+        ''', bom_requirements)
+        self.conn.commit()
+
+        # BOM Purchases table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM_Purchases (
+                purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                purchase_date DATE,
+                buyer_name TEXT,
+                item_name TEXT,
+                quantity INTEGER,
+                price REAL,
+                currency TEXT CHECK(currency IN ('CAD', 'USD')),
+                tax REAL,
+                purchase_url TEXT,
+                FOREIGN KEY (item_name) REFERENCES BOM (item_name)
+            )
+        ''')
+
+        # Append-only ledger of every stock movement. BOM.total_quantity is kept
+        # as a materialized view of it by the BOM_Ledger_apply trigger.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM_Ledger (
+                entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recorded_at TIMESTAMP NOT NULL,
+                item_name TEXT NOT NULL,
+                delta INTEGER NOT NULL,
+                kind TEXT CHECK(kind IN ('opening', 'purchase', 'build', 'adjustment')),
+                reference TEXT,
+                FOREIGN KEY (item_name) REFERENCES BOM (item_name)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS BOM_Ledger_recorded_at ON BOM_Ledger (recorded_at)
+        ''')
+
+        # Checkpoints of BOM stock, so "stock as of" only replays the ledger
+        # entries recorded after the nearest snapshot
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM_Snapshots (
+                snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                last_entry_id INTEGER NOT NULL,
+                recorded_at TIMESTAMP NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS BOM_Snapshot_Items (
+                snapshot_id INTEGER,
+                item_name TEXT,
+                total_quantity INTEGER,
+                PRIMARY KEY (snapshot_id, item_name),
+                FOREIGN KEY (snapshot_id) REFERENCES BOM_Snapshots (snapshot_id)
+            )
+        ''')
+
+        # Databases created before the ledger existed get their current stock
+        # as opening balances. This runs before the trigger is created, so the
+        # opening rows don't get added to BOM a second time.
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name = 'BOM_Ledger_apply'")
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+                SELECT ?, item_name, total_quantity, 'opening', 'opening balance'
+                FROM BOM
+                WHERE total_quantity != 0
+            ''', (self._now(),))
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS BOM_Ledger_apply
+            AFTER INSERT ON BOM_Ledger
+            BEGIN
+                INSERT OR IGNORE INTO BOM (item_name) VALUES (NEW.item_name);
+                SELECT RAISE(ABORT, 'BOM stock cannot go negative')
+                WHERE (SELECT COALESCE(total_quantity, 0) FROM BOM WHERE item_name = NEW.item_name) + NEW.delta < 0;
+                UPDATE BOM
+                SET total_quantity = COALESCE(total_quantity, 0) + NEW.delta
+                WHERE item_name = NEW.item_name;
+            END
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    @contextmanager
+    def _transaction(self, *tables):
+        # BEGIN IMMEDIATE takes the write lock up front, so a stock check and the
+        # writes that depend on it can't interleave with another writer.
+        # Calls made inside an already open transaction run in a savepoint, so
+        # one failed operation in a batch is undone without losing the rest.
+        # `tables` are the tables written; if anything was written, their
+        # versions are bumped and their cached reads invalidated once the
+        # outermost transaction commits. Raise _Rollback to undo the writes.
+        conn = self.conn
+        before = conn.total_changes
+        changed = getattr(self.pending_changes, "tables", None)
+        if changed is not None:
+            conn.execute("SAVEPOINT nested")
+            try:
+                yield conn.cursor()
+            except BaseException:
+                conn.execute("ROLLBACK TO nested")
+                conn.execute("RELEASE nested")
+                raise
+            conn.execute("RELEASE nested")
+            if conn.total_changes != before:
+                changed.update(tables)
+            return
+        self.pending_changes.tables = changed = set()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield conn.cursor()
+                if conn.total_changes != before:
+                    changed.update(tables)
+                if changed:
+                    conn.executemany('''
+                        INSERT INTO Table_Versions (table_name, version) VALUES (?, 1)
+                        ON CONFLICT (table_name) DO UPDATE SET version = version + 1
+                    ''', [(table,) for table in sorted(changed)])
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                if changed:
+                    self.cache.invalidate(changed)
+        finally:
+            self.pending_changes.tables = None
+
+    def _cached(self, key, tables, compute):
+        # Return compute(), reusing the last result for `key` if none of
+        # `tables` changed since it was computed. The versions are read in
+        # the same read transaction as the result, so they can't disagree.
+        conn = self.conn
+        if conn.in_transaction:
+            # Inside a write the result may include uncommitted changes
+            return compute()
+        conn.execute("BEGIN")
+        try:
+            current = dict(conn.execute("SELECT table_name, version FROM Table_Versions"))
+            versions = tuple(current.get(table, 0) for table in tables)
+            return self.cache.get_or_compute(key, tables, versions, compute)
+        finally:
+            conn.commit()
+
+    def batch(self):
+        # Run several operations in one transaction, e.g. a file of shipments.
+        # Each operation inside still succeeds or fails on its own; an
+        # exception escaping the block rolls the whole batch back.
+        return self._transaction()
+
+    @instrumented
+    def add_devices(self, device_type, production_date, calibration_date, location, quantity):
+        try:
+            return self._add_devices(device_type, production_date, calibration_date, location, quantity)
+        except _Rollback as e:
+            return e.result
+        except sqlite3.IntegrityError as e:
+            # The ledger trigger aborts the build if stock ran out since the check
+            if "cannot go negative" in str(e):
+                return 0, "BOM inventory changed while building devices. Nothing was deducted."
+            return 0, f"Failed to add devices: {e}"
+
+    def _add_devices(self, device_type, production_date, calibration_date, location, quantity):
+        with self._transaction("Devices", "Stock_Counts", "BOM", "BOM_Ledger", "Build_Costs") as cursor:
+            # Check every BOM line for the device type with a single join
+            cursor.execute('''
+                SELECT
+                    br.item_name,
+                    COALESCE(b.total_quantity, 0) AS available_quantity,
+                    br.required_per_unit * ? AS needed_quantity
+                FROM BOM_Requirements br
+                LEFT JOIN BOM b ON br.item_name = b.item_name
+                WHERE br.device_type = ?
+                ORDER BY br.item_name
+            ''', (quantity, device_type))
+            bom_lines = cursor.fetchall()
+
+            insufficient_items = [line for line in bom_lines if line[1] < line[2]]
+            if insufficient_items:
+                error_message = "Not enough materials to build devices. Shortages:\n" + "\n".join(
+                    [f"{item}: {available} available, need {needed}" for item, available, needed in insufficient_items]
+                )
+                raise _Rollback((0, error_message))  # 0 devices added and the error message
+
+            # Record the consumption in the ledger with one statement. The ledger
+            # trigger deducts each line from BOM and aborts the whole build if any
+            # item would go negative.
+            cursor.execute('''
+                INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+                SELECT ?, item_name, -required_per_unit * ?, 'build', ?
+                FROM BOM_Requirements
+                WHERE device_type = ? AND required_per_unit > 0
+            ''', (self._now(), quantity, f"build:{device_type} x{quantity}", device_type))
+
+            # Cost the build at the current weighted-average item costs
+            cursor.execute('''
+                INSERT INTO Build_Costs (built_at, device_type, quantity, unit_cost, uncosted_items)
+                SELECT ?, ?, ?, COALESCE(SUM(br.required_per_unit * c.unit_cost), 0), COUNT(*) - COUNT(c.unit_cost)
+                FROM BOM_Requirements br
+                LEFT JOIN Item_Costs c ON c.item_name = br.item_name
+                WHERE br.device_type = ? AND br.required_per_unit > 0
+            ''', (self._now(), device_type, quantity, device_type))
+
+            # Add devices to the Devices table
+            cursor.executemany('''
+                INSERT INTO Devices (uid, type, production_date, calibration_date, location, status)
+                VALUES (?, ?, ?, ?, ?, 'In Stock')
+            ''', [
+                (new_device_uid(device_type), device_type, production_date, calibration_date, location)
+                for _ in range(quantity)
+            ])
+
+        return quantity, f"Successfully added {quantity} devices."
+
+    @instrumented
+    def add_devices_bulk(self, records, device_type=None, batch_size=5000):
+        # Register devices that already exist (e.g. a device.csv export or a
+        # supplier's serial list). No BOM stock is consumed here.
+        # `records` is an iterable of dicts or the path to a CSV file. Rows
+        # without a uid get a generated one; `device_type` fills in rows that
+        # don't carry their own type (device.csv has none).
+        # Returns one (uid, outcome) pair per input row, where outcome is
+        # "added", "duplicate" or an error message.
+        if isinstance(records, (str, os.PathLike)):
+            with open(records, newline="", encoding="utf-8") as f:
+                return self.add_devices_bulk(csv.DictReader(f), device_type, batch_size)
+
+        outcomes = []
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                outcomes.extend(self._add_devices_batch(batch, device_type))
+                batch = []
+        if batch:
+            outcomes.extend(self._add_devices_batch(batch, device_type))
+        return outcomes
+
+    def _add_devices_batch(self, records, default_type):
+        outcomes = []
+        rows = {}
+        for record in records:
+            uid = (record.get("uid") or "").strip()
+            dtype = (record.get("type") or default_type or "").strip()
+            if not dtype:
+                outcomes.append((uid or None, "error: missing device type"))
+                continue
+            if not uid:
+                uid = new_device_uid(dtype)
+            if uid in rows:
+                outcomes.append((uid, "duplicate"))
+                continue
+
+            # device.csv only has datetime_created and a note, so fall back to those
+            production_date = record.get("production_date") or (record.get("datetime_created") or "")[:10] or None
+            location = record.get("location") or record.get("note") or None
+            rows[uid] = (
+                uid,
+                dtype,
+                production_date,
+                record.get("calibration_date") or None,
+                location,
+                record.get("status") or "In Stock",
+            )
+            outcomes.append((uid, "added"))
+
+        with self._transaction("Devices", "Stock_Counts") as cursor:
+            # Look up which uids are already registered, in chunks that stay
+            # below SQLite's bound-variable limit
+            existing = set()
+            uids = list(rows)
+            for start in range(0, len(uids), 500):
+                chunk = uids[start:start + 500]
+                cursor.execute(
+                    f"SELECT uid FROM Devices WHERE uid IN ({', '.join('?' * len(chunk))})", chunk
+                )
+                existing.update(uid for uid, in cursor.fetchall())
+
+            cursor.executemany('''
+                INSERT INTO Devices (uid, type, production_date, calibration_date, location, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [row for uid, row in rows.items() if uid not in existing])
+
+        return [
+            (uid, "duplicate" if outcome == "added" and uid in existing else outcome)
+            for uid, outcome in outcomes
+        ]
+
+    @instrumented
+    def log_shipment(self, device_type, quantity, destination):
+        # Count and allocate in one write transaction, so two stations shipping
+        # the same device type can't both claim the last units
+        try:
+            return self._log_shipment(device_type, quantity, destination)
+        except _Rollback as e:
+            return e.result
+
+    def _log_shipment(self, device_type, quantity, destination):
+        with self._transaction("Devices", "Stock_Counts", "Shipments") as cursor:
+            # Stock_Counts is kept current by triggers on Devices
+            cursor.execute('''
+                SELECT COALESCE(SUM(count), 0) FROM Stock_Counts WHERE device_type = ? AND status = 'In Stock'
+            ''', (device_type,))
+            available = cursor.fetchone()[0]
+
+            if available < quantity:
+                raise _Rollback((False, f"Not enough stock! Available: {available}, Requested: {quantity}"))
+
+            # Ship the oldest units first (FIFO by production, then calibration date).
+            # Units with no dates recorded sort first.
+            cursor.execute('''
+                UPDATE Devices 
+                SET status = 'Shipped', location = ? 
+                WHERE rowid IN (
+                    SELECT rowid FROM Devices 
+                    WHERE type = ? AND status = 'In Stock' 
+                    ORDER BY production_date, calibration_date, rowid
+                    LIMIT ?
+                )
+            ''', (destination, device_type, quantity))
+
+            cursor.execute('''
+                INSERT INTO Shipments (device_type, shipment_date, destination, quantity)
+                VALUES (?, ?, ?, ?)
+            ''', (device_type, datetime.now().strftime("%Y-%m-%d"), destination, quantity))
+
+        return True, "Shipment logged successfully."
+
+    @instrumented
+    def get_device_summary(self):
+        return self._cached(("get_device_summary",), ("Devices",), self._get_device_summary)
+
+    def _get_device_summary(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 
+                type, 
+                location, 
+                production_date, 
+                calibration_date, 
+                COUNT(*) as count,
+                MIN(production_date) as earliest_production,
+                MAX(production_date) as latest_production,
+                MIN(calibration_date) as earliest_calibration,
+                MAX(calibration_date) as latest_calibration
+            FROM Devices
+            WHERE status = 'In Stock'
+            GROUP BY type, location, production_date, calibration_date
+            ORDER BY type, location
+        ''')
+        return cursor.fetchall()
+
+    @instrumented
+    def get_device_stats(self):
+        # Totals for the Devices Information summary, aggregated from the
+        # Stock_Counts counter table rather than from Devices itself
+        def compute():
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT
+                    COALESCE(SUM(count), 0) AS total_devices,
+                    COUNT(DISTINCT device_type) AS device_types,
+                    COUNT(DISTINCT location) AS locations
+                FROM Stock_Counts
+                WHERE status = 'In Stock' AND count > 0
+            ''')
+            return cursor.fetchone()
+        return self._cached(("get_device_stats",), ("Stock_Counts",), compute)
+
+    @instrumented
+    def fetch_page(self, query, sort_column, descending=False, after=None, limit=200):
+        # One page of a KeysetQuery, cached until the tables it reads change
+        key = ("fetch_page", query.source_sql, query.params, sort_column, descending, after, limit)
+        return self._cached(
+            key, query.tables, lambda: query.fetch_page(self.conn, sort_column, descending, after, limit)
+        )
+
+    def shipments_query(self):
+        return KeysetQuery('''
+            SELECT shipment_id, device_type, COALESCE(shipment_date, '') AS shipment_date, destination, quantity
+            FROM Shipments
+        ''', ("shipment_id", "device_type", "shipment_date", "destination", "quantity"), ("shipment_id",),
+            tables=("Shipments",))
+
+    def device_summary_query(self):
+        # Same grouping as get_device_summary, one row per group, pageable by
+        # its group key. Device_Summary is maintained by triggers on Devices.
+        return KeysetQuery('''
+            SELECT type, location, count, production_date, calibration_date
+            FROM Device_Summary
+        ''', ("type", "location", "count", "production_date", "calibration_date"),
+            ("type", "location", "production_date", "calibration_date"), tables=("Devices",))
+
+    @instrumented
+    def purchase_bom_items(self, purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url):
+        # The BOM_Purchases_cost trigger folds the purchase into Item_Costs
+        with self._transaction("BOM_Purchases", "BOM", "BOM_Ledger", "Item_Costs") as cursor:
+            # New items are added to the BOM on their first purchase
+            cursor.execute("INSERT OR IGNORE INTO BOM (item_name) VALUES (?)", (item_name,))
+            cursor.execute('''
+                INSERT INTO BOM_Purchases (purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url))
+
+            # Update BOM inventory through the ledger
+            cursor.execute('''
+                INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+                VALUES (?, ?, ?, 'purchase', ?)
+            ''', (self._now(), item_name, quantity, f"purchase:{cursor.lastrowid}"))
+
+        self.checkpoint_bom_ledger(min_entries=BOM_SNAPSHOT_INTERVAL)
+
+    @instrumented
+    def adjust_bom_item(self, item_name, delta, reason):
+        # Manual stock corrections (counts, damage, returns) go through the ledger too
+        try:
+            with self._transaction("BOM", "BOM_Ledger") as cursor:
+                cursor.execute('''
+                    INSERT INTO BOM_Ledger (recorded_at, item_name, delta, kind, reference)
+                    VALUES (?, ?, ?, 'adjustment', ?)
+                ''', (self._now(), item_name, delta, reason))
+        except sqlite3.IntegrityError:
+            return False, f"Adjustment would make {item_name} stock negative."
+        return True, "Adjustment recorded."
+
+    @instrumented
+    def checkpoint_bom_ledger(self, min_entries=0):
+        # Snapshot current BOM stock, unless fewer than `min_entries` ledger
+        # entries were recorded since the last snapshot. The check is a plain
+        # read first, so the usual "not due yet" case after every purchase
+        # doesn't open a second write transaction.
+        if self._snapshot_due(self.conn.cursor(), min_entries) is None:
+            return None
+        with self._transaction("BOM_Snapshots", "BOM_Snapshot_Items") as cursor:
+            # Checked again under the write lock; another writer may have taken it
+            last_entry_id = self._snapshot_due(cursor, min_entries)
+            if last_entry_id is None:
+                return None
+
+            cursor.execute('''
+                INSERT INTO BOM_Snapshots (last_entry_id, recorded_at)
+                VALUES (?, (SELECT recorded_at FROM BOM_Ledger WHERE entry_id = ?))
+            ''', (last_entry_id, last_entry_id))
+            snapshot_id = cursor.lastrowid
+            cursor.execute('''
+                INSERT INTO BOM_Snapshot_Items (snapshot_id, item_name, total_quantity)
+                SELECT ?, item_name, total_quantity FROM BOM
+            ''', (snapshot_id,))
+        return snapshot_id
+
+    @staticmethod
+    def _snapshot_due(cursor, min_entries):
+        # Last ledger entry id if a snapshot is due, otherwise None
+        cursor.execute('''
+            SELECT
+                (SELECT COALESCE(MAX(entry_id), 0) FROM BOM_Ledger),
+                (SELECT COALESCE(MAX(last_entry_id), 0) FROM BOM_Snapshots)
+        ''')
+        last_entry_id, last_snapshot_entry_id = cursor.fetchone()
+        if last_entry_id == last_snapshot_entry_id or last_entry_id - last_snapshot_entry_id < min_entries:
+            return None
+        return last_entry_id
+
+    @instrumented
+    def get_bom_stock_as_of(self, when):
+        # Stock per item as recorded by `when` ("YYYY-MM-DD" means end of that day):
+        # the nearest earlier snapshot plus the ledger entries recorded after it
+        if len(when) == 10:
+            when += " 23:59:59"
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT snapshot_id, last_entry_id
+            FROM BOM_Snapshots
+            WHERE recorded_at <= ?
+            ORDER BY snapshot_id DESC
+            LIMIT 1
+        ''', (when,))
+        snapshot_id, last_entry_id = cursor.fetchone() or (None, 0)
+        cursor.execute('SELECT COALESCE(MAX(entry_id), 0) FROM BOM_Ledger WHERE recorded_at <= ?', (when,))
+        until_entry_id = cursor.fetchone()[0]
+
+        cursor.execute('''
+            SELECT item_name, SUM(quantity)
+            FROM (
+                SELECT item_name, total_quantity AS quantity
+                FROM BOM_Snapshot_Items
+                WHERE snapshot_id = ?
+                UNION ALL
+                SELECT item_name, delta AS quantity
+                FROM BOM_Ledger
+                WHERE entry_id > ? AND entry_id <= ?
+            )
+            GROUP BY item_name
+            ORDER BY item_name
+        ''', (snapshot_id, last_entry_id, until_entry_id))
+        return cursor.fetchall()
+
+    @instrumented
+    def get_bom_inventory(self, device_type=None):
+        # Every item with its stock, or one device type's requirements with
+        # the stock of each required item
+        tables = ("BOM", "BOM_Requirements") if device_type else ("BOM",)
+        return self._cached(
+            ("get_bom_inventory", device_type), tables, lambda: self._get_bom_inventory(device_type)
+        )
+
+    def _get_bom_inventory(self, device_type):
+        cursor = self.conn.cursor()
+        if device_type:
+            cursor.execute('''
+                SELECT br.item_name, br.required_per_unit, COALESCE(b.total_quantity, 0) AS total_quantity
+                FROM BOM_Requirements br
+                LEFT JOIN BOM b ON b.item_name = br.item_name
+                WHERE br.device_type = ?
+                ORDER BY br.item_name
+            ''', (device_type,))
+        else:
+            cursor.execute('''
+                SELECT item_name, total_quantity 
+                FROM BOM 
+                ORDER BY item_name
+            ''')
+        return cursor.fetchall()
+
+    @instrumented
+    def get_bom_inventory_summary(self):
+        return self._cached(("get_bom_inventory_summary",), ("BOM",), self._get_bom_inventory_summary)
+
+    def _get_bom_inventory_summary(self):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT 
+                item_name,
+                SUM(total_quantity) AS total_quantity
+            FROM BOM
+            GROUP BY item_name
+            ORDER BY item_name
+        ''')
+        return cursor.fetchall()
+
+    @instrumented
+    def get_build_planner(self):
+        # numpy is only imported when a planner is needed, so the CLI starts quickly
+        from bom_planner import BuildPlanner
+        return BuildPlanner.load(self.conn)
+
+    @instrumented
+    def calculate_buildable_units(self, device_type=None):
+        # Buildable units for one device type, or a dict for every type when
+        # no type is given. All types are computed together from one query.
+        buildable = self._cached(
+            ("max_buildable",), ("BOM", "BOM_Requirements"), lambda: self.get_build_planner().max_buildable()
+        )
+        if device_type is None:
+            return dict(buildable)
+        return buildable.get(device_type, 0)  # 0 when there are no BOM requirements
+
+    @instrumented
+    def get_limiting_items(self):
+        # Items that cap calculate_buildable_units, as a tuple per device type
+        def compute():
+            planner = self.get_build_planner()
+            return {device_type: tuple(planner.limiting_items(device_type)) for device_type in planner.device_types}
+        return self._cached(("limiting_items",), ("BOM", "BOM_Requirements"), compute)
+
+    @instrumented
+    def plan_build_mix(self):
+        # Units of each device type to build together when they compete for
+        # shared items, for the most devices in total. Needs scipy.
+        return self._cached(("plan_mix",), ("BOM", "BOM_Requirements"), lambda: self.get_build_planner().plan_mix())
+
+    @instrumented
+    def set_currency_rate(self, currency, rate):
+        # Rate converting `currency` to CAD; applies to purchases from now on
+        if rate is None or rate <= 0:
+            return False, "Rate must be positive."
+        with self._transaction("Currency_Rates") as cursor:
+            cursor.execute('''
+                INSERT INTO Currency_Rates (currency, rate, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (currency) DO UPDATE SET rate = excluded.rate, updated_at = excluded.updated_at
+            ''', (currency, rate, self._now()))
+        return True, f"1 {currency} = {rate} CAD."
+
+    def get_currency_rates(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT currency, rate, updated_at FROM Currency_Rates ORDER BY currency")
+        return cursor.fetchall()
+
+    @instrumented
+    def get_item_costs(self):
+        # (item_name, unit_cost, on_hand, stock_value) for every costed item
+        def compute():
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT c.item_name, c.unit_cost, COALESCE(b.total_quantity, 0),
+                       c.unit_cost * COALESCE(b.total_quantity, 0)
+                FROM Item_Costs c
+                LEFT JOIN BOM b ON b.item_name = c.item_name
+                ORDER BY c.item_name
+            ''')
+            return cursor.fetchall()
+        return self._cached(("get_item_costs",), ("Item_Costs", "BOM"), compute)
+
+    @instrumented
+    def get_device_costs(self, device_type=None):
+        # Material cost per unit from BOM_Requirements and the current item
+        # costs: (unit_cost, uncosted_items) for one device type, or a dict
+        # of them for every type. Reads one cost row per required item, never
+        # the purchase history.
+        if device_type is not None:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(SUM(br.required_per_unit * c.unit_cost), 0), COUNT(*) - COUNT(c.unit_cost)
+                FROM BOM_Requirements br
+                LEFT JOIN Item_Costs c ON c.item_name = br.item_name
+                WHERE br.device_type = ? AND br.required_per_unit > 0
+            ''', (device_type,))
+            return cursor.fetchone()
+
+        def compute():
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT br.device_type, COALESCE(SUM(br.required_per_unit * c.unit_cost), 0),
+                       COUNT(*) - COUNT(c.unit_cost)
+                FROM BOM_Requirements br
+                LEFT JOIN Item_Costs c ON c.item_name = br.item_name
+                WHERE br.required_per_unit > 0
+                GROUP BY br.device_type
+            ''')
+            return {name: (unit_cost, uncosted) for name, unit_cost, uncosted in cursor}
+        return dict(self._cached(("get_device_costs",), ("Item_Costs", "BOM_Requirements"), compute))
@@ -0,0 +1,60 @@
+class KeysetQuery:
+    # Pages through the rows of `source_sql` with keyset pagination: each page
+    # starts after the sort key of the last row already shown, so SQLite seeks
+    # straight to it instead of counting past an OFFSET. The seek needs an
+    # index on the sort column's expression as the source query writes it,
+    # e.g. on COALESCE(x, '') when the query returns COALESCE(x, '') AS x.
+    #
+    # `columns` are the column names `source_sql` returns, in display order.
+    # `key_columns` must identify a row uniquely; they break ties in the sort
+    # order. Sort and key columns must not be NULL (COALESCE them in the source
+    # query), since NULLs don't compare in row values. `tables` lists the
+    # tables the query reads, for cache invalidation.
+    def __init__(self, source_sql, columns, key_columns, params=(), tables=()):
+        self.source_sql = source_sql
+        self.columns = list(columns)
+        self.key_columns = list(key_columns)
+        self.params = tuple(params)
+        self.tables = tuple(tables)
+
+    def sort_keys(self, sort_column):
+        return [sort_column] + [column for column in self.key_columns if column != sort_column]
+
+    def page_key(self, row, sort_column):
+        # Key to pass as `after` to get the page following `row`
+        return tuple(row[self.columns.index(column)] for column in self.sort_keys(sort_column))
+
+    def page_sql(self, sort_column, descending=False, after=None, limit=200):
+        # The statement and parameters fetch_page runs
+        if sort_column not in self.columns:
+            raise ValueError(f"Unknown sort column: {sort_column}")
+        keys = self.sort_keys(sort_column)
+        quoted_columns = [f'"{column}"' for column in self.columns]
+        quoted_keys = [f'"{column}"' for column in keys]
+        direction = "DESC" if descending else "ASC"
+
+        sql = f'SELECT {", ".join(quoted_columns)} FROM ({self.source_sql})'
+        params = list(self.params)
+        if after is not None:
+            # (a, b) > (?, ?) written as a >= ? AND (a > ? OR (b) > (?)): SQLite
+            # only turns the leading term into an index range, not the row value
+            op = "<" if descending else ">"
+            first, rest = quoted_keys[0], quoted_keys[1:]
+            if rest:
+                sql += (
+                    f' WHERE {first} {op}= ? AND ({first} {op} ? OR'
+                    f' ({", ".join(rest)}) {op} ({", ".join("?" * len(rest))}))'
+                )
+                params.extend([after[0], after[0], *after[1:]])
+            else:
+                sql += f" WHERE {first} {op} ?"
+                params.append(after[0])
+        sql += f' ORDER BY {", ".join(f"{column} {direction}" for column in quoted_keys)} LIMIT ?'
+        params.append(limit)
+        return sql, params
+
+    def fetch_page(self, conn, sort_column, descending=False, after=None, limit=200):
+        sql, params = self.page_sql(sort_column, descending, after, limit)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        return cursor.fetchall()
@@ -0,0 +1,217 @@
+import numpy as np
+
+CONTROLLER, SUBPANEL, CIRCUIT, CHARGEPOINT = range(4)
+KINDS = {"controller": CONTROLLER, "subpanel": SUBPANEL, "circuit": CIRCUIT, "chargepoint": CHARGEPOINT}
+
+PHASE_BITS = {"A": 1, "B": 2, "C": 4}
+ALL_PHASES = 7
+# PHASE_VECTORS[mask] = 0/1 per phase (A, B, C) for a phase bitmask
+PHASE_VECTORS = np.array([[(mask >> p) & 1 for p in range(3)] for mask in range(8)], dtype=np.float64)
+
+
+def phase_mask(phases):
+    # "AB" -> 0b011. Unknown phases count as all three, the conservative choice.
+    mask = 0
+    for phase in str(phases or "").upper():
+        mask |= PHASE_BITS.get(phase, 0)
+    return mask or ALL_PHASES
+
+
+def rating(amps):
+    # Missing or zero ratings mean the level isn't rated, i.e. no limit there
+    return amps if amps is not None and amps > 0 else np.inf
+
+
+class LoadHierarchy:
+    # The electrical capacity tree controller -> subpanel -> circuit ->
+    # chargepoint, held as flat arrays indexed by node:
+    #   kind[n]      CONTROLLER, SUBPANEL, CIRCUIT or CHARGEPOINT
+    #   ids[n]       id of the row in its table
+    #   parent[n]    node index of the parent, -1 for roots and unattached nodes
+    #   capacity[n]  usable amps at the node (controllers: sensed_max_amps *
+    #                derate_factor, subpanels: max_amps - derate_nonev_amps,
+    #                circuits: max_amps, chargepoints: their own max_amps)
+    #   phases[n]    phase bitmask of a circuit (chargepoints use their circuit's)
+    #   load[n, p]   amps drawn on phase p (A, B, C) by every chargepoint below
+    #                the node, each at its max_amps on its circuit's phases
+    #
+    # Headroom at a node is its capacity less its most loaded phase; it's
+    # negative where chargepoints are oversubscribed and rely on load
+    # management to share the capacity. Changing a chargepoint's amps or
+    # moving a node only walks that node's ancestor chain, so updates cost
+    # O(depth) rather than a rebuild.
+    def __init__(self, kind, ids, parent, capacity, phases, demand):
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.capacity = np.asarray(capacity, dtype=np.float64)
+        self.phases = np.asarray(phases, dtype=np.uint8)
+        # demand[n] = a chargepoint's max_amps (0 for other nodes)
+        self.demand = np.asarray(demand, dtype=np.float64)
+        self.index = {(int(k), int(i)): n for n, (k, i) in enumerate(zip(self.kind, self.ids))}
+        self._children = None
+        self._compute_load()
+
+    @classmethod
+    def load(cls, conn):
+        # Build from the fleet tables loaded by fleet_loader
+        controllers = conn.execute('''
+            SELECT id, sensed_max_amps * COALESCE(derate_factor, 1) FROM controller ORDER BY id
+        ''').fetchall()
+        subpanels = conn.execute('''
+            SELECT id, controller_id, max_amps - COALESCE(derate_nonev_amps, 0) FROM subpanel ORDER BY id
+        ''').fetchall()
+        circuits = conn.execute("SELECT id, subpanel_id, max_amps, phases FROM circuit ORDER BY id").fetchall()
+        chargepoints = conn.execute("SELECT id, circuit_id, max_amps FROM chargepoint ORDER BY id").fetchall()
+
+        kind = [CONTROLLER] * len(controllers) + [SUBPANEL] * len(subpanels) \
+            + [CIRCUIT] * len(circuits) + [CHARGEPOINT] * len(chargepoints)
+        ids = [row[0] for rows in (controllers, subpanels, circuits, chargepoints) for row in rows]
+        index = {(k, i): n for n, (k, i) in enumerate(zip(kind, ids))}
+
+        parent = [-1] * len(controllers)
+        parent += [index.get((CONTROLLER, row[1]), -1) for row in subpanels]
+        parent += [index.get((SUBPANEL, row[1]), -1) for row in circuits]
+        parent += [index.get((CIRCUIT, row[1]), -1) for row in chargepoints]
+
+        capacity = [rating(row[-1]) for row in controllers + subpanels]
+        capacity += [rating(row[2]) for row in circuits] + [rating(row[2]) for row in chargepoints]
+
+        circuit_phases = {row[0]: phase_mask(row[3]) for row in circuits}
+        phases = [ALL_PHASES] * (len(controllers) + len(subpanels))
+        phases += [circuit_phases[row[0]] for row in circuits]
+        phases += [circuit_phases.get(row[1], ALL_PHASES) for row in chargepoints]
+
+        demand = [0.0] * (len(controllers) + len(subpanels) + len(circuits))
+        demand += [row[2] or 0.0 for row in chargepoints]
+        return cls(kind, ids, parent, capacity, phases, demand)
+
+    def _compute_load(self):
+        # Chargepoints load their circuit's phases; sums roll up one level at
+        # a time, deepest first
+        self.load = PHASE_VECTORS[self.phases] * self.demand[:, None]
+        self.load[self.kind != CHARGEPOINT] = 0
+        for level in (CHARGEPOINT, CIRCUIT, SUBPANEL):
+            nodes = np.flatnonzero((self.kind == level) & (self.parent >= 0))
+            np.add.at(self.load, self.parent[nodes], self.load[nodes])
+
+    def node(self, kind, node_id):
+        return self.index[(KINDS[kind], node_id)]
+
+    # Queries
+
+    def headroom(self, kind=None):
+        # {id: remaining amps} for every node of `kind`, or a per-node array
+        # when kind is None. Unattached chargepoints report their own rating.
+        headroom = self.capacity - self.load.max(axis=1)
+        if kind is None:
+            return headroom
+        nodes = np.flatnonzero(self.kind == KINDS[kind])
+        return dict(zip(self.ids[nodes].tolist(), headroom[nodes].tolist()))
+
+    def node_headroom(self, kind, node_id):
+        n = self.node(kind, node_id)
+        return float(self.capacity[n] - self.load[n].max())
+
+    def chain_headroom(self, chargepoint_id):
+        # Extra amps the chargepoint could draw before some breaker or
+        # controller above it runs out: the least headroom on its path
+        n = self.parent[self.node("chargepoint", chargepoint_id)]
+        headroom = np.inf
+        while n >= 0:
+            headroom = min(headroom, self.capacity[n] - self.load[n].max())
+            n = self.parent[n]
+        return float(headroom)
+
+    def overloaded(self):
+        # (kind, id, headroom) of every node whose load exceeds its capacity
+        headroom = self.headroom()
+        names = {v: k for k, v in KINDS.items()}
+        return [
+            (names[int(self.kind[n])], int(self.ids[n]), float(headroom[n]))
+            for n in np.flatnonzero(headroom < 0)
+        ]
+
+    def children(self, n):
+        # Node indexes directly below node n, from a parent-sorted index that's
+        # rebuilt lazily after moves
+        if self._children is None:
+            order = np.argsort(self.parent, kind="stable")
+            starts = np.searchsorted(self.parent[order], np.arange(len(self.parent) + 1))
+            self._children = (order, starts)
+        order, starts = self._children
+        return order[starts[n]:starts[n + 1]]
+
+    def shared_breaker(self, chargepoint_id):
+        # Other chargepoints on the same circuit breaker
+        n = self.node("chargepoint", chargepoint_id)
+        circuit = self.parent[n]
+        if circuit < 0:
+            return []
+        siblings = self.children(circuit)
+        return sorted(self.ids[siblings[siblings != n]].tolist())
+
+    def shared_phase(self, chargepoint_id):
+        # Other chargepoints in the same subpanel drawing on at least one of
+        # the same phases
+        n = self.node("chargepoint", chargepoint_id)
+        circuit = self.parent[n]
+        subpanel = self.parent[circuit] if circuit >= 0 else -1
+        if subpanel < 0:
+            return []
+        circuits = self.children(subpanel)
+        circuits = circuits[(self.phases[circuits] & self.phases[n]) != 0]
+        chargepoints = np.concatenate([self.children(c) for c in circuits]) if len(circuits) else circuits
+        return sorted(self.ids[chargepoints[chargepoints != n]].tolist())
+
+    def breaker_groups(self):
+        # {circuit id: chargepoint ids} for every breaker shared by more than one chargepoint
+        nodes = np.flatnonzero((self.kind == CHARGEPOINT) & (self.parent >= 0))
+        circuits, counts = np.unique(self.parent[nodes], return_counts=True)
+        return {
+            int(self.ids[c]): sorted(self.ids[self.children(c)].tolist())
+            for c in circuits[counts > 1]
+        }
+
+    # Incremental updates
+
+    def _propagate(self, n, delta):
+        while n >= 0:
+            self.load[n] += delta
+            n = self.parent[n]
+
+    def set_capacity(self, kind, node_id, amps):
+        # Headroom is derived on read, so only the node itself changes
+        self.capacity[self.node(kind, node_id)] = rating(amps)
+
+    def set_chargepoint_amps(self, chargepoint_id, amps):
+        n = self.node("chargepoint", chargepoint_id)
+        delta = PHASE_VECTORS[self.phases[n]] * (amps - self.demand[n])
+        self.demand[n] = amps
+        self.capacity[n] = rating(amps)
+        self._propagate(n, delta)
+
+    def set_circuit_phases(self, circuit_id, phases):
+        # Rewiring a circuit moves its chargepoints' load to the new phases
+        n = self.node("circuit", circuit_id)
+        chargepoints = self.children(n)
+        old = self.load[n].copy()
+        self.phases[n] = self.phases[chargepoints] = phase_mask(phases)
+        self.load[chargepoints] = PHASE_VECTORS[self.phases[chargepoints]] * self.demand[chargepoints, None]
+        new = self.load[chargepoints].sum(axis=0)
+        self._propagate(n, new - old)
+
+    def move(self, kind, node_id, parent_id):
+        # Re-attach a node (and everything below it) under another parent of
+        # the level above; parent_id None detaches it
+        n = self.node(kind, node_id)
+        load = self.load[n].copy()
+        self._propagate(self.parent[n], -load)
+        new_parent = -1 if parent_id is None else self.index[(KINDS[kind] - 1, parent_id)]
+        self.parent[n] = new_parent
+        if self.kind[n] == CHARGEPOINT:
+            # A chargepoint draws on its new circuit's phases
+            self.phases[n] = self.phases[new_parent] if new_parent >= 0 else ALL_PHASES
+            load = self.load[n] = PHASE_VECTORS[self.phases[n]] * self.demand[n]
+        self._propagate(new_parent, load)
+        self._children = None
@@ -0,0 +1,233 @@
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from connection_pool import ConnectionPool
+from load_hierarchy import CHARGEPOINT, KINDS, PHASE_VECTORS, LoadHierarchy
+
+KIND_NAMES = {kind: name for name, kind in KINDS.items()}
+
+
+def session_frame(conn, start=None, end=None):
+    # Completed sessions from driver_trans as (chargepoint_id, start, stop)
+    # in epoch seconds, optionally limited to sessions overlapping [start, end)
+    where = ["start_datetime IS NOT NULL", "stop_datetime IS NOT NULL"]
+    params = []
+    if start is not None:
+        where.append("stop_datetime > ?")
+        params.append(str(start))
+    if end is not None:
+        where.append("start_datetime < ?")
+        params.append(str(end))
+    sessions = pd.read_sql_query(f'''
+        SELECT chargepoint_id, start_datetime, stop_datetime
+        FROM driver_trans
+        WHERE {" AND ".join(where)}
+    ''', conn, params=params)
+    return pd.DataFrame({
+        "chargepoint_id": sessions["chargepoint_id"],
+        "start": epoch_seconds(sessions["start_datetime"]),
+        "stop": epoch_seconds(sessions["stop_datetime"]),
+    })
+
+
+def epoch_seconds(values):
+    # Whatever resolution pandas parses to (ns before 2.0, often us or s now)
+    return ((pd.to_datetime(values) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).astype("int64")
+
+
+def sweep(parent, capacity, phases, demand, cp_nodes, start, stop):
+    # Concurrent load at every node above the given sessions' chargepoints.
+    # Each session adds its chargepoint's demand on its circuit's phases at
+    # `start` and removes it at `stop`, at the circuit, subpanel and
+    # controller above it. Events are sorted by (node, time), packed into one
+    # integer key, and a cumulative sum per node gives the load after every
+    # instant, so the whole run is one O(n log n) sort plus vectorized passes.
+    #
+    # Returns (intervals, peaks): intervals is (node, start, end, peak) for
+    # every stretch where a node's most loaded phase exceeded its capacity,
+    # peaks is (node, peak) for every node that carried load.
+    keep = (cp_nodes >= 0) & (start < stop)
+    cp_nodes, start, stop = cp_nodes[keep], start[keep], stop[keep]
+    amps = demand[cp_nodes]
+    mask = phases[cp_nodes]
+
+    nodes, times, deltas, masks = [], [], [], []
+    ancestor = cp_nodes
+    while True:
+        ancestor = np.where(ancestor >= 0, parent[np.maximum(ancestor, 0)], -1)
+        attached = ancestor >= 0
+        if not attached.any():
+            break
+        nodes += [ancestor[attached], ancestor[attached]]
+        times += [start[attached], stop[attached]]
+        deltas += [amps[attached], -amps[attached]]
+        masks += [mask[attached], mask[attached]]
+    if not nodes:
+        empty = np.zeros(0, dtype=np.int64)
+        return (empty, empty, empty, np.zeros(0)), (empty, np.zeros(0))
+
+    node = np.concatenate(nodes)
+    when = np.concatenate(times)
+    origin = when.min()
+    order = np.argsort(node * (when.max() - origin + 1) + (when - origin))
+    node, when = node[order], when[order]
+    load = np.cumsum(PHASE_VECTORS[np.concatenate(masks)[order]] * np.concatenate(deltas)[order, None], axis=0)
+
+    # Make the running sum restart at each node
+    first = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+    offsets = np.vstack([np.zeros((1, 3)), load[first[1:] - 1]])
+    load -= np.repeat(offsets, np.diff(np.r_[first, len(node)]), axis=0)
+
+    # Only the load after the last event at an instant counts, so a session
+    # stopping when another starts doesn't overlap it
+    last = np.r_[(node[1:] != node[:-1]) | (when[1:] != when[:-1]), True]
+    node, when, load = node[last], when[last], load[last].max(axis=1)
+
+    group_start = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+    peaks = (node[group_start], np.maximum.reduceat(load, group_start))
+
+    # Overloaded rows run until the node's next event; merge consecutive ones.
+    # A node's last event always brings its load back to zero, so the next
+    # row exists and belongs to the same node.
+    over = load > capacity[node] + 1e-9
+    rows = np.flatnonzero(over)
+    if not len(rows):
+        empty = np.zeros(0, dtype=np.int64)
+        return (empty, empty, empty, np.zeros(0)), peaks
+    run_start = np.r_[True, (rows[1:] != rows[:-1] + 1)]
+    starts = rows[run_start]
+    ends = rows[np.r_[run_start[1:], True]] + 1
+    intervals = (node[starts], when[starts], when[ends], np.maximum.reduceat(load[rows], np.flatnonzero(run_start)))
+    return intervals, peaks
+
+
+# Topology arrays for worker processes, set once per worker by _init_worker
+_topology = None
+
+
+def _init_worker(topology):
+    global _topology
+    _topology = topology
+
+
+def _sweep_chunk(chunk):
+    cp_nodes, start, stop = chunk
+    return sweep(*_topology, cp_nodes, start, stop)
+
+
+class LoadSimulator:
+    # Replays charging sessions against the LoadHierarchy capacity tree and
+    # reports when circuits, subpanels and controllers were over their
+    # derated capacity. Every chargepoint in a session is taken to draw its
+    # max_amps for the whole session; demand from chargepoints without a
+    # circuit isn't placed anywhere.
+    #
+    # Controllers are independent of each other, so with workers > 1 the
+    # sessions are split by the controller (installation) they charge under
+    # and swept in separate processes.
+    def __init__(self, hierarchy):
+        self.hierarchy = hierarchy
+
+    def _topology(self):
+        h = self.hierarchy
+        return h.parent, h.capacity, h.phases, h.demand
+
+    def _chunks(self, cp_nodes, start, stop, count):
+        # Split sessions by their root node into `count` chunks of similar size
+        parent = self.hierarchy.parent
+        root = cp_nodes.copy()
+        while True:
+            up = np.where(root >= 0, parent[np.maximum(root, 0)], -1)
+            if not (up >= 0).any():
+                break
+            root = np.where(up >= 0, up, root)
+        roots, group, sizes = np.unique(root, return_inverse=True, return_counts=True)
+        # Largest groups first, each into the currently smallest chunk
+        totals = np.zeros(count, dtype=np.int64)
+        assigned = np.empty(len(roots), dtype=np.int64)
+        for g in np.argsort(-sizes, kind="stable"):
+            assigned[g] = totals.argmin()
+            totals[assigned[g]] += sizes[g]
+        chunk_of = assigned[group]
+        return [
+            (cp_nodes[mask], start[mask], stop[mask])
+            for mask in (chunk_of == c for c in range(count)) if mask.any()
+        ]
+
+    def run(self, sessions, workers=1):
+        # `sessions` has chargepoint_id, start and stop (epoch seconds) columns,
+        # e.g. from session_frame(). Returns (overloads, peaks) DataFrames.
+        h = self.hierarchy
+        # Chargepoint node for each session, -1 for unknown chargepoints
+        chargepoints = np.flatnonzero(h.kind == CHARGEPOINT)
+        chargepoints = chargepoints[np.argsort(h.ids[chargepoints])]
+        wanted = sessions["chargepoint_id"].fillna(-1).to_numpy(dtype=np.int64)
+        found = np.minimum(np.searchsorted(h.ids[chargepoints], wanted), max(len(chargepoints) - 1, 0))
+        if len(chargepoints):
+            cp_nodes = np.where(h.ids[chargepoints[found]] == wanted, chargepoints[found], -1)
+        else:
+            cp_nodes = np.full(len(wanted), -1, dtype=np.int64)
+        start = sessions["start"].to_numpy(dtype=np.int64)
+        stop = sessions["stop"].to_numpy(dtype=np.int64)
+
+        if workers > 1:
+            chunks = self._chunks(cp_nodes, start, stop, workers * 4)
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self._topology(),)) as pool:
+                results = list(pool.map(_sweep_chunk, chunks))
+        else:
+            results = [sweep(*self._topology(), cp_nodes, start, stop)]
+
+        node, begin, end, peak = (np.concatenate(parts) for parts in zip(*(r[0] for r in results)))
+        overloads = pd.DataFrame({
+            "kind": [KIND_NAMES[k] for k in h.kind[node].tolist()],
+            "id": h.ids[node],
+            "start": pd.to_datetime(begin, unit="s"),
+            "end": pd.to_datetime(end, unit="s"),
+            "peak_amps": peak,
+            "capacity_amps": h.capacity[node],
+        }).sort_values(["start", "kind", "id"], ignore_index=True)
+
+        node, peak = (np.concatenate(parts) for parts in zip(*(r[1] for r in results)))
+        peaks = pd.DataFrame({
+            "kind": [KIND_NAMES[k] for k in h.kind[node].tolist()],
+            "id": h.ids[node],
+            "peak_amps": peak,
+            "capacity_amps": h.capacity[node],
+        }).sort_values(["kind", "id"], ignore_index=True)
+        return overloads, peaks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay charging sessions against circuit capacity")
+    parser.add_argument("--db", default="fleet.db")
+    parser.add_argument("--start", help="first day, e.g. 2024-01-01")
+    parser.add_argument("--end", help="day after the last, e.g. 2025-01-01")
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db, size=1)
+    try:
+        hierarchy = LoadHierarchy.load(pool.get())
+        sessions = session_frame(pool.get(), args.start, args.end)
+    finally:
+        pool.close_all()
+
+    start = time.perf_counter()
+    overloads, peaks = LoadSimulator(hierarchy).run(sessions, args.workers)
+    print(f"Replayed {len(sessions)} sessions in {time.perf_counter() - start:.2f}s")
+    print(f"{len(overloads)} overload intervals")
+    if len(overloads):
+        summary = overloads.assign(hours=(overloads["end"] - overloads["start"]).dt.total_seconds() / 3600)
+        print(summary.groupby(["kind", "id"]).agg(
+            intervals=("hours", "size"), hours=("hours", "sum"), peak_amps=("peak_amps", "max"),
+            capacity_amps=("capacity_amps", "first"),
+        ).sort_values("hours", ascending=False).head(20).to_string())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
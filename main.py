@@ -1,330 +1,124 @@
-import sqlite3
+import os
+import sys
+import threading
+import time
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 
-
-class InventoryManager:
-    def __init__(self, db_name="inventory.db"):
-        self.conn = sqlite3.connect(db_name)
-        self.create_tables()
-
-    def create_tables(self):
-        cursor = self.conn.cursor()
-
-        # Devices table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Devices (
-                uid TEXT PRIMARY KEY,
-                type TEXT NOT NULL,
-                production_date DATE,
-                calibration_date DATE,
-                location TEXT,
-                status TEXT DEFAULT 'In Stock'
-            )
-        ''')
-
-        # Shipments table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Shipments (
-                shipment_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_type TEXT,
-                shipment_date DATE,
-                destination TEXT,
-                quantity INTEGER
-            )
-        ''')
-
-        # Create BOM table to track unique items
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS BOM (
-                item_name TEXT PRIMARY KEY,
-                total_quantity INTEGER DEFAULT 0
-            )
-        ''')
-
-        # Create a Device_BOM_Mapping table to track device-specific requirements
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS BOM_Requirements (
-            device_type TEXT,
-            item_name TEXT,
-            required_per_unit INTEGER,
-            PRIMARY KEY (device_type, item_name),
-            FOREIGN KEY (item_name) REFERENCES BOM(item_name)
-        );
-        ''')
-
-        # Insert new BOM items
-        bom_items = [
-            "Small Black Box",
-            "Square Foam",
-            "Power Supply Box",
-            "Power Supply w/ NA Blade",
-            "CT200 Coil Box",
-            "CT200 Coil",
-            "WiFi Extender w/ manual",
-            "BeagleBone",
-            "PCB",
-            "VH Front Case",
-            "Back Case",
-            "Side Cases (Top & Bottom)",
-            "Light Pipe",
-            "PCB Screws",
-            "Case Screws",
-            "USB Jumper",
-            "Zip-Ties",
-            "Velcro (Pairs)",
-            "QC Sticker",
-            "Ethernet Cable",
-            "Plastic Bag sm."
-        ]
-
-        cursor.executemany(
-            "INSERT OR IGNORE INTO BOM (item_name) VALUES (?)", 
-            [(item,) for item in bom_items]
-        )
-
-        # Define BOM requirements for each device type
-        bom_requirements = [
-            ("VH", "Small Black Box", 1),
-            ("VH", "Square Foam", 1),
-            ("VH", "Power Supply Box", 1),
-            ("VH", "Power Supply w/ NA Blade", 1),
-            ("VH", "CT200 Coil Box", 1),
-            ("VH", "CT200 Coil", 2),
-            ("VH", "WiFi Extender w/ manual", 1),
-            ("VH", "BeagleBone", 1),
-            ("VH", "PCB", 1),
-            ("VH", "VH Front Case", 1),
-            ("VH", "Back Case", 1),
-            ("VH", "Side Cases (Top & Bottom)", 1),
-            ("VH", "Light Pipe", 9),
-            ("VH", "PCB Screws", 4),
-            ("VH", "Case Screws", 4),
-            ("VH", "USB Jumper", 1),
-            ("VH", "Zip-Ties", 2),
-            ("VH", "Velcro (Pairs)", 4),
-            ("VH", "QC Sticker", 1),
-            ("VH", "Ethernet Cable", 1),
-            ("VH", "Plastic Bag sm.", 1),
-
-
-            ("VP", "Rogowski Coil", 3),
-            ("VP", "Power Adapter", 1),
-            ("VP", "Light Pipe", 9),
-            ("VP", "PCB", 1),
-            ("VP", "JB-55 Case Pro", 1)
-        ]
-
-        cursor.executemany('''
-            INSERT OR IGNORE INTO BOM_Requirements (device_type, item_name, required_per_unit)
-            VALUES (?, ?, ?)
-        ''', bom_requirements)
-        self.conn.commit()
-
-        # BOM Purchases table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS BOM_Purchases (
-                purchase_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                purchase_date DATE,
-                buyer_name TEXT,
-                item_name TEXT,
-                quantity INTEGER,
-                price REAL,
-                currency TEXT CHECK(currency IN ('CAD', 'USD')),
-                tax REAL,
-                purchase_url TEXT,
-                FOREIGN KEY (item_name) REFERENCES BOM (item_name)
-            )
-        ''')
-        self.conn.commit()
-
-    def add_devices(self, device_type, production_date, calibration_date, location, quantity):
-        cursor = self.conn.cursor()
-        
-        # Retrieve BOM requirements for the device type
-        cursor.execute('''
-            SELECT item_name, required_per_unit 
-            FROM BOM_Requirements 
-            WHERE device_type = ?
-        ''', (device_type,))
-        bom_requirements = cursor.fetchall()
-        
-        # Check if there are enough materials to build the devices
-        insufficient_items = []
-        for item_name, required_per_unit in bom_requirements:
-            cursor.execute('SELECT total_quantity FROM BOM WHERE item_name = ?', (item_name,))
-            available_quantity = cursor.fetchone()[0] or 0
-            if available_quantity < required_per_unit * quantity:
-                insufficient_items.append((item_name, available_quantity))
-        
-        if insufficient_items:
-            error_message = "Not enough materials to build devices. Shortages:\n" + "\n".join(
-                [f"{item}: {available} available, need {required_per_unit * quantity}" for item, available in insufficient_items]
-            )
-            return 0, error_message  # Return 0 devices added and error message
-        
-        # Deduct materials from the BOM
-        for item_name, required_per_unit in bom_requirements:
-            cursor.execute('''
-                UPDATE BOM
-                SET total_quantity = total_quantity - ?
-                WHERE item_name = ?
-            ''', (required_per_unit * quantity, item_name))
-        
-        # Add devices to the Devices table
-        success_count = 0
-        for i in range(quantity):
-            uid = f"{device_type}_{int(datetime.now().timestamp() * 1000)}_{i}"
-            try:
-                cursor.execute('''
-                    INSERT INTO Devices (uid, type, production_date, calibration_date, location, status)
-                    VALUES (?, ?, ?, ?, ?, 'In Stock')
-                ''', (uid, device_type, production_date, calibration_date, location))
-                success_count += 1
-            except sqlite3.IntegrityError:
-                continue
-
-        self.conn.commit()
-        return success_count, f"Successfully added {success_count} devices."
-
-    def log_shipment(self, device_type, quantity, destination):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT COUNT(*) FROM Devices WHERE type = ? AND status = 'In Stock'
-        ''', (device_type,))
-        available = cursor.fetchone()[0]
-
-        if available < quantity:
-            return False, f"Not enough stock! Available: {available}, Requested: {quantity}"
-
-        # Use a subquery to update the specific rows
-        cursor.execute('''
-            UPDATE Devices 
-            SET status = 'Shipped', location = ? 
-            WHERE rowid IN (
-                SELECT rowid FROM Devices 
-                WHERE type = ? AND status = 'In Stock' 
-                LIMIT ?
-            )
-        ''', (destination, device_type, quantity))
-        
-        cursor.execute('''
-            INSERT INTO Shipments (device_type, shipment_date, destination, quantity)
-            VALUES (?, ?, ?, ?)
-        ''', (device_type, datetime.now().strftime("%Y-%m-%d"), destination, quantity))
-        
-        self.conn.commit()
-        return True, "Shipment logged successfully."
-
-    def get_device_summary(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT 
-                type, 
-                location, 
-                production_date, 
-                calibration_date, 
-                COUNT(*) as count,
-                MIN(production_date) as earliest_production,
-                MAX(production_date) as latest_production,
-                MIN(calibration_date) as earliest_calibration,
-                MAX(calibration_date) as latest_calibration
-            FROM Devices
-            WHERE status = 'In Stock'
-            GROUP BY type, location, production_date, calibration_date
-            ORDER BY type, location
-        ''')
-        return cursor.fetchall()
-
-    def purchase_bom_items(self, purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            INSERT INTO BOM_Purchases (purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (purchase_date, buyer_name, item_name, quantity, price, currency, tax, purchase_url))
-        
-        # Update BOM inventory
-        cursor.execute('''
-            UPDATE BOM 
-            SET total_quantity = total_quantity + ? 
-            WHERE item_name = ?
-        ''', (quantity, item_name))
-        
-        self.conn.commit()
-
-    def get_bom_inventory(self, device_type=None):
-        cursor = self.conn.cursor()
-        if device_type:
-            cursor.execute('''
-                SELECT item_name, required_per_unit, total_quantity 
-                FROM BOM 
-                WHERE device_type = ?
-                ORDER BY item_name
-            ''', (device_type,))
-        else:
-            cursor.execute('''
-                SELECT item_name, total_quantity 
-                FROM BOM 
-                ORDER BY item_name
-            ''')
-        return cursor.fetchall()
-
-    def get_bom_inventory_summary(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT 
-                item_name,
-                SUM(total_quantity) AS total_quantity
-            FROM BOM
-            GROUP BY item_name
-            ORDER BY item_name
-        ''')
-        return cursor.fetchall()
-
-    def calculate_buildable_units(self, device_type):
-        cursor = self.conn.cursor()
-        
-        # Retrieve BOM requirements for the device type
-        cursor.execute('''
-            SELECT item_name, required_per_unit 
-            FROM BOM_Requirements 
-            WHERE device_type = ?
-        ''', (device_type,))
-        bom_requirements = cursor.fetchall()
-
-        if not bom_requirements:
-            return 0  # No BOM requirements for the device type
-
-        # Calculate buildable units based on current BOM inventory
-        buildable_units = float('inf')
-        for item_name, required_per_unit in bom_requirements:
-            cursor.execute('SELECT total_quantity FROM BOM WHERE item_name = ?', (item_name,))
-            available_quantity = cursor.fetchone()[0] or 0
-            buildable_units = min(buildable_units, available_quantity // required_per_unit)
-
-        return buildable_units
+from exporter import EXPORT_QUERIES, ExportCancelled, Exporter
+from instrumentation import Instrumentation
+from inventory import InventoryManager
+from paged_table import PagedTable
+from task_executor import StallMonitor, TaskExecutor
 
 
 class InventoryApp:
-    def __init__(self, root):
-        self.manager = InventoryManager()
+    def __init__(self, root, started=None):
+        # Set LOCL_INSTRUMENT=1 to time statements and actions from startup
+        # (otherwise switch it on in the Diagnostics tab)
+        self.instrumentation = Instrumentation()
+        if os.environ.get("LOCL_INSTRUMENT"):
+            self.instrumentation.enable()
+        self.manager = InventoryManager(instrumentation=self.instrumentation)
         self.root = root
         self.root.title("Inventory Management System")
 
+        # Database calls run on worker threads; results come back via root.after
+        self.executor = TaskExecutor(root, instrumentation=self.instrumentation)
+
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(expand=1, fill="both")
 
-        self.create_add_device_tab()
-        self.create_log_shipment_tab()
-        self.create_bom_tab()
-        self.create_device_info_tab()
-        self.create_purchase_bom_tab()
-
-    def create_add_device_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Add Device")
-
+        # Status bar with a progress indicator while queries are in flight
+        status_bar = ttk.Frame(root)
+        status_bar.pack(fill="x", side="bottom")
+        status_label = ttk.Label(status_bar, text="Ready")
+        status_label.pack(side="left", padx=5)
+        progress = ttk.Progressbar(status_bar, mode="indeterminate", length=120)
+        progress.pack(side="right", padx=5, pady=2)
+
+        def on_busy_change(busy):
+            if busy:
+                status_label.config(text="Working...")
+                progress.start(15)
+            else:
+                status_label.config(text="Ready")
+                progress.stop()
+
+        self.executor.on_busy_change(on_busy_change)
+
+        # Set LOCL_MEASURE_STALLS=1 to print main-loop stall time on exit
+        self.stall_monitor = None
+        if os.environ.get("LOCL_MEASURE_STALLS"):
+            self.stall_monitor = StallMonitor(root)
+            self.stall_monitor.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Called after this app changes BOM stock, so views of it can reload
+        self.bom_listeners = []
+
+        # Tabs are empty frames until first selected, so startup doesn't run
+        # any of their queries and stays fast however large the database is
+        self.unbuilt_tabs = {}  # tab widget name -> (frame, builder)
+        for text, builder in (
+            ("Add Device", self.create_add_device_tab),
+            ("Log Shipment", self.create_log_shipment_tab),
+            ("BOM Inventory", self.create_bom_tab),
+            ("Devices Information", self.create_device_info_tab),
+            ("Purchase BOM Items", self.create_purchase_bom_tab),
+            ("Diagnostics", self.create_diagnostics_tab),
+        ):
+            tab = ttk.Frame(self.notebook)
+            self.notebook.add(tab, text=text)
+            self.unbuilt_tabs[str(tab)] = (tab, builder)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed, add="+")
+        self.on_tab_changed()
+
+        # Time to first window, from `started` (a time.perf_counter() value)
+        # until the window is mapped and drawn. Recorded as the "startup"
+        # action; LOCL_MEASURE_STARTUP=1 also prints it.
+        self.startup_time = None
+        if started is not None:
+            binding = None
+
+            def on_first_map(event):
+                self.root.unbind("<Map>", binding)
+                self.root.after_idle(finish_startup)
+
+            def finish_startup():
+                self.startup_time = time.perf_counter() - started
+                if self.instrumentation.enabled:
+                    self.instrumentation.record("startup", self.startup_time)
+                if os.environ.get("LOCL_MEASURE_STARTUP"):
+                    print(f"Time to first window: {self.startup_time * 1000:.0f}ms", file=sys.stderr)
+
+            binding = self.root.bind("<Map>", on_first_map, add="+")
+
+    def on_tab_changed(self, event=None):
+        tab, builder = self.unbuilt_tabs.pop(self.notebook.select(), (None, None))
+        if builder is not None:
+            builder(tab)
+
+    def on_close(self):
+        if self.stall_monitor:
+            print(self.stall_monitor.report())
+        # LOCL_INSTRUMENT_DUMP=path writes the diagnostics as JSON on exit
+        dump_path = os.environ.get("LOCL_INSTRUMENT_DUMP")
+        if dump_path:
+            self.instrumentation.dump(dump_path)
+        self.executor.shutdown()
+        self.manager.close()
+        self.root.destroy()
+
+    def bom_changed(self):
+        for listener in self.bom_listeners:
+            listener()
+
+    def show_error(self, e):
+        messagebox.showerror("Error", f"Database error: {e}")
+
+    def create_add_device_tab(self, tab):
         ttk.Label(tab, text="Device Type").grid(row=0, column=0)
         ttk.Label(tab, text="Production Date (default: today)").grid(row=1, column=0)
         ttk.Label(tab, text="Calibration Date (default: today)").grid(row=2, column=0)
@@ -348,24 +142,31 @@ class InventoryApp:
         quantity = ttk.Entry(tab)
         quantity.grid(row=4, column=1)
 
+        def show_result(result):
+            success_count, msg = result
+            if success_count:
+                self.bom_changed()  # Building consumed BOM stock
+                messagebox.showinfo("Result", msg)
+            else:
+                messagebox.showerror("Error", msg)
+
         def add_devices():
             try:
                 qty = int(quantity.get())
                 if qty < 1:
                     raise ValueError("Quantity must be at least 1.")
-                success_count = self.manager.add_devices(
-                    device_type.get(), prod_date.get(), calib_date.get(), location.get(), qty
-                )
-                messagebox.showinfo("Result", f"Added {success_count} devices successfully.")
             except ValueError as e:
                 messagebox.showerror("Error", f"Invalid input: {e}")
+                return
+            self.executor.submit(
+                self.manager.add_devices,
+                device_type.get(), prod_date.get(), calib_date.get(), location.get(), qty,
+                on_done=show_result, on_error=self.show_error
+            )
 
         ttk.Button(tab, text="Add Devices", command=add_devices).grid(row=5, column=0, columnspan=2)
 
-    def create_log_shipment_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Log Shipment")
-
+    def create_log_shipment_tab(self, tab):
         # Input Section
         input_frame = ttk.LabelFrame(tab, text="Log New Shipment")
         input_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
@@ -382,21 +183,28 @@ class InventoryApp:
         destination = ttk.Entry(input_frame)
         destination.grid(row=2, column=1, sticky="ew", padx=5, pady=5)
 
+        def show_result(result):
+            success, msg = result
+            if success:
+                messagebox.showinfo("Success", msg)
+                refresh_shipments_table()  # Refresh the shipments table after logging
+                # Clear input fields
+                device_type.set('')
+                quantity.delete(0, 'end')
+                destination.delete(0, 'end')
+            else:
+                messagebox.showerror("Error", msg)
+
         def log_shipment():
             try:
                 qty = int(quantity.get())
-                success, msg = self.manager.log_shipment(device_type.get(), qty, destination.get())
-                if success:
-                    messagebox.showinfo("Success", msg)
-                    refresh_shipments_table()  # Refresh the shipments table after logging
-                    # Clear input fields
-                    device_type.set('')
-                    quantity.delete(0, 'end')
-                    destination.delete(0, 'end')
-                else:
-                    messagebox.showerror("Error", msg)
             except ValueError:
                 messagebox.showerror("Error", "Invalid quantity!")
+                return
+            self.executor.submit(
+                self.manager.log_shipment, device_type.get(), qty, destination.get(),
+                on_done=show_result, on_error=self.show_error
+            )
 
         ttk.Button(input_frame, text="Log Shipment", command=log_shipment).grid(row=3, column=0, columnspan=2, pady=10)
 
@@ -404,40 +212,17 @@ class InventoryApp:
         table_frame = ttk.LabelFrame(tab, text="Shipment History")
         table_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
 
-        # Treeview for displaying shipments
+        # Paged table for displaying shipments, newest first
         columns = ("ID", "Device Type", "Date", "Destination", "Quantity")
-        shipments_table = ttk.Treeview(table_frame, columns=columns, show="headings")
-        
-        # Define headings
-        for col in columns:
-            shipments_table.heading(col, text=col)
-            shipments_table.column(col, anchor="center")
-        
-        # Scrollbar for the table
-        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=shipments_table.yview)
-        shipments_table.configure(yscroll=scrollbar.set)
-
-        # Position the treeview and scrollbar
-        shipments_table.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        shipments_table = PagedTable(
+            table_frame, self.executor, self.manager.fetch_page, self.manager.shipments_query(), columns,
+            sort_column="shipment_date", descending=True, on_error=self.show_error
+        )
+        shipments_table.pack(fill="both", expand=True)
 
         # Function to refresh shipments table
         def refresh_shipments_table():
-            # Clear existing items
-            for i in shipments_table.get_children():
-                shipments_table.delete(i)
-            
-            # Fetch shipments from database
-            cursor = self.manager.conn.cursor()
-            cursor.execute('''
-                SELECT shipment_id, device_type, shipment_date, destination, quantity 
-                FROM Shipments 
-                ORDER BY shipment_date DESC
-            ''')
-            
-            # Insert shipments into the table
-            for row in cursor.fetchall():
-                shipments_table.insert("", "end", values=row)
+            shipments_table.refresh()
 
         # Initial population of the table
         refresh_shipments_table()
@@ -448,10 +233,7 @@ class InventoryApp:
 
         return tab
 
-    def create_device_info_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Devices Information")
-
+    def create_device_info_tab(self, tab):
         # Main frame with grid configuration
         tab.columnconfigure(0, weight=1)
         tab.rowconfigure(0, weight=1)
@@ -465,44 +247,29 @@ class InventoryApp:
             "Calibration Date"
         )
 
-        # Treeview with improved styling
-        tree = ttk.Treeview(tab, columns=columns, show="headings")
-        tree.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
-
-        # Add scrollbars
-        vsb = ttk.Scrollbar(tab, orient="vertical", command=tree.yview)
-        vsb.grid(row=0, column=1, sticky="ns")
-        hsb = ttk.Scrollbar(tab, orient="horizontal", command=tree.xview)
-        hsb.grid(row=1, column=0, sticky="ew")
-
-        tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        # Format dates to be more readable
+        def format_row(device):
+            return (
+                device[0],  # Type
+                device[1],  # Location
+                device[2],  # Count
+                device[3] or "N/A",
+                device[4] or "N/A"
+            )
 
-        # Configure column headings and widths
-        column_widths = [100, 150, 70, 150, 150]
-        for i, col in enumerate(columns):
-            tree.heading(col, text=col, command=lambda c=i: self.sort_column(tree, c, False))
-            tree.column(col, width=column_widths[i], anchor="center")
+        # Paged table, sorted in SQL when a heading is clicked
+        table = PagedTable(
+            tab, self.executor, self.manager.fetch_page, self.manager.device_summary_query(), columns,
+            sort_column="type", widths=[100, 150, 70, 150, 150], format_row=format_row, on_error=self.show_error
+        )
+        table.grid(row=0, column=0, columnspan=2, sticky="nsew", padx=10, pady=10)
 
         # Function to load and display data
         def load_data():
-            # Clear existing data
-            for row in tree.get_children():
-                tree.delete(row)
-            
-            # Fetch and insert new data
-            for device in self.manager.get_device_summary():
-                # Format dates to be more readable
-                production_date = device[2] if device[2] else "N/A"
-                calibration_date = device[3] if device[3] else "N/A"
-                
-                # Insert row with formatted data
-                tree.insert("", "end", values=(
-                    device[0],  # Type
-                    device[1],  # Location
-                    device[4],  # Count
-                    production_date,
-                    calibration_date
-                ))
+            table.refresh()
+            self.executor.submit(
+                self.manager.get_device_stats, on_done=update_summary, on_error=self.show_error, key="device_stats"
+            )
 
         # Additional Information Frame
         info_frame = ttk.LabelFrame(tab, text="Device Summary")
@@ -513,63 +280,85 @@ class InventoryApp:
         summary_label.pack(padx=10, pady=10)
 
         # Function to update summary information
-        def update_summary():
-            # Calculate total devices
-            total_devices = sum(int(tree.item(item)['values'][2]) for item in tree.get_children())
-            
-            # Get unique device types and locations
-            device_types = set(tree.item(item)['values'][0] for item in tree.get_children())
-            locations = set(tree.item(item)['values'][1] for item in tree.get_children())
+        def update_summary(stats):
+            total_devices, device_types, locations = stats
 
             # Update summary text
             summary_text = (
                 f"Total Devices in Stock: {total_devices}\n"
-                f"Unique Device Types: {len(device_types)}\n"
-                f"Unique Locations: {len(locations)}"
+                f"Unique Device Types: {device_types}\n"
+                f"Unique Locations: {locations}"
             )
             summary_label.config(text=summary_text)
 
-        # Method for sorting columns
-        def sort_column(tree, col, reverse):
-            # Get column data
-            l = [(tree.set(k, col), k) for k in tree.get_children('')]
-            
-            # Try to convert to numeric if possible
-            try:
-                l = [(int(val), k) if val.isdigit() else (val, k) for val, k in l]
-            except:
-                pass
-            
-            # Sort and rearrange items
-            l.sort(reverse=reverse)
-            for index, (val, k) in enumerate(l):
-                tree.move(k, '', index)
-            
-            # Toggle sort direction
-            tree.heading(col, command=lambda: sort_column(tree, col, not reverse))
-
         # Buttons frame
         buttons_frame = ttk.Frame(tab)
         buttons_frame.grid(row=3, column=0, columnspan=2, padx=10, pady=10)
 
         # Refresh button
-        refresh_button = ttk.Button(buttons_frame, text="Refresh Data", command=lambda: [load_data(), update_summary()])
+        refresh_button = ttk.Button(buttons_frame, text="Refresh Data", command=load_data)
         refresh_button.pack(side="left", padx=5)
 
-        # Export button (placeholder - you might want to implement actual export functionality)
-        export_button = ttk.Button(buttons_frame, text="Export to CSV", state="disabled")
+        # Export: streamed to CSV, JSONL or Parquet on a worker thread
+        export_choice = ttk.Combobox(buttons_frame, values=list(EXPORT_QUERIES), state="readonly", width=16)
+        export_choice.set("device_summary")
+        export_choice.pack(side="left", padx=5)
+        export_button = ttk.Button(buttons_frame, text="Export...")
         export_button.pack(side="left", padx=5)
+        export_status = ttk.Label(buttons_frame, text="")
+        export_status.pack(side="left", padx=5)
+        export_state = {"cancel": None, "rows": 0}
+
+        def show_export_progress():
+            if export_state["cancel"] is None:
+                return
+            export_status.config(text=f"Exported {export_state['rows']:,} rows")
+            self.root.after(200, show_export_progress)
+
+        def export_finished(message):
+            export_state["cancel"] = None
+            export_button.config(text="Export...")
+            export_status.config(text=message)
+
+        def export_failed(e):
+            if isinstance(e, ExportCancelled):
+                export_finished("Export cancelled")
+            else:
+                export_finished("Export failed")
+                messagebox.showerror("Error", f"Export failed: {e}")
+
+        def progress(rows):
+            # Runs on the worker thread; the main loop picks the number up
+            export_state["rows"] = rows
+
+        def export_data():
+            if export_state["cancel"] is not None:
+                export_state["cancel"].set()
+                return
+            name = export_choice.get()
+            path = filedialog.asksaveasfilename(
+                defaultextension=".csv", initialfile=f"{name}.csv",
+                filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Parquet", "*.parquet")]
+            )
+            if not path:
+                return
+            export_state.update(cancel=threading.Event(), rows=0)
+            export_button.config(text="Cancel Export")
+            self.executor.submit(
+                Exporter(self.manager).export, name, path, None, progress, export_state["cancel"],
+                on_done=lambda rows: export_finished(f"Exported {rows:,} rows to {os.path.basename(path)}"),
+                on_error=export_failed, name=f"export {name}"
+            )
+            show_export_progress()
+
+        export_button.config(command=export_data)
 
-        # Initial data load and summary update
+        # Initial data load (the summary is updated once the data arrives)
         load_data()
-        update_summary()
 
         return tab
 
-    def create_purchase_bom_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Purchase BOM Items")
-
+    def create_purchase_bom_tab(self, tab):
         # Input fields
         ttk.Label(tab, text="Purchase Date").grid(row=0, column=0)
         ttk.Label(tab, text="Buyer Name").grid(row=1, column=0)
@@ -586,8 +375,13 @@ class InventoryApp:
         buyer_name = ttk.Entry(tab)
         buyer_name.grid(row=1, column=1)
 
-        item_name = ttk.Combobox(tab, values=[item[0] for item in self.manager.get_bom_inventory()])
+        item_name = ttk.Combobox(tab, values=[])
         item_name.grid(row=2, column=1)
+        self.executor.submit(
+            self.manager.get_bom_inventory,
+            on_done=lambda items: item_name.config(values=[item[0] for item in items]),
+            on_error=self.show_error
+        )
 
         quantity = ttk.Entry(tab)
         quantity.grid(row=3, column=1)
@@ -604,9 +398,16 @@ class InventoryApp:
         purchase_url = ttk.Entry(tab)
         purchase_url.grid(row=7, column=1)
 
+        def show_failure(e):
+            messagebox.showerror("Error", f"Failed to log purchase: {e}")
+
+        def purchase_logged(result):
+            self.bom_changed()
+            messagebox.showinfo("Success", "Purchase logged successfully.")
+
         def log_purchase():
             try:
-                self.manager.purchase_bom_items(
+                args = (
                     purchase_date.get(),
                     buyer_name.get(),
                     item_name.get(),
@@ -616,16 +417,18 @@ class InventoryApp:
                     float(tax.get()),
                     purchase_url.get()
                 )
-                messagebox.showinfo("Success", "Purchase logged successfully.")
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to log purchase: {e}")
+                show_failure(e)
+                return
+            self.executor.submit(
+                self.manager.purchase_bom_items, *args,
+                on_done=purchase_logged,
+                on_error=show_failure
+            )
 
         ttk.Button(tab, text="Log Purchase", command=log_purchase).grid(row=8, column=0, columnspan=2)
 
-    def create_bom_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="BOM Inventory")
-
+    def create_bom_tab(self, tab):
         # Add dropdown for device type selection
         device_label = ttk.Label(tab, text="Select Device Type:")
         device_label.pack(pady=5)
@@ -648,40 +451,140 @@ class InventoryApp:
 
         bom_table.pack(fill="both", expand=True)
 
-        def refresh_bom_table():
+        # The last planner loaded and its buildable counts. Picking another
+        # device type re-renders from these; the DB is only read again on
+        # Refresh or after this app writes to the BOM.
+        loaded = {"planner": None, "buildable": {}}
+
+        def show_bom_table():
+            planner = loaded["planner"]
             # Clear the table
             for i in bom_table.get_children():
                 bom_table.delete(i)
 
             # Calculate buildable units and update the label
             device_type = device_type_var.get()
-            buildable_units = self.manager.calculate_buildable_units(device_type)
-            buildable_units_label.config(text=f"Buildable Units: {buildable_units}")
+            buildable_units_label.config(text=f"Buildable Units: {loaded['buildable'].get(device_type, 0)}")
+            if planner is None or device_type not in planner.device_types:
+                return
 
             # Populate the BOM table with item details
-            cursor = self.manager.conn.cursor()
-            cursor.execute('''
-                SELECT 
-                    br.item_name, 
-                    br.required_per_unit, 
-                    b.total_quantity, 
-                    b.total_quantity / br.required_per_unit AS buildable_units
-                FROM BOM_Requirements br
-                LEFT JOIN BOM b ON br.item_name = b.item_name
-                WHERE br.device_type = ?
-                ORDER BY br.item_name
-            ''', (device_type,))
-            rows = cursor.fetchall()
-            for row in rows:
-                bom_table.insert("", "end", values=row)
-
-        # Refresh the BOM table whenever the device type is changed
-        device_dropdown.bind("<<ComboboxSelected>>", lambda e: refresh_bom_table())
+            d = planner.device_types.index(device_type)
+            for i, item_name in enumerate(planner.items):
+                required_per_unit = int(planner.requirements[d, i])
+                if required_per_unit:
+                    available_quantity = int(planner.inventory[i])
+                    bom_table.insert("", "end", values=(
+                        item_name,
+                        required_per_unit,
+                        available_quantity,
+                        available_quantity // required_per_unit
+                    ))
+
+        def planner_loaded(planner):
+            # Work out every device type from the one planner load
+            loaded["planner"] = planner
+            loaded["buildable"] = planner.max_buildable()
+            device_dropdown.config(values=planner.device_types)
+            show_bom_table()
+
+        def refresh_bom_table():
+            # Load requirements and stock on a worker thread
+            self.executor.submit(
+                self.manager.get_build_planner, on_done=planner_loaded, on_error=self.show_error, key="bom"
+            )
+
+        # Switching device type only re-renders the loaded planner
+        device_dropdown.bind("<<ComboboxSelected>>", lambda e: show_bom_table())
+        ttk.Button(tab, text="Refresh", command=refresh_bom_table).pack(pady=5)
+        self.bom_listeners.append(refresh_bom_table)
 
         # Initial refresh
         refresh_bom_table()
 
+    def create_diagnostics_tab(self, tab):
+        tab.columnconfigure(0, weight=1)
+        tab.rowconfigure(1, weight=1)
+        tab.rowconfigure(2, weight=1)
+
+        # Controls
+        controls = ttk.Frame(tab)
+        controls.grid(row=0, column=0, sticky="ew", padx=10, pady=5)
+        enabled = tk.BooleanVar(value=self.instrumentation.enabled)
+        since_label = ttk.Label(controls, text="")
+
+        # Methods, UI actions and their statement/row counts per call
+        span_frame = ttk.LabelFrame(tab, text="Methods and Actions")
+        span_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=5)
+        span_columns = ("Kind", "Name", "Calls", "Mean ms", "p95 ms", "Max ms", "Statements/call", "Rows/call")
+        span_table = ttk.Treeview(span_frame, columns=span_columns, show="headings", height=8)
+        for col, width in zip(span_columns, (60, 260, 60, 70, 70, 70, 100, 80)):
+            span_table.heading(col, text=col)
+            span_table.column(col, width=width, anchor="w" if col == "Name" else "center")
+        span_table.pack(fill="both", expand=True)
+
+        # Statements, slowest total first
+        statement_frame = ttk.LabelFrame(tab, text="Statements")
+        statement_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=5)
+        statement_columns = ("SQL", "Runs", "Total ms", "Mean ms", "Max ms", "Rows")
+        statement_table = ttk.Treeview(statement_frame, columns=statement_columns, show="headings", height=8)
+        for col, width in zip(statement_columns, (420, 60, 80, 70, 70, 70)):
+            statement_table.heading(col, text=col)
+            statement_table.column(col, width=width, anchor="w" if col == "SQL" else "center")
+        statement_table.pack(fill="both", expand=True)
+
+        def refresh():
+            snapshot = self.instrumentation.snapshot()
+            since_label.config(text=f"Since {snapshot['since']}")
+            span_table.delete(*span_table.get_children())
+            for kind in ("actions", "methods"):
+                for name, stats in snapshot[kind].items():
+                    span_table.insert("", "end", values=(
+                        kind[:-1], name, stats["count"], stats["mean_ms"], stats["p95_ms"], stats["max_ms"],
+                        round(stats["statements"] / stats["count"], 1), round(stats["rows"] / stats["count"], 1)
+                    ))
+            statement_table.delete(*statement_table.get_children())
+            for stats in snapshot["statements"]:
+                statement_table.insert("", "end", values=(
+                    stats["sql"], stats["statements"], stats["total_ms"], stats["mean_ms"], stats["max_ms"],
+                    stats["rows"]
+                ))
+
+        def toggle():
+            if enabled.get():
+                self.instrumentation.enable()
+            else:
+                self.instrumentation.disable()
+
+        def reset():
+            self.instrumentation.reset()
+            refresh()
+
+        def save():
+            path = filedialog.asksaveasfilename(
+                defaultextension=".json", filetypes=[("JSON", "*.json")], initialfile="diagnostics.json"
+            )
+            if path:
+                self.instrumentation.dump(path)
+
+        ttk.Checkbutton(controls, text="Record timings", variable=enabled, command=toggle).pack(side="left", padx=5)
+        ttk.Button(controls, text="Refresh", command=refresh).pack(side="left", padx=5)
+        ttk.Button(controls, text="Reset", command=reset).pack(side="left", padx=5)
+        ttk.Button(controls, text="Save JSON...", command=save).pack(side="left", padx=5)
+        since_label.pack(side="right", padx=5)
+
+        # Show the latest numbers whenever the tab is opened
+        def on_tab_changed(event):
+            if self.notebook.select() == str(tab):
+                refresh()
+
+        self.notebook.bind("<<NotebookTabChanged>>", on_tab_changed, add="+")
+        refresh()
+
+        return tab
+
 if __name__ == "__main__":
+    started = time.perf_counter()
     root = tk.Tk()
-    app = InventoryApp(root)
-    root.mainloop()
\ No newline at end of file
+    app = InventoryApp(root, started)
+    root.mainloop()
@@ -0,0 +1,333 @@
+import sqlite3
+
+# Schema changes applied on top of InventoryManager.create_tables. Each entry is
+# (version, description, statements); the database's PRAGMA user_version
+# records the last version applied, so every migration runs exactly once.
+# Append new migrations to the end, never edit an applied one.
+MIGRATIONS = [
+    (1, "Secondary indexes for stock checks, device summary and history", [
+        # log_shipment counts and allocates in-stock units of one type
+        '''
+            CREATE INDEX IF NOT EXISTS Devices_in_stock_type
+            ON Devices (type) WHERE status = 'In Stock'
+        ''',
+        # get_device_summary groups in-stock devices by these columns; the
+        # index covers the query so the table itself is never read
+        '''
+            CREATE INDEX IF NOT EXISTS Devices_in_stock_summary
+            ON Devices (type, location, production_date, calibration_date) WHERE status = 'In Stock'
+        ''',
+        # Shipment History pages ordered by date
+        '''
+            CREATE INDEX IF NOT EXISTS Shipments_shipment_date
+            ON Shipments (shipment_date, shipment_id)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS BOM_Purchases_item_name
+            ON BOM_Purchases (item_name, purchase_date)
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS BOM_Ledger_item_name
+            ON BOM_Ledger (item_name, entry_id)
+        ''',
+    ]),
+    (2, "Stock_Counts counter table and FIFO allocation index", [
+        # Device counts per (type, status, location), kept up to date by the
+        # triggers below so availability checks don't scan Devices
+        '''
+            CREATE TABLE IF NOT EXISTS Stock_Counts (
+                device_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                location TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (device_type, status, location)
+            ) WITHOUT ROWID
+        ''',
+        "DELETE FROM Stock_Counts",
+        '''
+            INSERT INTO Stock_Counts (device_type, status, location, count)
+            SELECT type, COALESCE(status, ''), COALESCE(location, ''), COUNT(*)
+            FROM Devices
+            GROUP BY 1, 2, 3
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_count_insert
+            AFTER INSERT ON Devices
+            BEGIN
+                INSERT INTO Stock_Counts (device_type, status, location, count)
+                VALUES (NEW.type, COALESCE(NEW.status, ''), COALESCE(NEW.location, ''), 1)
+                ON CONFLICT (device_type, status, location) DO UPDATE SET count = count + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_count_delete
+            AFTER DELETE ON Devices
+            BEGIN
+                UPDATE Stock_Counts SET count = count - 1
+                WHERE device_type = OLD.type
+                    AND status = COALESCE(OLD.status, '')
+                    AND location = COALESCE(OLD.location, '');
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_count_update
+            AFTER UPDATE OF type, status, location ON Devices
+            BEGIN
+                UPDATE Stock_Counts SET count = count - 1
+                WHERE device_type = OLD.type
+                    AND status = COALESCE(OLD.status, '')
+                    AND location = COALESCE(OLD.location, '');
+                INSERT INTO Stock_Counts (device_type, status, location, count)
+                VALUES (NEW.type, COALESCE(NEW.status, ''), COALESCE(NEW.location, ''), 1)
+                ON CONFLICT (device_type, status, location) DO UPDATE SET count = count + 1;
+            END
+        ''',
+        # Shipments take the oldest in-stock units first; this index hands
+        # them out in that order without sorting. It also serves every
+        # "in-stock devices of type X" lookup, which replaces the old index.
+        '''
+            CREATE INDEX IF NOT EXISTS Devices_in_stock_fifo
+            ON Devices (type, production_date, calibration_date) WHERE status = 'In Stock'
+        ''',
+        "DROP INDEX IF EXISTS Devices_in_stock_type",
+    ]),
+    (3, "Table_Versions for cache invalidation across processes", [
+        # One row per table, bumped by every InventoryManager write
+        # transaction that touches it; cached reads compare against these
+        '''
+            CREATE TABLE IF NOT EXISTS Table_Versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''',
+    ]),
+    (4, "Currency rates, weighted-average item costs and build costs", [
+        # Rates to the base currency (CAD). USD starts at a default; update it
+        # with InventoryManager.set_currency_rate before costing USD purchases.
+        '''
+            CREATE TABLE IF NOT EXISTS Currency_Rates (
+                currency TEXT PRIMARY KEY,
+                rate REAL NOT NULL CHECK (rate > 0),
+                updated_at TEXT
+            ) WITHOUT ROWID
+        ''',
+        "INSERT OR IGNORE INTO Currency_Rates (currency, rate, updated_at) VALUES ('CAD', 1.0, NULL)",
+        "INSERT OR IGNORE INTO Currency_Rates (currency, rate, updated_at) VALUES ('USD', 1.35, NULL)",
+        # Moving weighted-average landed cost (price plus tax, in CAD) of the
+        # units on hand. Stock leaving through builds or adjustments doesn't
+        # change it; each purchase blends in at its share of the new total.
+        '''
+            CREATE TABLE IF NOT EXISTS Item_Costs (
+                item_name TEXT PRIMARY KEY REFERENCES BOM (item_name),
+                unit_cost REAL NOT NULL,
+                updated_at TEXT
+            ) WITHOUT ROWID
+        ''',
+        # Existing history is costed at the average over all its purchases
+        '''
+            INSERT OR REPLACE INTO Item_Costs (item_name, unit_cost, updated_at)
+            SELECT p.item_name,
+                   SUM(p.quantity * p.price * (1 + COALESCE(p.tax, 0)) * r.rate) / SUM(p.quantity),
+                   MAX(p.purchase_date)
+            FROM BOM_Purchases p
+            JOIN Currency_Rates r ON r.currency = p.currency
+            WHERE p.quantity > 0 AND p.price IS NOT NULL
+            GROUP BY p.item_name
+        ''',
+        # Runs before the purchase's ledger entry, so BOM.total_quantity is
+        # still the stock the new units are averaged with
+        '''
+            CREATE TRIGGER IF NOT EXISTS BOM_Purchases_cost
+            AFTER INSERT ON BOM_Purchases
+            WHEN NEW.quantity > 0 AND NEW.price IS NOT NULL
+            BEGIN
+                INSERT INTO Item_Costs (item_name, unit_cost, updated_at)
+                SELECT NEW.item_name, NEW.price * (1 + COALESCE(NEW.tax, 0)) * r.rate, NEW.purchase_date
+                FROM Currency_Rates r
+                WHERE r.currency = NEW.currency
+                ON CONFLICT (item_name) DO UPDATE SET
+                    unit_cost = (
+                        MAX(COALESCE((SELECT total_quantity FROM BOM WHERE item_name = NEW.item_name), 0), 0)
+                            * unit_cost
+                        + NEW.quantity * excluded.unit_cost
+                    ) / (
+                        MAX(COALESCE((SELECT total_quantity FROM BOM WHERE item_name = NEW.item_name), 0), 0)
+                        + NEW.quantity
+                    ),
+                    updated_at = excluded.updated_at;
+            END
+        ''',
+        # Material cost of each add_devices build, at the costs of the time
+        '''
+            CREATE TABLE IF NOT EXISTS Build_Costs (
+                build_id INTEGER PRIMARY KEY,
+                built_at TEXT NOT NULL,
+                device_type TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                unit_cost REAL NOT NULL,
+                uncosted_items INTEGER NOT NULL DEFAULT 0
+            )
+        ''',
+    ]),
+    (5, "Indexed keyset paging for Shipment History and the device summary", [
+        # shipments_query returns COALESCE(shipment_date, '') and pages on it,
+        # which the plain column index can't serve
+        '''
+            CREATE INDEX IF NOT EXISTS Shipments_shipment_key
+            ON Shipments (COALESCE(shipment_date, ''), shipment_id)
+        ''',
+        "DROP INDEX IF EXISTS Shipments_shipment_date",
+        # In-stock device counts per device_summary_query group, kept up to
+        # date by the triggers below, so each page reads this table instead
+        # of grouping Devices again. Groups with no devices left are deleted.
+        '''
+            CREATE TABLE IF NOT EXISTS Device_Summary (
+                type TEXT NOT NULL,
+                location TEXT NOT NULL,
+                production_date TEXT NOT NULL,
+                calibration_date TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (type, location, production_date, calibration_date)
+            ) WITHOUT ROWID
+        ''',
+        "DELETE FROM Device_Summary",
+        '''
+            INSERT INTO Device_Summary (type, location, production_date, calibration_date, count)
+            SELECT type, COALESCE(location, ''), COALESCE(production_date, ''), COALESCE(calibration_date, ''), COUNT(*)
+            FROM Devices
+            WHERE status = 'In Stock'
+            GROUP BY 1, 2, 3, 4
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_summary_insert
+            AFTER INSERT ON Devices
+            WHEN NEW.status = 'In Stock'
+            BEGIN
+                INSERT INTO Device_Summary (type, location, production_date, calibration_date, count)
+                VALUES (
+                    NEW.type, COALESCE(NEW.location, ''), COALESCE(NEW.production_date, ''),
+                    COALESCE(NEW.calibration_date, ''), 1
+                )
+                ON CONFLICT (type, location, production_date, calibration_date) DO UPDATE SET count = count + 1;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_summary_delete
+            AFTER DELETE ON Devices
+            WHEN OLD.status = 'In Stock'
+            BEGIN
+                UPDATE Device_Summary SET count = count - 1
+                WHERE type = OLD.type
+                    AND location = COALESCE(OLD.location, '')
+                    AND production_date = COALESCE(OLD.production_date, '')
+                    AND calibration_date = COALESCE(OLD.calibration_date, '');
+                DELETE FROM Device_Summary
+                WHERE type = OLD.type
+                    AND location = COALESCE(OLD.location, '')
+                    AND production_date = COALESCE(OLD.production_date, '')
+                    AND calibration_date = COALESCE(OLD.calibration_date, '')
+                    AND count <= 0;
+            END
+        ''',
+        '''
+            CREATE TRIGGER IF NOT EXISTS Devices_summary_update
+            AFTER UPDATE OF type, status, location, production_date, calibration_date ON Devices
+            WHEN OLD.status IS 'In Stock' OR NEW.status IS 'In Stock'
+            BEGIN
+                UPDATE Device_Summary SET count = count - 1
+                WHERE OLD.status = 'In Stock'
+                    AND type = OLD.type
+                    AND location = COALESCE(OLD.location, '')
+                    AND production_date = COALESCE(OLD.production_date, '')
+                    AND calibration_date = COALESCE(OLD.calibration_date, '');
+                DELETE FROM Device_Summary
+                WHERE OLD.status = 'In Stock'
+                    AND type = OLD.type
+                    AND location = COALESCE(OLD.location, '')
+                    AND production_date = COALESCE(OLD.production_date, '')
+                    AND calibration_date = COALESCE(OLD.calibration_date, '')
+                    AND count <= 0;
+                INSERT INTO Device_Summary (type, location, production_date, calibration_date, count)
+                SELECT NEW.type, COALESCE(NEW.location, ''), COALESCE(NEW.production_date, ''),
+                       COALESCE(NEW.calibration_date, ''), 1
+                WHERE NEW.status = 'In Stock'
+                ON CONFLICT (type, location, production_date, calibration_date) DO UPDATE SET count = count + 1;
+            END
+        ''',
+    ]),
+    (6, "Reconciliation findings and snapshots", [
+        # Current reconciliation findings and the calibration version each
+        # unit was first seen with (see reconciliation.Reconciler)
+        '''
+            CREATE TABLE IF NOT EXISTS Reconcile_Findings (
+                uid TEXT NOT NULL,
+                finding TEXT NOT NULL,
+                detail TEXT,
+                first_seen TIMESTAMP NOT NULL,
+                PRIMARY KEY (uid, finding)
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE TABLE IF NOT EXISTS Reconcile_Calibration (
+                uid TEXT PRIMARY KEY,
+                calibration_version INTEGER
+            ) WITHOUT ROWID
+        ''',
+        # What each fleet device row said at the last reconciliation, so a
+        # run only reads the rows that changed since
+        '''
+            CREATE TABLE IF NOT EXISTS Reconcile_Field (
+                uid TEXT PRIMARY KEY,
+                online INTEGER NOT NULL,
+                calibration_version INTEGER
+            ) WITHOUT ROWID
+        ''',
+        '''
+            CREATE INDEX IF NOT EXISTS Reconcile_Field_calibration_version
+            ON Reconcile_Field (calibration_version)
+        ''',
+        # What each Devices row said at the last reconciliation, so a run
+        # only reads the devices that changed since
+        '''
+            CREATE TABLE IF NOT EXISTS Reconcile_Inventory (
+                uid TEXT PRIMARY KEY,
+                type TEXT,
+                status TEXT,
+                calibration_date TEXT
+            ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    # Apply pending migrations, each in its own transaction, then refresh
+    # the planner statistics. Returns the versions applied.
+    applied = []
+    current = schema_version(conn)
+    for version, description, statements in migrations:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        conn.commit()
+        applied.append(version)
+
+    if applied:
+        conn.execute("ANALYZE")
+        conn.commit()
+    return applied
@@ -0,0 +1,158 @@
+from tkinter import ttk
+
+# Pages kept in the Treeview at once; scrolling further evicts the farthest one
+MAX_LOADED_PAGES = 5
+
+
+class PagedTable(ttk.Frame):
+    # Treeview backed by a KeysetQuery. Only a window of pages around the
+    # view is fetched and inserted: scrolling near either end of the loaded
+    # rows fetches the next or previous page on a worker thread, and once
+    # more than `max_pages` are loaded the page at the far end is dropped.
+    # Dropped pages are fetched again by key when the user scrolls back
+    # (the previous page is the query run in the opposite direction from the
+    # first loaded row). Clicking a heading re-sorts in SQL.
+    #
+    # `fetch_page(query, sort_column, descending, after, limit)` loads a page
+    # (e.g. InventoryManager.fetch_page), `headings` are the display names for
+    # `query.columns`, and `format_row` can turn a fetched row into display values.
+    def __init__(self, parent, executor, fetch_page, query, headings, sort_column,
+                 descending=False, page_size=200, widths=None, format_row=None, on_error=None,
+                 max_pages=MAX_LOADED_PAGES):
+        super().__init__(parent)
+        self.executor = executor
+        self.fetch_page = fetch_page
+        self.query = query
+        self.headings = dict(zip(query.columns, headings))
+        self.sort_column = sort_column
+        self.descending = descending
+        self.page_size = page_size
+        self.max_pages = max(max_pages, 2)
+        self.format_row = format_row or (lambda row: row)
+        self.on_error = on_error
+
+        self.generation = 0
+        self.pages = []  # [item ids, key of first row, key of last row], top to bottom
+        self.loading = False
+        self.at_start = True  # nothing before the first loaded row
+        self.exhausted = False  # nothing after the last loaded row
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self, columns=query.columns, show="headings")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+
+        self.vsb = ttk.Scrollbar(self, orient="vertical", command=self.tree.yview)
+        self.vsb.grid(row=0, column=1, sticky="ns")
+        hsb = ttk.Scrollbar(self, orient="horizontal", command=self.tree.xview)
+        hsb.grid(row=1, column=0, sticky="ew")
+        self.tree.configure(yscrollcommand=self._on_yscroll, xscrollcommand=hsb.set)
+
+        for i, column in enumerate(query.columns):
+            self.tree.heading(column, command=lambda c=column: self.sort_by(c))
+            self.tree.column(column, width=widths[i] if widths else 120, anchor="center")
+        self._update_headings()
+
+    def refresh(self):
+        # Drop the loaded rows and start again from the first page
+        self.generation += 1
+        self.tree.delete(*self.tree.get_children())
+        self.pages = []
+        self.at_start = True
+        self.exhausted = False
+        self.loading = False
+        self._fetch(backward=False)
+
+    def sort_by(self, column):
+        # First click sorts ascending, clicking the same column again flips it
+        if column == self.sort_column:
+            self.descending = not self.descending
+        else:
+            self.sort_column = column
+            self.descending = False
+        self._update_headings()
+        self.refresh()
+
+    def _update_headings(self):
+        for column, heading in self.headings.items():
+            if column == self.sort_column:
+                heading += " ▼" if self.descending else " ▲"
+            self.tree.heading(column, text=heading)
+
+    def _on_yscroll(self, first, last):
+        self.vsb.set(first, last)
+        # Fetch another page once the view gets within 10% of either end of the loaded rows
+        if float(last) > 0.9:
+            self._fetch(backward=False)
+        elif float(first) < 0.1:
+            self._fetch(backward=True)
+
+    def _fetch(self, backward):
+        if self.loading or (self.at_start if backward else self.exhausted):
+            return
+        if backward:
+            # Rows before the first loaded one: the reverse order, read back to front
+            descending, after = not self.descending, self.pages[0][1]
+        else:
+            descending, after = self.descending, self.pages[-1][2] if self.pages else None
+        self.loading = True
+        generation = self.generation
+        self.executor.submit(
+            self._fetch_page, self.sort_column, descending, after,
+            on_done=lambda rows: self._show_page(generation, rows, backward),
+            on_error=lambda e: self._show_error(generation, e),
+            name=f"page {'/'.join(self.query.tables) or 'query'}"
+        )
+
+    def _fetch_page(self, sort_column, descending, after):
+        # Runs on a worker thread
+        return self.fetch_page(self.query, sort_column, descending, after, self.page_size)
+
+    def _show_page(self, generation, rows, backward=False):
+        if generation != self.generation:
+            return  # Results for a sort order or refresh that has since been replaced
+        self.loading = False
+        # Keep the rows in view where they are while rows come and go above them
+        total = len(self.tree.get_children())
+        top = round(float(self.tree.yview()[0]) * total)
+        if backward:
+            self.at_start = len(rows) < self.page_size
+            rows = rows[::-1]
+        else:
+            self.exhausted = len(rows) < self.page_size
+        if rows:
+            items = [
+                self.tree.insert("", i if backward else "end", values=self.format_row(row))
+                for i, row in enumerate(rows)
+            ]
+            if backward:
+                top += len(items)
+            page = [items, self.query.page_key(rows[0], self.sort_column),
+                    self.query.page_key(rows[-1], self.sort_column)]
+            if backward:
+                self.pages.insert(0, page)
+            else:
+                self.pages.append(page)
+        while len(self.pages) > self.max_pages:
+            # Evict the page farthest from the one just loaded
+            if backward:
+                self.tree.delete(*self.pages.pop()[0])
+                self.exhausted = False
+            else:
+                items = self.pages.pop(0)[0]
+                self.tree.delete(*items)
+                self.at_start = False
+                top -= len(items)
+        total = len(self.tree.get_children())
+        if total:
+            self.tree.yview_moveto(max(top, 0) / total)
+
+    def _show_error(self, generation, e):
+        if generation != self.generation:
+            return
+        self.loading = False
+        self.exhausted = True
+        self.at_start = True
+        if self.on_error:
+            self.on_error(e)
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+
+class QueryCache:
+    # Bounded LRU cache of query results with table-level dependencies.
+    #
+    # Each entry is stored with the tables it was computed from and their
+    # versions at the time. A lookup hits only if those versions still match,
+    # and invalidate(tables) drops every entry that depends on one of the
+    # tables straight away, leaving entries over other tables alone. When the
+    # cache is full the least recently used entry is evicted.
+    # Every caller gets the same stored value, so lists are stored as tuples
+    # and dicts as read-only mappings; a caller can't change another's result.
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (tables, versions, value)
+        self.dependents = {}  # table -> keys of entries that read it
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, versions):
+        # (True, value) for a current entry, (False, None) otherwise
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == versions:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[2]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, tables, versions, value):
+        value = self.freeze(value)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (tables, versions, value)
+            for table in tables:
+                self.dependents.setdefault(table, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def get_or_compute(self, key, tables, versions, compute):
+        found, value = self.get(key, versions)
+        if found:
+            return value
+        value = self.freeze(compute())
+        self.put(key, tables, versions, value)
+        return value
+
+    @staticmethod
+    def freeze(value):
+        if isinstance(value, list):
+            return tuple(value)
+        if isinstance(value, dict):
+            return MappingProxyType(dict(value))
+        return value
+
+    def invalidate(self, tables):
+        with self.lock:
+            for table in tables:
+                for key in self.dependents.pop(table, ()):
+                    if key in self.entries:
+                        self._remove(key)
+                        self.invalidations += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dependents.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key):
+        tables = self.entries.pop(key)[0]
+        for table in tables:
+            keys = self.dependents.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dependents[table]
@@ -0,0 +1,224 @@
+import argparse
+import sys
+from datetime import datetime
+
+from connection_pool import ConnectionPool
+from health_monitor import DEVICE_CONTACT_COLUMNS
+from inventory import InventoryManager
+
+SHIPPED_NEVER_ONLINE = "shipped, never online"
+ONLINE_NOT_IN_INVENTORY = "online, not in inventory"
+ONLINE_IN_STOCK = "online, still in stock"
+CALIBRATION_CHANGED = "calibration changed in field"
+CALIBRATION_BEHIND = "calibration behind fleet"
+
+
+class Reconciler:
+    # Matches the units built in the inventory database (Devices) against the
+    # devices reporting from the field (the fleet `device` table loaded by
+    # fleet_loader), by uid.
+    #
+    # Runs are incremental. Reconcile_Field and Reconcile_Inventory keep
+    # what the fleet rows (online or not, calibration version) and the
+    # Devices rows (type, status, calibration date) said at the last run.
+    # Each run compares both tables against their snapshot inside SQLite and
+    # recomputes findings only for the uids that changed, or for every field
+    # uid when the newest calibration version moves. With nothing changed,
+    # no rows reach Python.
+    #
+    # Findings are kept in Reconcile_Findings; each run writes the findings
+    # that appeared or cleared and reports that delta. Reconcile_Calibration
+    # keeps the calibration version each unit was first seen with, to spot
+    # recalibration in the field. The tables are created by migration 6.
+    def __init__(self, inventory_db="inventory.db", fleet_db="fleet.db"):
+        self.inventory = ConnectionPool(inventory_db, size=1)
+        self.fleet_db = fleet_db
+        self.create_tables()
+
+    def close(self):
+        self.inventory.close_all()
+
+    def create_tables(self):
+        # Creating the manager applies any pending migrations
+        InventoryManager(self.inventory.db_name, pool_size=1).close()
+
+    def _conn(self):
+        # The inventory connection, with the fleet database attached as `fleet`
+        conn = self.inventory.get()
+        if not any(row[1] == "fleet" for row in conn.execute("PRAGMA database_list")):
+            conn.execute("ATTACH DATABASE ? AS fleet", (self.fleet_db,))
+        return conn
+
+    @staticmethod
+    def _sync_field(conn):
+        # Bring Reconcile_Field up to date with fleet.device and return the
+        # uids added, changed or removed, as 1-tuples
+        if conn.execute("SELECT 1 FROM fleet.sqlite_master WHERE type = 'table' AND name = 'device'").fetchone():
+            columns = {row[1] for row in conn.execute("PRAGMA fleet.table_info(device)")}
+            contact = [f"d.{column}" for column in DEVICE_CONTACT_COLUMNS if column in columns]
+            # COALESCE needs two arguments even when the export has one contact column
+            online = f"COALESCE({', '.join(contact)}, NULL) IS NOT NULL" if contact else "0"
+            changed = conn.execute(f'''
+                SELECT d.uid, d.online, d.calibration_version
+                FROM (SELECT d.uid, {online} AS online, d.calibration_version FROM fleet.device d) d
+                LEFT JOIN Reconcile_Field f USING (uid)
+                WHERE f.uid IS NULL OR f.online IS NOT d.online OR f.calibration_version IS NOT d.calibration_version
+            ''').fetchall()
+            conn.executemany('''
+                INSERT OR REPLACE INTO Reconcile_Field (uid, online, calibration_version) VALUES (?, ?, ?)
+            ''', changed)
+            # The mirror now holds every fleet uid, so equal counts mean none were removed
+            removed = []
+            if (conn.execute("SELECT COUNT(*) FROM Reconcile_Field").fetchone()[0]
+                    != conn.execute("SELECT COUNT(*) FROM fleet.device").fetchone()[0]):
+                removed = conn.execute('''
+                    SELECT uid FROM Reconcile_Field f
+                    WHERE NOT EXISTS (SELECT 1 FROM fleet.device d WHERE d.uid = f.uid)
+                ''').fetchall()
+        else:
+            changed = []
+            removed = conn.execute("SELECT uid FROM Reconcile_Field").fetchall()
+        conn.executemany("DELETE FROM Reconcile_Field WHERE uid = ?", removed)
+        return [(row[0],) for row in changed] + removed
+
+    @staticmethod
+    def _sync_inventory(conn):
+        # Bring Reconcile_Inventory up to date with Devices and return the
+        # uids added, changed or removed, as 1-tuples
+        changed = conn.execute('''
+            SELECT d.uid, d.type, d.status, d.calibration_date
+            FROM Devices d
+            LEFT JOIN Reconcile_Inventory s ON s.uid = d.uid
+            WHERE s.uid IS NULL OR s.type IS NOT d.type OR s.status IS NOT d.status
+                OR s.calibration_date IS NOT d.calibration_date
+        ''').fetchall()
+        conn.executemany('''
+            INSERT OR REPLACE INTO Reconcile_Inventory (uid, type, status, calibration_date) VALUES (?, ?, ?, ?)
+        ''', changed)
+        # The snapshot now holds every device uid, so equal counts mean none were removed
+        removed = []
+        if (conn.execute("SELECT COUNT(*) FROM Reconcile_Inventory").fetchone()[0]
+                != conn.execute("SELECT COUNT(*) FROM Devices").fetchone()[0]):
+            removed = conn.execute('''
+                SELECT uid FROM Reconcile_Inventory s
+                WHERE NOT EXISTS (SELECT 1 FROM Devices d WHERE d.uid = s.uid)
+            ''').fetchall()
+            conn.executemany("DELETE FROM Reconcile_Inventory WHERE uid = ?", removed)
+        return [(row[0],) for row in changed] + removed
+
+    def _findings(self, conn):
+        # Findings of the uids in temp.Reconcile_Dirty, as {(uid, finding): detail},
+        # and the calibration baselines to record
+        newest = conn.execute("SELECT MAX(calibration_version) FROM Reconcile_Field").fetchone()[0]
+        findings = {}
+        new_baselines = []
+        for uid, device_type, status, calibration_date, in_field, online, version, has_baseline, baseline in conn.execute('''
+            SELECT u.uid, d.type, d.status, d.calibration_date,
+                   f.uid IS NOT NULL, COALESCE(f.online, 0), f.calibration_version,
+                   c.uid IS NOT NULL, c.calibration_version
+            FROM temp.Reconcile_Dirty u
+            LEFT JOIN Devices d ON d.uid = u.uid
+            LEFT JOIN Reconcile_Field f ON f.uid = u.uid
+            LEFT JOIN Reconcile_Calibration c ON c.uid = u.uid
+        '''):
+            if version is not None:
+                if not has_baseline:
+                    new_baselines.append((uid, version))
+                elif baseline is not None and baseline != version:
+                    findings[(uid, CALIBRATION_CHANGED)] = f"v{baseline} -> v{version}"
+                if version < newest:
+                    findings[(uid, CALIBRATION_BEHIND)] = f"v{version}, fleet has v{newest}"
+            if device_type is not None:
+                if status == "Shipped" and not online:
+                    findings[(uid, SHIPPED_NEVER_ONLINE)] = (
+                        f"{device_type}, no contact recorded" if in_field else f"{device_type}, not in fleet export"
+                    )
+                elif status == "In Stock" and online:
+                    findings[(uid, ONLINE_IN_STOCK)] = f"{device_type}, calibrated {calibration_date or 'unknown'}"
+            elif online:
+                findings[(uid, ONLINE_NOT_IN_INVENTORY)] = f"calibration v{version}" if version is not None else None
+        return findings, new_baselines
+
+    def run(self):
+        # Reconcile what changed since the last run and store the result.
+        # Returns the delta: {"new": [(uid, finding, detail)], "resolved": [(uid, finding)], "total": n}
+        conn = self._conn()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            first_run = conn.execute("SELECT 1 FROM Reconcile_Field LIMIT 1").fetchone() is None
+            newest = conn.execute("SELECT MAX(calibration_version) FROM Reconcile_Field").fetchone()[0]
+            field_changed = self._sync_field(conn)
+            inventory_changed = self._sync_inventory(conn)
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS Reconcile_Dirty (uid TEXT PRIMARY KEY) WITHOUT ROWID")
+            conn.execute("DELETE FROM temp.Reconcile_Dirty")
+            conn.executemany("INSERT OR IGNORE INTO temp.Reconcile_Dirty (uid) VALUES (?)", field_changed)
+            conn.executemany("INSERT OR IGNORE INTO temp.Reconcile_Dirty (uid) VALUES (?)", inventory_changed)
+            if conn.execute("SELECT MAX(calibration_version) FROM Reconcile_Field").fetchone()[0] != newest:
+                # "Behind the fleet" is relative to the newest version, so every unit may change
+                conn.execute("INSERT OR IGNORE INTO temp.Reconcile_Dirty (uid) SELECT uid FROM Reconcile_Field")
+            if first_run:
+                # Findings stored before the field mirror existed may belong to uids that are gone
+                conn.execute("INSERT OR IGNORE INTO temp.Reconcile_Dirty (uid) SELECT uid FROM Reconcile_Findings")
+
+            findings, new_baselines = self._findings(conn)
+            previous = {
+                (uid, finding): detail
+                for uid, finding, detail in conn.execute('''
+                    SELECT r.uid, r.finding, r.detail
+                    FROM temp.Reconcile_Dirty u
+                    JOIN Reconcile_Findings r ON r.uid = u.uid
+                ''')
+            }
+            new = [(uid, finding, detail) for (uid, finding), detail in findings.items()
+                   if previous.get((uid, finding), ...) != detail]
+            resolved = [key for key in previous if key not in findings]
+
+            conn.executemany('''
+                INSERT INTO Reconcile_Findings (uid, finding, detail, first_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT (uid, finding) DO UPDATE SET detail = excluded.detail
+            ''', [(uid, finding, detail, now) for uid, finding, detail in new])
+            conn.executemany("DELETE FROM Reconcile_Findings WHERE uid = ? AND finding = ?", resolved)
+            conn.executemany(
+                "INSERT OR IGNORE INTO Reconcile_Calibration (uid, calibration_version) VALUES (?, ?)", new_baselines
+            )
+            total = conn.execute("SELECT COUNT(*) FROM Reconcile_Findings").fetchone()[0]
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return {"new": sorted(new, key=lambda f: (f[1], f[0])), "resolved": sorted(resolved), "total": total}
+
+    def findings(self, finding=None):
+        # Current findings as (uid, finding, detail, first_seen), optionally of one kind
+        conn = self.inventory.get()
+        if finding is None:
+            return conn.execute("SELECT * FROM Reconcile_Findings ORDER BY finding, uid").fetchall()
+        return conn.execute(
+            "SELECT * FROM Reconcile_Findings WHERE finding = ? ORDER BY uid", (finding,)
+        ).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile built inventory against fleet devices")
+    parser.add_argument("--inventory-db", default="inventory.db")
+    parser.add_argument("--fleet-db", default="fleet.db")
+    parser.add_argument("--all", action="store_true", help="list every current finding, not just changes")
+    args = parser.parse_args()
+
+    reconciler = Reconciler(args.inventory_db, args.fleet_db)
+    try:
+        delta = reconciler.run()
+        print(f"{delta['total']} findings: {len(delta['new'])} new or changed, {len(delta['resolved'])} resolved")
+        rows = reconciler.findings() if args.all else delta["new"]
+        for uid, finding, detail, *_ in rows:
+            print(f"  {finding}: {uid}" + (f" ({detail})" if detail else ""))
+        for uid, finding in delta["resolved"]:
+            print(f"  resolved {finding}: {uid}")
+    finally:
+        reconciler.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+from cli import run_operation, summary
+from inventory import InventoryManager
+
+# Largest number of queued writes committed together in one transaction
+MAX_GROUP_COMMIT = 256
+
+# POST path -> cli operation
+WRITE_ROUTES = {"/devices": "add-devices", "/shipments": "ship", "/purchases": "purchase"}
+# GET path -> cli summary
+READ_ROUTES = {
+    "/devices": "devices", "/devices/stats": "stats", "/bom": "bom", "/buildable": "buildable",
+    "/buildable/limiting": "limiting", "/buildable/plan": "plan", "/costs": "costs", "/costs/items": "item-costs",
+}
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 422: "Unprocessable Entity", 500: "Internal Server Error",
+    501: "Not Implemented",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class InventoryService:
+    # Local HTTP/JSON front end to InventoryManager, on asyncio streams.
+    #
+    # Writes go onto a queue drained by a single writer task. Whatever has
+    # queued up while the previous group was committing is applied in one
+    # transaction on the writer thread, each request in its own savepoint
+    # (InventoryManager.batch), so a failed request doesn't undo the others
+    # and there's one commit per group instead of one per request.
+    # Reads run on a thread pool; each thread has its own pooled connection
+    # and WAL mode lets them proceed while the writer holds the lock.
+    def __init__(self, db_name="inventory.db", read_workers=4):
+        self.manager = InventoryManager(db_name, pool_size=read_workers + 1)
+        self.readers = ThreadPoolExecutor(read_workers, thread_name_prefix="db-reader")
+        self.writer = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+        self.writes = None
+        self.writer_task = None
+        self.stats = {"requests": 0, "writes": 0, "commits": 0}
+
+    async def start(self, host="127.0.0.1", port=8765):
+        self.writes = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self._write_loop())
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def close(self):
+        if self.writer_task:
+            self.writer_task.cancel()
+        self.readers.shutdown()
+        self.writer.shutdown()
+        self.manager.close()
+
+    # Writes
+
+    async def write(self, op, record):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((op, record, future))
+        return await future
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self.writes.get()]
+            while len(group) < MAX_GROUP_COMMIT and not self.writes.empty():
+                group.append(self.writes.get_nowait())
+            try:
+                results = await loop.run_in_executor(self.writer, self._apply_group, group)
+            except Exception as e:
+                # The commit itself failed, so nothing in the group was applied
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, _, future), result in zip(group, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _apply_group(self, group):
+        # Runs on the writer thread
+        results = []
+        with self.manager.batch():
+            for op, record, _ in group:
+                try:
+                    results.append(run_operation(self.manager, op, record))
+                except Exception as e:
+                    results.append((False, f"{type(e).__name__}: {e}"))
+        self.stats["writes"] += len(group)
+        self.stats["commits"] += 1
+        return results
+
+    # Reads
+
+    async def read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.readers, fn, *args)
+
+    def _shipments_page(self, params):
+        query = self.manager.shipments_query()
+        sort = params.get("sort", "shipment_date")
+        descending = params.get("order", "desc") == "desc"
+        if sort not in query.columns:
+            raise HttpError(400, f"unknown sort column: {sort}")
+        try:
+            limit = max(1, min(int(params.get("limit", 200)), 1000))
+        except ValueError:
+            raise HttpError(400, "limit must be an integer")
+        after = None
+        if "after" in params:
+            # The `next` key of the previous page: one value per sort key
+            try:
+                after = json.loads(params["after"])
+            except ValueError:
+                after = None
+            keys = query.sort_keys(sort)
+            if (not isinstance(after, list) or len(after) != len(keys)
+                    or not all(isinstance(value, (str, int, float)) for value in after)):
+                raise HttpError(400, f"after must be a JSON list of {len(keys)} values ({', '.join(keys)})")
+            after = tuple(after)
+        rows = self.manager.fetch_page(query, sort, descending, after, limit)
+        return {
+            "rows": [dict(zip(query.columns, row)) for row in rows],
+            "next": query.page_key(rows[-1], sort) if len(rows) == limit else None,
+        }
+
+    def _summary(self, what):
+        headers, rows = summary(self.manager, what)
+        return [dict(zip(headers, row)) for row in rows]
+
+    # HTTP
+
+    async def route(self, method, path, params, body):
+        if method == "POST" and path in WRITE_ROUTES:
+            try:
+                record = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "body must be a JSON object")
+            if not isinstance(record, dict):
+                raise HttpError(400, "body must be a JSON object")
+            ok, message = await self.write(WRITE_ROUTES[path], record)
+            return (200 if ok else 422), {"ok": ok, "message": message}
+        if method == "GET" and path in READ_ROUTES:
+            try:
+                return 200, await self.read(self._summary, READ_ROUTES[path])
+            except ImportError as e:
+                # An optional dependency (scipy for /buildable/plan) isn't installed
+                raise HttpError(501, str(e))
+        if method == "GET" and path == "/shipments":
+            try:
+                return 200, await self.read(self._shipments_page, params)
+            except ValueError as e:
+                raise HttpError(400, str(e))
+        if method == "GET" and path == "/health":
+            return 200, dict(self.stats, queued=self.writes.qsize(), cache=self.manager.cache.stats())
+        raise HttpError(404, f"no route for {method} {path}")
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                url = urlsplit(target)
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                self.stats["requests"] += 1
+                try:
+                    status, payload = await self.route(method, url.path, params, body)
+                except HttpError as e:
+                    status, payload = e.status, {"ok": False, "message": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"ok": False, "message": f"{type(e).__name__}: {e}"}
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    service = InventoryService(args.db, args.read_workers)
+    server = await service.start(args.host, args.port)
+    print(f"Serving {args.db} on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON service for the inventory database")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--read-workers", type=int, default=4)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
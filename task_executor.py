@@ -0,0 +1,143 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskExecutor:
+    # Runs blocking calls (database work) on a thread pool and hands the
+    # results back to the Tk main loop. Tk widgets must only be touched from
+    # the main thread, so workers put results on a queue and the main loop
+    # drains it with root.after.
+    #
+    # Tasks submitted with a `key` are coalesced: while one is in flight,
+    # further submissions with the same key collapse into a single rerun
+    # with the latest arguments once it finishes.
+    #
+    # With an `instrumentation`, each task is timed as an action called
+    # `name` (default: its key or function), and its callback on the main
+    # loop as "<name> [ui]".
+    def __init__(self, root, max_workers=2, poll_interval=20, instrumentation=None):
+        self.root = root
+        self.instrumentation = instrumentation
+        self.poll_interval = poll_interval
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self.results = queue.Queue()
+        self.in_flight = {}  # key -> pending rerun (or None)
+        self.active = 0
+        self.polling = False
+        self.busy_listeners = []
+
+    def on_busy_change(self, callback):
+        # callback(busy) is called on the main thread when work starts or all work finishes
+        self.busy_listeners.append(callback)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, name=None):
+        if key is not None:
+            if key in self.in_flight:
+                self.in_flight[key] = (fn, args, on_done, on_error, name)
+                return
+            self.in_flight[key] = None
+
+        self.active += 1
+        if self.active == 1:
+            self._notify_busy(True)
+        self.pool.submit(self._run, fn, args, on_done, on_error, key, name)
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self._poll)
+
+    def _action_name(self, fn, key, name):
+        if self.instrumentation is None or not self.instrumentation.enabled:
+            return None
+        return name or key or getattr(fn, "__qualname__", repr(fn))
+
+    def _run(self, fn, args, on_done, on_error, key, name):
+        name = self._action_name(fn, key, name)
+        try:
+            if name is None:
+                result = fn(*args)
+            else:
+                with self.instrumentation.span(name, kind="action"):
+                    result = fn(*args)
+        except Exception as e:
+            self.results.put((on_error, e, key, True, name))
+        else:
+            self.results.put((on_done, result, key, False, name))
+
+    def _poll(self):
+        while True:
+            try:
+                callback, value, key, failed, name = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                if callback is not None and name is not None:
+                    with self.instrumentation.span(f"{name} [ui]", kind="action"):
+                        callback(value)
+                elif callback is not None:
+                    callback(value)
+                elif failed:
+                    self.root.report_callback_exception(type(value), value, value.__traceback__)
+            except Exception as e:
+                # A failing callback is reported like any Tk callback error;
+                # the remaining results must still be delivered
+                self.root.report_callback_exception(type(e), e, e.__traceback__)
+            finally:
+                # Start any coalesced rerun before this task stops counting as active,
+                # so the busy indicator doesn't flicker between the two
+                if key is not None:
+                    rerun = self.in_flight.pop(key, None)
+                    if rerun is not None:
+                        fn, args, on_done, on_error, name = rerun
+                        self.submit(fn, *args, on_done=on_done, on_error=on_error, key=key, name=name)
+                self.active -= 1
+
+        if self.active == 0:
+            self.polling = False
+            self._notify_busy(False)
+        else:
+            self.root.after(self.poll_interval, self._poll)
+
+    def _notify_busy(self, busy):
+        for callback in self.busy_listeners:
+            callback(busy)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class StallMonitor:
+    # Measures how long the Tk main loop is blocked. A heartbeat is scheduled
+    # every `interval` ms; any extra delay before it runs is time the loop
+    # spent stuck in a callback.
+    def __init__(self, root, interval=50, threshold=0.1):
+        self.root = root
+        self.interval = interval
+        self.threshold = threshold
+        self.expected = None
+        self.max_stall = 0.0
+        self.total_stall = 0.0
+        self.stalls = 0
+
+    def start(self):
+        self.expected = time.perf_counter() + self.interval / 1000
+        self.root.after(self.interval, self._beat)
+
+    def _beat(self):
+        now = time.perf_counter()
+        stall = now - self.expected
+        if stall > 0:
+            self.total_stall += stall
+            self.max_stall = max(self.max_stall, stall)
+            if stall >= self.threshold:
+                self.stalls += 1
+        self.expected = now + self.interval / 1000
+        self.root.after(self.interval, self._beat)
+
+    def report(self):
+        return (
+            f"Main-loop stall: total {self.total_stall:.3f}s, "
+            f"max {self.max_stall * 1000:.0f}ms, "
+            f"{self.stalls} stalls >= {self.threshold * 1000:.0f}ms"
+        )
@@ -0,0 +1,77 @@
+import sys
+
+import numpy as np
+import pytest
+
+from bom_planner import BuildPlanner
+from cli import summary
+from inventory import InventoryManager
+
+
+def shared_parts_planner():
+    # A needs 2 PCB + 1 case, B needs 1 PCB + 1 lens; 10 PCB shared
+    return BuildPlanner(
+        ["A", "B"],
+        ["case", "lens", "pcb"],
+        np.array([[1, 0, 2], [0, 1, 1]], dtype=np.int64),
+        np.array([4, 8, 10], dtype=np.int64),
+    )
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = InventoryManager(str(tmp_path / "inventory.db"))
+    yield manager
+    manager.close()
+
+
+def test_max_buildable_and_limiting_items():
+    planner = shared_parts_planner()
+    assert planner.max_buildable() == {"A": 4, "B": 8}
+    assert planner.limiting_items("A") == ["case"]
+    assert planner.limiting_items("B") == ["lens"]
+
+
+def test_type_without_requirements_is_not_buildable():
+    planner = BuildPlanner(["A", "Z"], ["pcb"], np.array([[1], [0]], dtype=np.int64), np.array([5], dtype=np.int64))
+    assert planner.max_buildable() == {"A": 5, "Z": 0}
+    assert planner.limiting_items("Z") == []
+
+
+def test_plan_mix_shares_parts():
+    pytest.importorskip("scipy.optimize")
+    planner = shared_parts_planner()
+    # Each alone fits, together they don't: 2*4 + 8 = 16 PCB > 10
+    plan = planner.plan_mix()
+    assert sum(plan.values()) == 9
+    assert 2 * plan["A"] + plan["B"] <= 10
+    assert planner.plan_mix(weights={"A": 3}) == {"A": 4, "B": 2}
+    assert planner.plan_mix(minimums={"A": 1}, maximums={"B": 3})["B"] <= 3
+    with pytest.raises(ValueError):
+        planner.plan_mix(minimums={"A": 5})
+
+
+def test_plan_mix_without_scipy(monkeypatch):
+    monkeypatch.setitem(sys.modules, "scipy.optimize", None)
+    with pytest.raises(ImportError, match="pip install scipy"):
+        shared_parts_planner().plan_mix()
+
+
+def test_load_matches_bom(manager):
+    for item in ("Rogowski Coil", "Power Adapter", "Light Pipe", "PCB", "JB-55 Case Pro"):
+        manager.adjust_bom_item(item, 18, "count")
+    planner = manager.get_build_planner()
+    assert planner.max_buildable() == {"VH": 0, "VP": 2}
+    assert manager.get_limiting_items()["VP"] == ("Light Pipe",)
+    headers, rows = summary(manager, "limiting")
+    assert headers == ["device_type", "buildable", "limiting_items"]
+    assert ("VP", 2, "Light Pipe") in rows
+
+
+def test_plan_summary(manager):
+    pytest.importorskip("scipy.optimize")
+    for item in ("Rogowski Coil", "Power Adapter", "Light Pipe", "PCB", "JB-55 Case Pro"):
+        manager.adjust_bom_item(item, 18, "count")
+    headers, rows = summary(manager, "plan")
+    assert headers == ["device_type", "buildable_alone", "planned"]
+    assert rows == [("VH", 0, 0), ("VP", 2, 2)]
@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import date, datetime, time
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+
+import excel_importer
+from excel_importer import ExcelImporter, infer_type, value_converter
+
+
+def write_workbook(path, sheets):
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for title, rows in sheets.items():
+        sheet = workbook.create_sheet(title)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+@pytest.fixture
+def importer(tmp_path):
+    importer = ExcelImporter(str(tmp_path / "import.db"))
+    yield importer
+    importer.close()
+
+
+def test_infer_type():
+    assert infer_type([1, None, True]) == "INTEGER"
+    assert infer_type([1, 2.5, ""]) == "REAL"
+    assert infer_type([datetime(2024, 1, 1, 8)]) == "TIMESTAMP"
+    assert infer_type([date(2024, 1, 1), datetime(2024, 1, 1, 8)]) == "DATE"
+    assert infer_type([1, "x"]) == "TEXT"
+    assert infer_type([None, ""]) == "TEXT"
+
+
+def test_value_converter_falls_back_to_text():
+    integer = value_converter("INTEGER")
+    assert integer(True) == 1 and integer(3) == 3
+    assert integer("n/a") == "n/a"
+    assert integer("") is None
+    assert integer(datetime(2024, 1, 2, 3, 4)) == "2024-01-02 03:04:00"
+    assert integer(time(8, 30)) == "08:30:00"
+    assert value_converter("REAL")(2) == 2.0
+    assert value_converter("DATE")(date(2024, 1, 2)) == "2024-01-02"
+
+
+def test_cells_after_the_sample_are_converted(importer, tmp_path, monkeypatch):
+    # Types come from the rows scanned for the header; the last two rows
+    # aren't sampled
+    monkeypatch.setattr(excel_importer, "SAMPLE_ROWS", 1)
+    path = tmp_path / "book.xlsx"
+    sampled = [[i, 2.5 if i == 1 else i] for i in range(1, excel_importer.HEADER_SCAN_ROWS)]
+    write_workbook(path, {"Data": [["id", "amount"], *sampled, [time(8, 30), "n/a"], [4, datetime(2024, 1, 2)]]})
+    assert importer.import_file(str(path)) == {"book_Data": len(sampled) + 2}
+    conn = importer.conn
+    assert [row[1] for row in conn.execute("PRAGMA table_info(book_Data)")] == ["id", "amount"]
+    assert [row[2] for row in conn.execute("PRAGMA table_info(book_Data)")] == ["INTEGER", "REAL"]
+    rows = conn.execute("SELECT id, amount FROM book_Data ORDER BY rowid").fetchall()
+    assert rows[:2] == [(1, 2.5), (2, 2.0)]
+    assert rows[-2:] == [("08:30:00", "n/a"), (4, "2024-01-02 00:00:00")]
+
+
+def test_reimport_drops_removed_sheets(importer, tmp_path):
+    path = tmp_path / "book.xlsx"
+    write_workbook(path, {"Keep": [["a"], [1]], "Gone": [["b"], [2]]})
+    assert set(importer.import_file(str(path))) == {"book_Keep", "book_Gone"}
+    assert importer.import_file(str(path)) is None  # unchanged
+
+    write_workbook(path, {"Keep": [["a"], [1], [2]]})
+    assert importer.import_file(str(path)) == {"book_Keep": 2}
+    tables = {row[0] for row in importer.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert "book_Gone" not in tables
+    assert "book_Keep" in tables
+
+
+def test_reimport_keeps_table_shared_with_other_workbook(importer, tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first, second = tmp_path / "a" / "book.xlsx", tmp_path / "b" / "book.xlsx"
+    write_workbook(first, {"Shared": [["a"], [1]]})
+    write_workbook(second, {"Shared": [["a"], [2]]})
+    importer.import_file(str(first))
+    importer.import_file(str(second))
+
+    write_workbook(first, {"Other": [["a"], [1]]})
+    importer.import_file(str(first))
+    assert importer.conn.execute("SELECT a FROM book_Shared").fetchall() == [(2,)]
@@ -0,0 +1,106 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from exporter import CsvWriter, Exporter, JsonlWriter, ParquetWriter
+from inventory import InventoryManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = InventoryManager(str(tmp_path / "inventory.db"))
+    yield manager
+    manager.close()
+
+
+def add_shipments(manager, rows):
+    with manager._transaction("Shipments") as cursor:
+        cursor.executemany(
+            "INSERT INTO Shipments (device_type, shipment_date, destination, quantity) VALUES (?, ?, ?, ?)", rows
+        )
+
+
+def test_csv_and_jsonl_writers(tmp_path):
+    rows = [(1, "a", None), (2, "b", 2.5)]
+    with open(tmp_path / "out.csv", "w", newline="") as f:
+        writer = CsvWriter(f, ["id", "name", "value"])
+        writer.write(rows)
+        writer.close()
+    with open(tmp_path / "out.csv", newline="") as f:
+        assert list(csv.reader(f)) == [["id", "name", "value"], ["1", "a", ""], ["2", "b", "2.5"]]
+
+    with open(tmp_path / "out.jsonl", "w") as f:
+        writer = JsonlWriter(f, ["id", "name", "value"])
+        writer.write(rows)
+        writer.close()
+    with open(tmp_path / "out.jsonl") as f:
+        assert [json.loads(line) for line in f] == [
+            {"id": 1, "name": "a", "value": None}, {"id": 2, "name": "b", "value": 2.5}
+        ]
+
+
+def test_parquet_column_null_in_first_batch(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "out.parquet")
+    # No declared types: the expression column is NULL throughout the first
+    # batch and a float only later
+    writer = ParquetWriter(path, ["id", "ratio"])
+    writer.write([(1, None), (2, None)])
+    writer.write([(3, 0.5), (4, None)])
+    writer.close()
+    table = pq.read_table(path)
+    assert str(table.schema.field("ratio").type) == "double"
+    assert table.column("ratio").to_pylist() == [None, None, 0.5, None]
+
+
+def test_parquet_all_null_column_is_string(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "out.parquet")
+    writer = ParquetWriter(path, ["id", "note"])
+    writer.write([(1, None)])
+    writer.close()
+    assert str(pq.read_table(path).schema.field("note").type) == "string"
+
+
+def test_parquet_export_uses_declared_types(manager, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    # quantity is NULL in the whole first batch of 2 rows, then an integer
+    add_shipments(manager, [("VP", None, "A", None), ("VP", None, "B", None), ("VH", "2024-01-02", "C", 7)])
+    path = str(tmp_path / "shipments.parquet")
+    assert Exporter(manager, batch_size=2).export("shipments", path) == 3
+    table = pq.read_table(path)
+    assert str(table.schema.field("quantity").type) == "int64"
+    assert str(table.schema.field("shipment_date").type) == "string"
+    assert table.column("quantity").to_pylist() == [None, None, 7]
+
+
+def test_export_reports_progress_and_counts_rows(manager, tmp_path):
+    add_shipments(manager, [("VP", "2024-01-01", f"D{i}", i) for i in range(5)])
+    seen = []
+    path = str(tmp_path / "shipments.csv")
+    assert Exporter(manager, batch_size=2).export("shipments", path, progress=seen.append) == 5
+    assert seen == [2, 4, 5]
+    with open(path, newline="") as f:
+        assert len(list(csv.reader(f))) == 6
+
+
+def test_export_inside_batch(manager, tmp_path):
+    add_shipments(manager, [("VP", "2024-01-01", "A", 1)])
+    path = str(tmp_path / "shipments.jsonl")
+    with manager.batch():
+        assert Exporter(manager).export("shipments", path) == 1
+    assert not manager.conn.in_transaction
+
+
+def test_failed_export_leaves_no_file(manager, tmp_path):
+    path = tmp_path / "shipments.csv"
+    with pytest.raises(ValueError):
+        Exporter(manager).export("no_such_export", str(path))
+    with pytest.raises(sqlite3.Error):
+        conn = manager.conn
+        conn.execute("DROP TABLE Build_Costs")
+        Exporter(manager).export("build_costs", str(path))
+    assert not path.exists()
+    assert not (tmp_path / "shipments.csv.part").exists()
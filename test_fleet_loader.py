@@ -0,0 +1,87 @@
+import csv
+import sqlite3
+
+import pytest
+
+from fleet_loader import FleetLoader, to_int
+
+HEADER = ["id", "installation_id", "circuit_id", "device_uid", "max_amps", "shared", "last_contact"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+
+
+def load(db, path):
+    loader = FleetLoader(str(db), chunk_size=3)
+    try:
+        return loader.load(str(path), "chargepoint")
+    finally:
+        loader.close()
+
+
+def contents(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute(f'SELECT {", ".join(HEADER)} FROM chargepoint ORDER BY id').fetchall()
+    conn.close()
+    return rows
+
+
+def chargepoints(count, changed=()):
+    return [
+        [i, 10, i % 4, f"dev{i}", "32.0" if i in changed else "40", i % 2, "2024-01-01T08:00:00"]
+        for i in range(1, count + 1)
+    ]
+
+
+def test_to_int():
+    assert to_int("") is None
+    assert to_int("42") == 42
+    assert to_int("3.0") == 3
+    assert to_int("1e3") == 1000
+    for bad in ("3.5", "abc", "nan", "inf"):
+        with pytest.raises(ValueError):
+            to_int(bad)
+
+
+def test_incremental_upsert_matches_full_reload(tmp_path):
+    first, second = tmp_path / "first.csv", tmp_path / "second.csv"
+    write_csv(first, chargepoints(10))
+    write_csv(second, chargepoints(12, changed={2, 7}))
+
+    incremental = tmp_path / "incremental.db"
+    assert load(incremental, first)["written"] == 10
+    stats = load(incremental, second)
+    assert (stats["written"], stats["unchanged"], stats["rejected"]) == (4, 8, 0)
+
+    full = tmp_path / "full.db"
+    load(full, second)
+    assert contents(incremental) == contents(full)
+    assert contents(full)[1][4] == 32.0
+    assert contents(full)[0][6] == "2024-01-01 08:00:00"
+
+
+def test_unchanged_reload_writes_nothing(tmp_path):
+    path = tmp_path / "chargepoint.csv"
+    write_csv(path, chargepoints(5))
+    load(tmp_path / "fleet.db", path)
+    stats = load(tmp_path / "fleet.db", path)
+    assert (stats["written"], stats["unchanged"]) == (0, 5)
+
+
+def test_bad_rows_are_rejected(tmp_path):
+    path = tmp_path / "chargepoint.csv"
+    rows = chargepoints(3)
+    rows.append(["", 10, 1, "nokey", "40", 0, ""])
+    rows.append([5, "2.5", 1, "frac", "40", 0, ""])
+    rows.append([6, 10, 1, "flag", "40", 2, ""])
+    write_csv(path, rows)
+    db = tmp_path / "fleet.db"
+    for _ in range(2):
+        stats = load(db, path)
+        assert stats["rejected"] == 3
+    assert [row[0] for row in contents(db)] == [1, 2, 3]
+    assert any("missing key" in error for error in stats["errors"])
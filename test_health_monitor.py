@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+from health_monitor import HealthMonitor
+
+NOW = datetime(2024, 3, 1, 12, 0, 0)
+
+
+def device(uid, online=None, ping=None, firmware=None, fault=None):
+    return {
+        "uid": uid,
+        "datetime_online": online.strftime("%Y-%m-%d %H:%M:%S") if online else "",
+        "tunnel_ping_time": int(ping.timestamp()) if ping else 0,
+        "firmware_version": firmware,
+        "sensors_fault": fault,
+    }
+
+
+def brute_force_outdated(monitor):
+    outdated = []
+    for versions in monitor.firmware.values():
+        latest = max(versions)
+        for version, keys in versions.items():
+            if version < latest:
+                outdated.extend((key, ".".join(map(str, version))) for key in keys)
+    return sorted(outdated)
+
+
+def test_check_pops_only_due_units():
+    monitor = HealthMonitor()
+    for hours in range(1, 6):
+        monitor.update_device(device(f"D{hours}", online=NOW - timedelta(days=1, hours=-hours)))
+    monitor.update_device(device("never"))
+    assert [key for key, _ in monitor.check(NOW + timedelta(hours=2, minutes=30))] == [
+        ("device", "D1"), ("device", "D2"),
+    ]
+    assert monitor.stale_units()[0] == (("device", "never"), None)
+    assert [key for key, _ in monitor.next_due(2)] == [("device", "D3"), ("device", "D4")]
+    assert len(monitor) == 6
+
+
+def test_later_contact_supersedes_heap_entry():
+    monitor = HealthMonitor()
+    monitor.update_device(device("D", online=NOW - timedelta(hours=23)))
+    monitor.contact(("device", "D"), NOW)
+    assert monitor.check(NOW + timedelta(hours=2)) == []
+    assert [key for key, _ in monitor.check(NOW + timedelta(days=1, minutes=1))] == [("device", "D")]
+    # Contact again brings it back from stale
+    monitor.contact(("device", "D"), NOW + timedelta(days=2))
+    assert monitor.stale_units() == []
+
+
+def test_tunnel_ping_counts_as_contact():
+    monitor = HealthMonitor()
+    monitor.update_device(device("D", online=NOW - timedelta(days=3), ping=NOW - timedelta(hours=1)))
+    assert monitor.check(NOW) == []
+    assert monitor.last_contact[("device", "D")] == NOW - timedelta(hours=1)
+    monitor.update_device(device("E", ping=NOW - timedelta(days=2)))
+    assert [key for key, _ in monitor.check(NOW)] == [("device", "E")]
+
+
+def test_compaction_keeps_deadlines():
+    monitor = HealthMonitor()
+    for step in range(3000):
+        monitor.contact(("device", f"D{step % 10}"), NOW + timedelta(seconds=step))
+    assert len(monitor.heap) <= 2 * len(monitor.deadlines) + 1024
+    assert len(monitor.next_due(10)) == 10
+
+
+def test_outdated_running_counts_match_recompute():
+    rng = random.Random(7)
+    monitor = HealthMonitor()
+    for _ in range(2000):
+        uid = f"D{rng.randrange(50)}"
+        if rng.random() < 0.1:
+            monitor.remove(("device", uid))
+        else:
+            monitor.update_device(device(uid, online=NOW, firmware=rng.choice([None, 100, 101, 102, 103])))
+        expected = brute_force_outdated(monitor)
+        assert monitor.outdated() == expected
+        assert monitor.outdated_count() == len(expected)
+
+
+def test_faults_and_firmware_groups():
+    monitor = HealthMonitor()
+    monitor.update_device(device("D1", online=NOW, firmware="V00.50.02", fault="4"))
+    monitor.update_device(device("D2", online=NOW, firmware="V00.51.00"))
+    monitor.update_chargepoint({"id": "7", "disabled": "0", "last_contact": "", "model": "X", "firmware_version": "1"})
+    monitor.update_chargepoint({"id": "8", "disabled": "1", "last_contact": "", "model": "X", "firmware_version": "0"})
+    assert monitor.faulted() == [(("device", "D1"), 4)]
+    assert monitor.outdated() == [(("device", "D1"), "0.50.2")]
+    assert ("chargepoint", 8) not in monitor.stale
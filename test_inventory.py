@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+
+import inventory
+from inventory import CROCKFORD_ALPHABET, InventoryManager, UlidGenerator, new_device_uid
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = InventoryManager(str(tmp_path / "inventory.db"))
+    yield manager
+    manager.close()
+
+
+def table_versions(manager):
+    return dict(manager.conn.execute("SELECT table_name, version FROM Table_Versions"))
+
+
+def stock(manager, items):
+    for item in items:
+        manager.adjust_bom_item(item, 100, "count")
+
+
+def test_failed_build_leaves_versions_and_cache(manager):
+    manager.get_device_stats()
+    manager.get_bom_inventory_summary()
+    versions = table_versions(manager)
+    cached = len(manager.cache)
+
+    added, message = manager.add_devices("VP", "2024-01-01", "2024-01-01", "Shop", 1)
+    assert added == 0
+    assert message.startswith("Not enough materials")
+    assert table_versions(manager) == versions
+    assert len(manager.cache) == cached
+    assert not manager.conn.in_transaction
+
+
+def test_failed_shipment_leaves_versions(manager):
+    versions = table_versions(manager)
+    ok, message = manager.log_shipment("VP", 1, "Site")
+    assert not ok
+    assert message.startswith("Not enough stock")
+    assert table_versions(manager) == versions
+    assert manager.conn.execute("SELECT COUNT(*) FROM Shipments").fetchone()[0] == 0
+
+
+def test_failure_inside_batch_keeps_the_rest(manager):
+    stock(manager, ["Rogowski Coil", "Power Adapter", "Light Pipe", "PCB", "JB-55 Case Pro"])
+    versions = table_versions(manager)
+    with manager.batch():
+        assert manager.add_devices("VP", "2024-01-01", "2024-01-01", "Shop", 2)[0] == 2
+        assert manager.add_devices("VH", "2024-01-01", "2024-01-01", "Shop", 1)[0] == 0
+        assert not manager.log_shipment("VP", 5, "Site")[0]
+    after = table_versions(manager)
+    assert after["Devices"] == versions.get("Devices", 0) + 1
+    assert "Shipments" not in after or after["Shipments"] == versions.get("Shipments", 0)
+    assert manager.conn.execute("SELECT COUNT(*) FROM Devices").fetchone()[0] == 2
+
+
+def test_successful_shipment_bumps_versions(manager):
+    manager.add_devices_bulk([{"uid": "U1", "type": "VP"}])
+    versions = table_versions(manager)
+    assert manager.log_shipment("VP", 1, "Site") == (True, "Shipment logged successfully.")
+    after = table_versions(manager)
+    for table in ("Devices", "Stock_Counts", "Shipments"):
+        assert after[table] == versions.get(table, 0) + 1
+
+
+def test_snapshot_not_due_writes_nothing(manager):
+    versions = table_versions(manager)
+    assert manager.checkpoint_bom_ledger(min_entries=10 ** 6) is None
+    assert table_versions(manager) == versions
+
+
+def test_cached_results_are_not_shared_mutable(manager):
+    summary = manager.get_bom_inventory_summary()
+    with pytest.raises((TypeError, AttributeError)):
+        summary.append(("Extra", 1))
+    buildable = manager.calculate_buildable_units()
+    buildable["VP"] = 99
+    assert manager.calculate_buildable_units()["VP"] == 0
+    assert manager.get_bom_inventory_summary() == summary
+
+
+def test_no_op_write_keeps_cache(manager):
+    manager.get_device_stats()
+    cached = len(manager.cache)
+    with manager.batch():
+        pass
+    manager.checkpoint_bom_ledger(min_entries=10 ** 6)
+    assert len(manager.cache) == cached
+    hits = manager.cache.hits
+    manager.get_device_stats()
+    assert manager.cache.hits == hits + 1
+
+
+def test_ulids_are_sortable_and_increase():
+    generator = UlidGenerator()
+    ids = [generator.new() for _ in range(10000)]
+    assert all(len(value) == 26 and set(value) <= set(CROCKFORD_ALPHABET) for value in ids)
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_ulids_within_one_millisecond(monkeypatch):
+    monkeypatch.setattr(inventory.time, "time", lambda: 1700000000.0)
+    generator = UlidGenerator()
+    first, second = generator.new(), generator.new()
+    assert first[:10] == second[:10]  # same 48-bit timestamp
+    assert second > first
+
+    # An overflowing random part borrows the next millisecond
+    generator.last_random = (1 << 80) - 1
+    third = generator.new()
+    assert third[:10] > second[:10]
+
+
+def test_ulids_from_threads_are_unique():
+    generator = UlidGenerator()
+    results = []
+
+    def worker():
+        results.extend(generator.new() for _ in range(2000))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 8000
+
+
+def test_bulk_add_reports_duplicates(manager):
+    outcomes = manager.add_devices_bulk([
+        {"uid": "U1", "type": "VP"}, {"uid": "U1", "type": "VP"}, {"type": "VH"}, {"uid": "U2"},
+    ])
+    assert outcomes[:2] == [("U1", "added"), ("U1", "duplicate")]
+    assert outcomes[2][0].startswith("VH_") and outcomes[2][1] == "added"
+    assert outcomes[3] == ("U2", "error: missing device type")
+    assert manager.add_devices_bulk([{"uid": "U1", "type": "VP"}]) == [("U1", "duplicate")]
+    assert new_device_uid("VP").startswith("VP_")
@@ -0,0 +1,161 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from fleet_loader import FleetLoader
+from inventory import InventoryManager
+from reconciliation import (
+    CALIBRATION_BEHIND,
+    CALIBRATION_CHANGED,
+    ONLINE_IN_STOCK,
+    ONLINE_NOT_IN_INVENTORY,
+    SHIPPED_NEVER_ONLINE,
+    Reconciler,
+)
+
+DEVICE_HEADER = "uid,controller_id,datetime_online,calibration_version\n"
+
+
+def write_devices(path, rows):
+    with open(path, "w") as f:
+        f.write(DEVICE_HEADER)
+        for uid, online, version in rows:
+            f.write(f"{uid},1,{online or ''},{'' if version is None else version}\n")
+
+
+def load_fleet(fleet_db, csv_path, rows):
+    write_devices(csv_path, rows)
+    loader = FleetLoader(str(fleet_db))
+    try:
+        loader.load(str(csv_path), "device")
+    finally:
+        loader.close()
+
+
+def add_device(inventory_db, uid, status, device_type="VP", calibration_date="2024-01-01"):
+    conn = sqlite3.connect(inventory_db)
+    with conn:
+        conn.execute(
+            "INSERT INTO Devices (uid, type, production_date, calibration_date, location, status) VALUES (?, ?, ?, ?, ?, ?)",
+            (uid, device_type, "2024-01-01", calibration_date, "Shop", status),
+        )
+    conn.close()
+
+
+def stored_findings(inventory_db):
+    conn = sqlite3.connect(inventory_db)
+    rows = set(conn.execute("SELECT uid, finding, detail FROM Reconcile_Findings"))
+    conn.close()
+    return rows
+
+
+def full_recompute(tmp_path, inventory_db, fleet_db):
+    # Findings from a copy with the snapshots and findings cleared, so every
+    # uid is reconciled from scratch. Calibration baselines are history and kept.
+    copy = tmp_path / "recompute.db"
+    shutil.copy(inventory_db, copy)
+    conn = sqlite3.connect(copy)
+    with conn:
+        for table in ("Reconcile_Field", "Reconcile_Inventory", "Reconcile_Findings"):
+            conn.execute(f"DELETE FROM {table}")
+    conn.close()
+    reconciler = Reconciler(str(copy), str(fleet_db))
+    try:
+        reconciler.run()
+    finally:
+        reconciler.close()
+    return stored_findings(copy)
+
+
+@pytest.fixture
+def dbs(tmp_path):
+    inventory_db = str(tmp_path / "inventory.db")
+    InventoryManager(inventory_db).close()
+    return inventory_db, tmp_path / "fleet.db", tmp_path / "device.csv"
+
+
+def test_first_run_reports_each_kind(dbs, tmp_path):
+    inventory_db, fleet_db, csv_path = dbs
+    add_device(inventory_db, "A", "Shipped")
+    add_device(inventory_db, "B", "In Stock")
+    load_fleet(fleet_db, csv_path, [("B", "2024-02-01 10:00:00", 2), ("C", "2024-02-01 10:00:00", 1)])
+
+    reconciler = Reconciler(inventory_db, str(fleet_db))
+    try:
+        delta = reconciler.run()
+    finally:
+        reconciler.close()
+
+    assert {(uid, finding) for uid, finding, _ in delta["new"]} == {
+        ("A", SHIPPED_NEVER_ONLINE),
+        ("B", ONLINE_IN_STOCK),
+        ("C", ONLINE_NOT_IN_INVENTORY),
+        ("C", CALIBRATION_BEHIND),
+    }
+    assert delta["total"] == 4
+    assert stored_findings(inventory_db) == full_recompute(tmp_path, inventory_db, fleet_db)
+
+
+def test_unchanged_run_has_no_delta(dbs):
+    inventory_db, fleet_db, csv_path = dbs
+    add_device(inventory_db, "A", "Shipped")
+    load_fleet(fleet_db, csv_path, [("B", "2024-02-01 10:00:00", 1)])
+
+    reconciler = Reconciler(inventory_db, str(fleet_db))
+    try:
+        first = reconciler.run()
+        second = reconciler.run()
+    finally:
+        reconciler.close()
+    assert second == {"new": [], "resolved": [], "total": first["total"]}
+
+
+def test_incremental_delta_matches_full_recompute(dbs, tmp_path):
+    inventory_db, fleet_db, csv_path = dbs
+    for i in range(20):
+        add_device(inventory_db, f"D{i}", "Shipped" if i % 2 else "In Stock")
+    fleet = [(f"D{i}", "2024-02-01 10:00:00" if i % 3 else None, 1) for i in range(0, 20, 2)]
+    load_fleet(fleet_db, csv_path, fleet + [("X1", "2024-02-01 10:00:00", 1)])
+
+    reconciler = Reconciler(inventory_db, str(fleet_db))
+    try:
+        reconciler.run()
+
+        # Inventory side: a shipment, a deletion, a new device and a recalibration
+        conn = sqlite3.connect(inventory_db)
+        with conn:
+            conn.execute("UPDATE Devices SET status = 'Shipped' WHERE uid = 'D4'")
+            conn.execute("DELETE FROM Devices WHERE uid = 'D1'")
+            conn.execute("UPDATE Devices SET calibration_date = '2024-06-01' WHERE uid = 'D6'")
+        conn.close()
+        add_device(inventory_db, "X1", "Shipped")
+        # Field side: D2 comes online, D8 is recalibrated, D10 disappears and
+        # a new version makes the rest of the fleet fall behind
+        fleet = [(uid, online, version) for uid, online, version in fleet if uid != "D10"]
+        fleet = [
+            (uid, "2024-03-01 10:00:00" if uid == "D2" else online, 2 if uid == "D8" else version)
+            for uid, online, version in fleet
+        ]
+        load_fleet(fleet_db, csv_path, fleet + [("X1", "2024-02-01 10:00:00", 1), ("N1", None, 3)])
+        delta = reconciler.run()
+    finally:
+        reconciler.close()
+
+    assert stored_findings(inventory_db) == full_recompute(tmp_path, inventory_db, fleet_db)
+    assert ("D8", CALIBRATION_CHANGED, "v1 -> v2") in delta["new"]
+    assert ("X1", ONLINE_NOT_IN_INVENTORY) in delta["resolved"]
+    assert delta["total"] == len(stored_findings(inventory_db))
+
+
+def test_devices_writes_add_no_reconciliation_rows(dbs):
+    # The reconciler keeps its own snapshot; device writes don't log anything
+    inventory_db, _, _ = dbs
+    manager = InventoryManager(inventory_db)
+    try:
+        manager.add_devices_bulk([{"uid": "U1", "type": "VP"}, {"uid": "U2", "type": "VP"}])
+        names = {row[0] for row in manager.conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        assert not any("change" in name.lower() for name in names)
+        assert manager.conn.execute("SELECT COUNT(*) FROM Reconcile_Inventory").fetchone()[0] == 0
+    finally:
+        manager.close()
@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+from service import HttpError, InventoryService
+
+
+@pytest.fixture
+def service(tmp_path):
+    service = InventoryService(str(tmp_path / "inventory.db"), read_workers=1)
+    with service.manager._transaction("Shipments") as cursor:
+        cursor.executemany(
+            "INSERT INTO Shipments (device_type, shipment_date, destination, quantity) VALUES (?, ?, ?, ?)",
+            [("VP", f"2024-01-{day:02d}", "Site", day) for day in range(1, 6)],
+        )
+    yield service
+    asyncio.run(service.close())
+
+
+def get_shipments(service, **params):
+    return asyncio.run(service.route("GET", "/shipments", {key: str(value) for key, value in params.items()}, b""))
+
+
+def test_pages_follow_next_key(service):
+    status, page = get_shipments(service, limit=2)
+    assert status == 200
+    assert [row["shipment_date"] for row in page["rows"]] == ["2024-01-05", "2024-01-04"]
+    status, page = get_shipments(service, limit=2, after=json.dumps(page["next"]))
+    assert [row["shipment_date"] for row in page["rows"]] == ["2024-01-03", "2024-01-02"]
+    status, page = get_shipments(service, limit=2, after=json.dumps(page["next"]))
+    assert [row["shipment_date"] for row in page["rows"]] == ["2024-01-01"]
+    assert page["next"] is None
+
+
+@pytest.mark.parametrize("limit, expected", [(-1, 1), (0, 1), (5000, 5)])
+def test_limit_is_clamped(service, limit, expected):
+    status, page = get_shipments(service, limit=limit)
+    assert status == 200
+    assert len(page["rows"]) == expected
+
+
+@pytest.mark.parametrize("params", [
+    {"limit": "ten"},
+    {"after": "5"},
+    {"after": "not json"},
+    {"after": json.dumps(["2024-01-03"])},
+    {"after": json.dumps(["2024-01-03", 3, 4])},
+    {"after": json.dumps([{"a": 1}, 3])},
+    {"sort": "nope"},
+])
+def test_bad_parameters_are_400(service, params):
+    with pytest.raises(HttpError) as raised:
+        get_shipments(service, **params)
+    assert raised.value.status == 400
+
+
+def test_buildable_plan_routes(service):
+    pytest.importorskip("scipy.optimize")
+    status, rows = asyncio.run(service.route("GET", "/buildable/limiting", {}, b""))
+    assert status == 200
+    assert {row["device_type"] for row in rows} == {"VH", "VP"}
+    status, rows = asyncio.run(service.route("GET", "/buildable/plan", {}, b""))
+    assert status == 200
+    assert rows == [
+        {"device_type": "VH", "buildable_alone": 0, "planned": 0},
+        {"device_type": "VP", "buildable_alone": 0, "planned": 0},
+    ]